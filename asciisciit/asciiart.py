@@ -11,19 +11,48 @@ Created on 14 Aug 2014
 
 from __future__ import print_function
 
-import time
 import os
 import platform
-from subprocess import Popen, PIPE
+import itertools
 import io
 
-import cv2
 import numpy as np
 
 from asciisciit.conversions import *
 from asciisciit.lut import get_lut, PY2
+from asciisciit.terminal import get_writer
+from asciisciit.render import (render_frames, encode_rgb, encode_gray,
+                               is_gray)
+from asciisciit.writers import get_movie_writer
+from asciisciit.cache import convert_cached
+from asciisciit.moviefile import (AsciiMovieReader, AsciiMovieWriter,
+                                  EXTENSION as MOVIE_FILE_EXTENSION)
+from asciisciit.playback import (Pipeline, FrameScheduler, AdaptiveScale,
+                                 LatestFrameCapture, StageStats, video_frames,
+                                 timer, clock)
 import asciisciit.console as console
 
+# pixels per character for AsciiCamera(capture_size="auto"), a little more
+#   than one keeps some detail for the area resize to average over
+CAPTURE_OVERSAMPLING = 2
+
+
+def _conversion_setting(name):
+    """
+    Property for an AsciiImage setting.  Setting it throws away the cached
+        conversion.
+    """
+    attr = "_" + name
+
+    def getter(self):
+        return getattr(self, attr)
+
+    def setter(self, val):
+        setattr(self, attr, val)
+        self._frame = None
+
+    return property(getter, setter)
+
 
 class AsciiImage(object):
     """
@@ -41,6 +70,16 @@ class AsciiImage(object):
     equalize : True
         Equalize the image histogram to increase contrast.  This should be set
         to True for most images.
+    converter : Converter
+        Share an existing converter (and its settings) instead of creating
+        one for this image.  Useful for sequences of frames.
+    cache : ResultCache
+        Look conversions of file and url images up in this cache, and keep
+        downloads in it.  See `cache.ResultCache`.
+
+    The conversion is cached until one of the settings above (or `lut`,
+        `font_path` or `image`) is assigned a new value.  Modifying a numpy
+        image in place doesn't count, reassign it.
 
 
     Examples
@@ -56,28 +95,77 @@ class AsciiImage(object):
                  invert=False,
                  equalize=True,
                  lut='simple',
-                 font_path=None):
-        self.image = open_pil_img(image) if isinstance(image, str) else image
+                 font_path=None,
+                 converter=None,
+                 cache=None):
+        if converter is not None:
+            scalefactor = converter.scalefactor
+            invert = converter.invert
+            equalize = converter.equalize
+            lut = converter.lut
+            font_path = converter.font_path
+        self._frame = None
+        self._lut = None
+        self.cache = cache
+        self.image = image
         self.scalefactor = scalefactor
         self.invert = invert
         self.equalize = equalize
         self.font_path = font_path
         self.aspect_correction_factor = DEFAULT_ASPECT_CORRECTION_FACTOR
-        self._lut = None
         self.lut = lut
+        self._converter = converter
+
+    scalefactor = _conversion_setting("scalefactor")
+    invert = _conversion_setting("invert")
+    equalize = _conversion_setting("equalize")
+    aspect_correction_factor = _conversion_setting("aspect_correction_factor")
+
+    @property
+    def image(self):
+        return self._image
+
+    @image.setter
+    def image(self, val):
+        if isinstance(val, str):
+            # keep the encoded image so the converter can decode it at
+            #   close to the output size
+            self._source = read_image_bytes(val, self.cache)
+            val = open_pil_img(io.BytesIO(self._source))
+        else:
+            self._source = None
+        self._image = val
+        self._frame = None
+
+    @property
+    def converter(self):
+        """ Converter matching the current settings. """
+        params = (self.scalefactor, self.invert, self.equalize, self.lut,
+                  self.font_path, self.aspect_correction_factor)
+        c = self._converter
+        if c is None or params != (c.scalefactor, c.invert, c.equalize, c.lut,
+                                   c.font_path, c.aspect_correction_factor):
+            self._converter = Converter(*params, lock_size=False)
+        return self._converter
+
+    @property
+    def frame(self):
+        """ Converted AsciiFrame. """
+        if self._frame is None:
+            if self._source is None:
+                self._frame = self.converter.convert(self.image)
+            else:
+                self._frame = convert_cached(self.converter, self._source,
+                                             self.cache)
+        return self._frame
 
     @property
     def data(self):
-        return image_to_ascii(self.image,
-                              self.scalefactor,
-                              self.invert,
-                              self.equalize,
-                              self.lut,
-                              self.aspect_correction_factor)
+        return self.frame.text
 
     @property
     def size(self):
-        return get_ascii_image_size(self.data)
+        return self.frame.size
 
     @property
     def lut(self):
@@ -86,7 +174,21 @@ class AsciiImage(object):
     @lut.setter
     def lut(self, val):
         self._lut = val
-        lookup = get_lut(val)
+        self._update_aspect_correction_factor()
+
+    @property
+    def font_path(self):
+        return self._font_path
+
+    @font_path.setter
+    def font_path(self, val):
+        self._font_path = val
+        if self._lut is not None:
+            self._update_aspect_correction_factor()
+        self._frame = None
+
+    def _update_aspect_correction_factor(self):
+        lookup = get_lut(self._lut)
         self.aspect_correction_factor = get_aspect_correction_factor(
             lookup.exemplar, self.font_path) # default correction factor for converting
 
@@ -103,7 +205,7 @@ class AsciiImage(object):
             f.write(self.data)
 
     def render(self, path, font_size=10, bg_color=(20,20,20), fg_color=(255,255,255)):
-        img = ascii_to_pil(self.data, font_size, bg_color, fg_color, font_path=self.font_path)
+        img = ascii_to_pil(self.frame, font_size, bg_color, fg_color, font_path=self.font_path)
         img.save(path)
 
     def show(self, resize_term=False, rescale=False):
@@ -122,11 +224,22 @@ class AsciiMovie(object):
     Parameters
     ----------
     movie_path : str
-        File path or web address for movie.
+        File path or web address for movie.  Ascii movie files (".ascm",
+        see `save`) are already converted, so the conversion settings don't
+        apply to them.
     scalefactor : float
         Scale of the image in chars / pixel
     invert : bool
         Invert image before processing
+    smoothing : float
+        Blend the equalization histogram across frames to reduce flicker.
+        See `Converter`.
+    adaptive : bool
+        Lower the scalefactor during playback when frames can't be converted
+        and drawn in time, and raise it back when they can.  See
+        `AdaptiveScale`.
+    min_scalefactor : float
+        Lowest scalefactor adaptive playback goes down to.
 
     Examples
     --------
@@ -134,6 +247,11 @@ class AsciiMovie(object):
     >>> movie = AsciiMovie('awesome_movie.avi')
     >>> movie.play(fps=24.0)
 
+    Convert once and play the converted file from then on:
+
+    >>> movie.save('awesome_movie.ascm')
+    >>> AsciiMovie('awesome_movie.ascm').play()
+
     """
 
     def __init__(self,
@@ -142,36 +260,76 @@ class AsciiMovie(object):
                  invert=False,
                  equalize=True,
                  lut='simple',
-                 font_path=None):
+                 font_path=None,
+                 smoothing=0.0,
+                 adaptive=False,
+                 min_scalefactor=None):
 
         self.movie_path = movie_path
         self.scalefactor = scalefactor
         self.invert = invert
         self.equalize = equalize
         self.font_path = font_path
+        self.smoothing = smoothing
+        self.adaptive = adaptive
+        self.min_scalefactor = min_scalefactor
         self.aspect_correction_factor = DEFAULT_ASPECT_CORRECTION_FACTOR
         self._lut = lut
         self.lut = lut
         self.default_fps = 15.0
+        self._gif_data = None
 
         if type(self.movie_path) == str:
             # movie is a file
             _ , ext = os.path.splitext(self.movie_path)
 
             if ext == ".gif":
-                self.data, frame_duration = gif_to_numpy(self.movie_path)
+                if not os.path.exists(self.movie_path):
+                    # a url, download it once for all the reads
+                    self._gif_data = read_image_bytes(self.movie_path)
+                # just the header, frames are read as they're played
+                gif = self._open_gif()
+                frame_duration = (gif.info.get('duration') or
+                                  DEFAULT_GIF_DURATION)
                 self.default_fps = 1000.0/frame_duration
-                self.shape = self.data.shape
+                self.size = gif.size
                 self.play = self._play_gif
                 self.render = self._render_to_gif
+                self.save = self._save_gif
             elif ext in  [".mp4", ".avi", ".mpeg", ".mpg"]:
                 self.play = self._play_movie
                 self.render = self._render_to_movie
+                self.save = self._save_movie
+            elif ext == MOVIE_FILE_EXTENSION:
+                with AsciiMovieReader(self.movie_path) as reader:
+                    self.default_fps = reader.fps
+                self.play = self._play_file
+                self.render = self._render_file
+                self.save = self._save_file
         else:
             raise("movie_path must be a string")
 
         self.frame_intervals = []
         self.draw_times = []
+        self.scheduler = None
+        self.scaler = None
+        self._converter = None
+
+    @property
+    def current_scalefactor(self):
+        """ Scalefactor in use, which adaptive playback changes. """
+        if self._converter is not None:
+            return self._converter.scalefactor
+        return self.scalefactor
+
+    def _get_converter(self):
+        return Converter(self.scalefactor,
+                         self.invert,
+                         self.equalize,
+                         self.lut,
+                         self.font_path,
+                         self.aspect_correction_factor,
+                         smoothing=self.smoothing)
 
     @property
     def lut(self):
@@ -184,240 +342,650 @@ class AsciiMovie(object):
         self.aspect_correction_factor = get_aspect_correction_factor(
             lookup.exemplar, self.font_path) # default correction factor for converting
 
-    def _play_gif(self, fps=None, repeats=-1):
-        fps = fps or self.default_fps
-        seq = generate_sequence(self.data,
-                                scalefactor=self.scalefactor,
-                                invert=self.invert,
-                                equalize=self.equalize,
-                                lut=self.lut,
-                                font_path=self.font_path)
-        if repeats < 0:
-            while True:
-                play_sequence(seq, fps)
-        else:
-            for i in range(repeats):
-                play_sequence(seq, fps)
+    def _open_gif(self):
+        if self._gif_data is not None:
+            return Image.open(io.BytesIO(self._gif_data))
+        return open_pil_img(self.movie_path)
 
-    def _play_movie(self, fps=None, repeats=1):
+    def _read_gif(self):
+        """
+        Yields (AsciiFrame, duration in ms) for each frame of the gif.  Frames
+            are read one at a time, straight to gray at the ascii size.
+        """
+        converter = self._get_converter()
+        gif = self._open_gif()
+        size = converter.output_size(gif.size)
+        for frame, duration in read_gif(gif, size, gray=True):
+            yield converter.convert(frame), duration
+
+    def _play_gif(self, fps=None, repeats=-1, differential=True):
+        """
+        Plays the gif.  Frames are shown for their own durations unless `fps`
+            is specified.
+        """
+        # converted frames are small, keep them for the repeats
+        seq, durations = [], []
+        for frame, duration in self._read_gif():
+            seq.append(frame)
+            durations.append(duration)
+        writer = get_writer(differential)
+        if fps:
+            self.scheduler = FrameScheduler(fps)
+        else:
+            timestamps = np.cumsum([0] + durations[:-1])/1000.0
+            self.scheduler = FrameScheduler(self.default_fps,
+                                            timestamps=timestamps)
+        try:
+            if repeats < 0:
+                while True:
+                    play_sequence(seq, fps, writer=writer,
+                                  scheduler=self.scheduler)
+            else:
+                for i in range(repeats):
+                    play_sequence(seq, fps, writer=writer,
+                                  scheduler=self.scheduler)
+        finally:
+            writer.close()
+
+    def _play_movie(self, fps=None, repeats=1, differential=True,
+                    queue_size=4):
         fps = fps or self.default_fps
         if repeats < 0:
             repeats = 1  # lets just play movies once by default
+        import cv2
         for i in range(repeats):
             video = cv2.VideoCapture(self.movie_path)
-            frame = 0
-            t = time.clock()
-            while 1:
-                result, image = video.read()
-                if type(image) != np.ndarray:
-                    print("End of movie.")
-                    break
-                if result:
-                    ascii_img = AsciiImage(image,
-                                           scalefactor=self.scalefactor,
-                                           invert=self.invert,
-                                           equalize=self.equalize,
-                                           lut=self.lut,
-                                           font_path=self.font_path)
-                    #set terminal size on the first image?
-                    if frame == 0:
-                        try:
-                            console.set_terminal_size(ascii_img.size)
-                        except:
-                            pass
-                    console.clear_term()
-                    print(ascii_img)
-                    frame += 1
-                else:
-                    break
-                draw_time = time.clock()-t
-                t = time.clock()
-                remaining = 1.0/fps-draw_time
-                if remaining > 0:
-                    time.sleep(remaining)
-                    interval = draw_time+remaining
-                else:
-                    interval = draw_time
-                self.frame_intervals.append(interval)
+            converter = self._converter = self._get_converter()
+            writer = get_writer(differential)
+            # decoding and conversion run ahead in their own threads
+            pipeline = Pipeline(video_frames(video),
+                                converter.convert,
+                                queue_size)
+            if self.adaptive:
+                self.scaler = AdaptiveScale(fps,
+                                            self.scalefactor,
+                                            self.min_scalefactor)
+
+            def display(ascii_frame):
+                #set terminal size on the first image?
+                if pipeline.frames == 0:
+                    try:
+                        console.set_terminal_size(converter.size)
+                    except:
+                        pass
+                t0 = timer()
+                writer.write(ascii_frame)
+                draw_time = timer()-t0
                 self.draw_times.append(draw_time)
-
-            print("Total frames displayed:", frame)
+                if self.scaler is not None:
+                    # conversion runs alongside drawing, the slower one
+                    #   limits the frame rate
+                    frame_time = max(draw_time,
+                                     pipeline.latency["convert"].last)
+                    converter.scalefactor = self.scaler.update(frame_time)
+
+            self.scheduler = FrameScheduler(fps)
+            try:
+                pipeline.run(display, scheduler=self.scheduler)
+            finally:
+                writer.close()
+                video.release()
+            print("End of movie.")
+
+            latency = pipeline.latency
+            self.frame_intervals.extend(pipeline.frame_intervals)
+            print("Total frames displayed:", pipeline.frames)
+            print("Avg decode time:", latency["decode"].mean)
+            print("Avg convert time:", latency["convert"].mean)
             print("Avg draw time:", np.mean(self.draw_times))
-            print("Avg frame interval:", np.mean(self.frame_intervals))
-            print("Max frame interval:", np.max(self.frame_intervals))
-            print("Min frame interval:", np.min(self.frame_intervals))
+            print("Avg frame latency:", latency["total"].mean)
+            print("Max queue depths:", pipeline.max_depths)
+            print("Dropped frames:", self.scheduler.dropped)
+            print("Late frames:", self.scheduler.late)
+            if self.scaler is not None:
+                print("Final scalefactor:", self.scaler.scalefactor)
+            if self.frame_intervals:
+                print("Avg frame interval:", np.mean(self.frame_intervals))
+                print("Max frame interval:", np.max(self.frame_intervals))
+                print("Min frame interval:", np.min(self.frame_intervals))
+
+    def _play_file(self, fps=None, repeats=1, differential=True):
+        """
+        Plays an ascii movie file.  Frames are decoded as they're shown and
+            frames that are dropped to keep up aren't decoded at all.
+        """
+        if repeats < 0:
+            repeats = 1
+        with AsciiMovieReader(self.movie_path) as reader:
+            if fps:
+                self.scheduler = FrameScheduler(fps)
+            else:
+                self.scheduler = FrameScheduler(reader.fps,
+                                                timestamps=reader.timestamps)
+            writer = get_writer(differential)
+            try:
+                for i in range(repeats):
+                    play_sequence(reader, writer=writer,
+                                  scheduler=self.scheduler)
+            finally:
+                writer.close()
+
+    def _render_file(self, output_path, fps=None, font_size=10,
+                     bg_color=(20, 20, 20), fg_color=(255, 255, 255),
+                     **writer_kwargs):
+        """
+        Renders an ascii movie file to a gif (".gif" output paths) or a movie.
+
+        Parameters
+        ----------
+        output_path : str
+            Output file path.
+        fps : float
+            Output frame rate.  Gifs default to the durations in the file.
+        font_size : int
+            Font size of the rendered text.
+        bg_color : tuple (20,20,20)
+            (R,G,B) values for the background.
+        fg_color : tuple (255,255,255)
+            (R,G,B) values for the text.
+        **writer_kwargs
+            Passed on to the movie writer (codec, crf, backend...).
 
+        """
+        with AsciiMovieReader(self.movie_path) as reader:
+            if os.path.splitext(output_path)[1].lower() == ".gif":
+                ascii_seq_to_gif(reader,
+                                 output_path,
+                                 fps=fps or reader.fps,
+                                 font_size=font_size,
+                                 font_path=self.font_path,
+                                 bg_color=bg_color,
+                                 fg_color=fg_color,
+                                 durations=None if fps else reader.durations)
+                return
+            encode = encode_gray if is_gray(bg_color, fg_color) else encode_rgb
+            with get_movie_writer(output_path, fps or reader.fps,
+                                  **writer_kwargs) as writer:
+                for frame in reader:
+                    writer.write(encode(ascii_to_pil(frame,
+                                                     font_size=font_size,
+                                                     font_path=self.font_path,
+                                                     bg_color=bg_color,
+                                                     fg_color=fg_color)))
+
+    def _save_gif(self, output_path, fps=None, keyframe_interval=30):
+        """
+        Converts the gif to an ascii movie file.  Frames keep their durations
+            unless `fps` is specified.  See `moviefile`.
+        """
+        with AsciiMovieWriter(output_path, self.lut, fps or self.default_fps,
+                              keyframe_interval) as writer:
+            for frame, duration in self._read_gif():
+                writer.write(frame, None if fps else duration)
+
+    def _save_file(self, output_path, fps=None, keyframe_interval=30):
+        """
+        Rewrites the ascii movie file, with a new frame rate or keyframe
+            interval.  Frames keep their durations unless `fps` is
+            specified.
+        """
+        if os.path.abspath(output_path) == os.path.abspath(self.movie_path):
+            raise ValueError("can't save an ascii movie over itself")
+        with AsciiMovieReader(self.movie_path) as reader:
+            durations = reader.durations
+            with AsciiMovieWriter(output_path, reader.lookup,
+                                  fps or reader.fps,
+                                  keyframe_interval) as writer:
+                for number in range(len(reader)):
+                    writer.write(reader.indices(number),
+                                 None if fps else durations[number])
+
+    def _save_movie(self, output_path, fps=None, keyframe_interval=30):
+        """
+        Converts the movie to an ascii movie file, which plays without
+            decoding or converting anything.  See `moviefile`.
+
+        Parameters
+        ----------
+        output_path : str
+            Output file path, usually with a ".ascm" extension.
+        fps : float
+            Frame rate of the file, defaults to the movie's.
+        keyframe_interval : int
+            Frames between keyframes.
+
+        """
+        import cv2
+        video = cv2.VideoCapture(self.movie_path)
+        fps = fps or video.get(cv2.CAP_PROP_FPS) or self.default_fps
+        converter = self._get_converter()
+        try:
+            with AsciiMovieWriter(output_path, self.lut, fps,
+                                  keyframe_interval) as writer:
+                for image in video_frames(video):
+                    writer.write(converter.convert(image))
+        finally:
             video.release()
 
+    def serve(self, host="127.0.0.1", port=8023, fps=None, repeats=1,
+              max_buffer=None):
+        """
+        Streams the movie to any number of terminals over TCP, converting
+            each frame once.  Connect with `telnet host port` or
+            `nc host port`.  See `server.AsciiServer`.  Python 3 only.
+
+        Parameters
+        ----------
+        host : str
+            Interface to listen on.
+        port : int
+            Port to listen on.
+        fps : float
+            Frame rate, defaults to the movie's.
+        repeats : int
+            Times to play the movie, negative repeats forever.
+        max_buffer : int
+            Bytes that may be waiting for a client before it skips frames.
+
+        Returns
+        -------
+        AsciiServer : the server, after it's done, for its stats.
+
+        """
+        from asciisciit.server import AsciiServer, DEFAULT_MAX_BUFFER
+        _, ext = os.path.splitext(self.movie_path)
+        convert = None
+        if ext == ".gif":
+            # converted frames are small, convert once for all the repeats
+            frames = [frame for frame, _ in self._read_gif()]
+        elif ext == MOVIE_FILE_EXTENSION:
+            frames = AsciiMovieReader(self.movie_path)
+            fps = fps or frames.fps
+        else:
+            frames = None
+            convert = self._get_converter().convert
+
+        def source():
+            count = itertools.count() if repeats < 0 else range(repeats)
+            for _ in count:
+                if frames is not None:
+                    for frame in frames:
+                        yield frame
+                    continue
+                import cv2
+                video = cv2.VideoCapture(self.movie_path)
+                try:
+                    for frame in video_frames(video):
+                        yield frame
+                finally:
+                    video.release()
+
+        try:
+            server = AsciiServer(source(), convert, fps or self.default_fps,
+                                 host=host, port=port,
+                                 max_buffer=max_buffer or DEFAULT_MAX_BUFFER)
+            print("Serving %s on %s:%d" % (self.movie_path, host, port))
+            server.run()
+        finally:
+            if isinstance(frames, AsciiMovieReader):
+                frames.close()
+        return server
+
     def _render_to_gif(self, output_path, fps=None, font_size=10):
         """
-        Render text to gif of text.
+        Render text to gif of text.  Frames are read, converted and written
+            one at a time.
 
         Parameters
         ----------
         output_path : str
             Output file path.
+        fps : float
+            Output frame rate, defaults to the durations of the input frames.
 
         """
-        fps = fps or self.default_fps
-        seq = generate_sequence(self.data,
-                                scalefactor=self.scalefactor,
-                                invert=self.invert,
-                                equalize=self.equalize,
-                                lut=self.lut,
-                                font_path=self.font_path)
-        ascii_seq_to_gif(seq,
+        frames, durations = itertools.tee(self._read_gif())
+        ascii_seq_to_gif((frame for frame, _ in frames),
                          output_path,
-                         fps=fps,
+                         fps=fps or self.default_fps,
                          font_size=font_size,
-                         font_path=self.font_path)
+                         font_path=self.font_path,
+                         durations=None if fps else (d for _, d in durations))
 
     def _render_to_movie(self,
                          output_path,
                          fourcc=None,
                          fps=None,
-                         font_size=10):
+                         font_size=10,
+                         workers=None,
+                         progress=None,
+                         codec="libx264",
+                         crf=18,
+                         backend="ffmpeg",
+                         bg_color=(20, 20, 20),
+                         fg_color=(255, 255, 255),
+                         **writer_kwargs):
         """
+        Render movie to a movie of text.  The movie is read once, frames are
+            converted and rendered in a pool of worker processes and
+            streamed to the encoder as raw video (gray8 when both colors are
+            gray, rgb24 otherwise).
+
+        Parameters
+        ----------
+        output_path : str
+            Output file path.
+        fps : float
+            Output frame rate.
+        font_size : int
+            Font size of the rendered text.
+        workers : int
+            Number of worker processes, defaults to the number of CPUs.
+        progress : callable
+            Called as `progress(done, total)` after each frame is written.
+            `total` is None if the movie doesn't report its frame count.
+            Defaults to a status bar.
+        codec : str
+            ffmpeg video codec.
+        crf : int
+            Constant rate factor, None for the codec's default quality.
+        backend : str
+            "ffmpeg" or "imageio", see `writers.get_movie_writer`.
+        bg_color : tuple (20,20,20)
+            (R,G,B) values for the background.
+        fg_color : tuple (255,255,255)
+            (R,G,B) values for the text.
+        **writer_kwargs
+            Passed on to the movie writer (preset, pix_fmt, extra_args...).
 
         """
+        import cv2
         fps = fps or self.default_fps
         video = cv2.VideoCapture(self.movie_path)
-        frames = 0
-        
-        status = StatusBar(text='Counting frames: ')
-
-        #get # of frames and img size
-        while 1:
-            result, frame = video.read()
-            if type(frame) != np.ndarray:
-                break
-            if frames == 0:
-                #get resulting image size once
-                ascii_img = AsciiImage(frame,
-                                       scalefactor=self.scalefactor,
-                                       invert=self.invert,
-                                       equalize=self.equalize,
-                                       lut=self.lut,
-                                       font_path=self.font_path)
-                pil_img = ascii_to_pil(ascii_img.data, font_path=self.font_path)
-                img_size = pil_img.size
-            frames += 1
-            status.update_custom(frames)
-        video.release()
-
-        status.complete()
-
-        #status = StatusBar(frames, "Rendering frames: ")
-
-        video = cv2.VideoCapture(self.movie_path)
-
-        # opencv solution?
-        # if not fourcc:
-        #     fourcc = fourcc = cv2.cv.CV_FOURCC(*'MPEG')
-        # output = cv2.VideoWriter(output_path, -1, fps, img_size, 1)
-
-        # ffmpeg solution
-        p = Popen(['ffmpeg', '-y', '-f', 'image2pipe', '-vcodec',
-                   'mjpeg', '-r', str(fps), '-i', '-', '-vcodec',
-                   'mpeg4', '-qscale', '5', '-r', str(fps), output_path],
-                   stdin=PIPE)
-
-        for i in range(frames):
-            result, frame = video.read()
-            if type(frame) != np.ndarray:
-                break
-            if result:
-                ascii_img = AsciiImage(frame,
-                                       scalefactor=self.scalefactor,
-                                       invert=self.invert,
-                                       equalize=self.equalize,
-                                       lut=self.lut,
-                                       font_path=self.font_path)
-                pil_img = ascii_to_pil(ascii_img.data,
+        # streams and some containers report 0 or a negative count
+        count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        total = count if count > 0 else None
+        converter = self._get_converter()
+
+        status = None
+        if progress is None:
+            status = StatusBar(total or 0, text='Rendering frames: ')
+
+            def progress(done, total):
+                if total:
+                    status.update(min(done, total))
+                else:
+                    status.update_custom(done)
+
+        writer = get_movie_writer(output_path, fps, backend, codec=codec,
+                                  crf=crf, **writer_kwargs)
+        encode = encode_gray if is_gray(bg_color, fg_color) else encode_rgb
+        try:
+            for frame in render_frames(video_frames(video),
+                                       converter,
                                        font_size=font_size,
-                                       font_path=self.font_path)
-                pil_img.save(p.stdin, 'JPEG')
-                #numpy_img = np.array(pil_img)
-                #output.write(numpy_img)  # opencv
-                #status.update(i)
-            else:
-                break
-
-        video.release()
-        #output.release()  # opencv
-        p.stdin.close()
-        p.wait()
+                                       font_path=self.font_path,
+                                       bg_color=bg_color,
+                                       fg_color=fg_color,
+                                       encode=encode,
+                                       workers=workers,
+                                       progress=progress,
+                                       total=total):
+                writer.write(frame)
+        finally:
+            video.release()
+            writer.close()
 
-        #status.complete()
+        if status is not None:
+            status.complete()
 
 
 class AsciiCamera(object):
+    """
+    Streams a camera to the terminal.
+
+    Frames are read in a capture thread that only keeps the newest one (see
+        `LatestFrameCapture`), so when conversion can't keep up with the
+        camera the stream skips frames instead of falling behind.
+
+    Parameters
+    ----------
+    camera_id : int
+        cv2.VideoCapture device index.
+    scalefactor : float
+        Scale of the image in chars / pixel, relative to the camera's
+        default resolution.
+    invert : bool
+        Invert image before processing
+    smoothing : float
+        Blend the equalization histogram across frames to reduce flicker.
+        See `Converter`.
+    adaptive : bool
+        Lower the scalefactor while streaming when frames can't be converted
+        and drawn in time, and raise it back when they can.  See
+        `AdaptiveScale`.
+    min_scalefactor : float
+        Lowest scalefactor adaptive streaming goes down to.
+    capture_size : tuple, str
+        (width, height) to ask the camera for.  "auto" asks for the smallest
+        resolution with `CAPTURE_OVERSAMPLING` pixels per character at
+        `scalefactor`.  Either way the ascii output keeps the size it has at
+        the default resolution, smaller captures are just cheaper to read
+        and resize.  Cameras pick the closest size they support, and some
+        ignore it.
+    buffer_size : int
+        Frames the capture backend may queue (cv2.CAP_PROP_BUFFERSIZE), for
+        backends that support it.
+    threaded : bool
+        Read frames in a capture thread.  False reads them in between
+        conversions, which shows every frame, however stale.
+
+    Attributes
+    ----------
+    latency : StageStats
+        Seconds from capturing each frame to finishing drawing it.
 
+    """
     def __init__(self,
                  camera_id=0,
                  scalefactor=0.2,
                  invert=False,
                  equalize=True,
-                 lut="simple"):
+                 lut="simple",
+                 smoothing=0.0,
+                 adaptive=False,
+                 min_scalefactor=None,
+                 capture_size=None,
+                 buffer_size=None,
+                 threaded=True):
         self.scalefactor = scalefactor
         self.invert = invert
         self.camera_id = camera_id
         self.equalize = equalize
         self.lut = lut
+        self.smoothing = smoothing
+        self.adaptive = adaptive
+        self.min_scalefactor = min_scalefactor
+        self.capture_size = capture_size
+        self.buffer_size = buffer_size
+        self.threaded = threaded
 
         #webcam?
+        import cv2
         self.video = cv2.VideoCapture(self.camera_id)
+        self.native_size = (int(self.video.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                            int(self.video.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self._configure()
 
         self.frame_intervals = []
         self.draw_times = []
+        self.latency = StageStats()
+        self.scheduler = None
+        self.scaler = None
+        self.capture = None
+        self._converter = None
+        self._capture_scale = 1.0
+
+    def _configure(self):
+        """ Asks the device for the capture size and buffer size. """
+        import cv2
+        if self.buffer_size is not None:
+            self.video.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+        size = self.capture_size
+        if size == "auto":
+            if not all(self.native_size):
+                return
+            cols, _ = get_output_size(self.native_size, self.scalefactor,
+                                      DEFAULT_ASPECT_CORRECTION_FACTOR)
+            ratio = min(1.0, float(cols*CAPTURE_OVERSAMPLING) /
+                        self.native_size[0])
+            size = (int(round(self.native_size[0]*ratio)),
+                    int(round(self.native_size[1]*ratio)))
+        if size is not None:
+            self.video.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+            self.video.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+
+    @property
+    def current_scalefactor(self):
+        """ Scalefactor in use, which adaptive streaming changes. """
+        if self._converter is not None:
+            return self._converter.scalefactor/self._capture_scale
+        return self.scalefactor
+
+    def stream(self, fps=None, differential=True):
+        """
+        Streams until the camera stops delivering frames.
 
-    def stream(self, fps=15.0):
+        Parameters
+        ----------
+        fps : float
+            Display rate, defaults to the camera's frame rate.
+        differential : bool
+            Only redraw the characters that changed.
+
+        """
+        import cv2
+        fps = fps or self.video.get(cv2.CAP_PROP_FPS) or 15.0
+        converter = self._converter = Converter(self.scalefactor,
+                                                self.invert,
+                                                self.equalize,
+                                                self.lut,
+                                                smoothing=self.smoothing)
+        if self.adaptive:
+            self.scaler = AdaptiveScale(fps,
+                                        self.scalefactor,
+                                        self.min_scalefactor)
+        writer = get_writer(differential)
+        # a camera can't skip ahead, so late frames just move the schedule
+        self.scheduler = FrameScheduler(fps, catch_up=False)
+        if self.threaded:
+            self.capture = LatestFrameCapture(self.video)
+            read = self.capture.read
+        else:
+            read = self.video.read
         frame = 0
-        t = time.clock()
-        while 1:
-            result, image = self.video.read()
-            if type(image) != np.ndarray:
-                if frame == 0:
-                    raise IOError("No frames available. Bro, do you even camera?")
-                ##TODO: find some way to break out besides ^C
-                print("End of movie.")
-                break
-            if result:
-                ascii_img = AsciiImage(image,
-                                       scalefactor=self.scalefactor,
-                                       invert=self.invert,
-                                       equalize=self.equalize,
-                                       lut=self.lut)
-                #set terminal size on the first image?
-                if frame == 0:
-                    try:
-                        console.set_terminal_size(ascii_img.size)
-                    except:
-                        pass
-                console.clear_term()
-                print(ascii_img)
-                frame += 1
-            else:
-                break
-            draw_time = time.clock()-t
-            t = time.clock()
-            remaining = 1.0/fps-draw_time
-            if remaining > 0:
-                time.sleep(remaining)
-                interval = draw_time+remaining
-            else:
-                interval = draw_time
-            self.frame_intervals.append(interval)
-            self.draw_times.append(draw_time)
+        t = None
+        try:
+            while 1:
+                result, image = read()
+                t0 = timer()
+                captured = self.capture.timestamp if self.threaded else clock()
+                if type(image) != np.ndarray:
+                    if frame == 0:
+                        raise IOError("No frames available. Bro, do you even camera?")
+                    ##TODO: find some way to break out besides ^C
+                    print("End of movie.")
+                    break
+                if result:
+                    if frame == 0 and all(self.native_size):
+                        # same ascii size whatever resolution is captured
+                        self._capture_scale = (float(self.native_size[0]) /
+                                               image.shape[1])
+                        converter.scalefactor = (self.scalefactor *
+                                                 self._capture_scale)
+                    ascii_frame = converter.convert(image)
+                    #set terminal size on the first image?
+                    if frame == 0:
+                        try:
+                            console.set_terminal_size(converter.size)
+                        except:
+                            pass
+                    draw_time = timer()-t0
+                    self.scheduler.wait(frame)
+                    t1 = timer()
+                    writer.write(ascii_frame)
+                    draw_time += timer()-t1
+                    self.latency.add(clock()-captured)
+                    if self.scaler is not None:
+                        converter.scalefactor = (self.scaler.update(draw_time) *
+                                                 self._capture_scale)
+                    frame += 1
+                else:
+                    break
+                if t is not None:
+                    self.frame_intervals.append(t1-t)
+                t = t1
+                self.draw_times.append(draw_time)
+        finally:
+            if self.capture is not None:
+                self.capture.stop()
+            writer.close()
 
         print("Total frames displayed:", frame)
         print("Avg draw time:", np.mean(self.draw_times))
-        print("Avg frame interval:", np.mean(self.frame_intervals))
-        print("Max frame interval:", np.max(self.frame_intervals))
-        print("Min frame interval:", np.min(self.frame_intervals))
+        print("Avg capture latency:", self.latency.mean)
+        print("Max capture latency:", self.latency.max)
+        print("Late frames:", self.scheduler.late)
+        if self.capture is not None:
+            print("Skipped frames:", self.capture.skipped)
+        if self.scaler is not None:
+            print("Final scalefactor:", self.scaler.scalefactor)
+        if self.frame_intervals:
+            print("Avg frame interval:", np.mean(self.frame_intervals))
+            print("Max frame interval:", np.max(self.frame_intervals))
+            print("Min frame interval:", np.min(self.frame_intervals))
 
         self.release()
 
+    def serve(self, host="127.0.0.1", port=8023, fps=None, max_buffer=None):
+        """
+        Streams the camera to any number of terminals over TCP, converting
+            each frame once.  Connect with `telnet host port` or
+            `nc host port`.  See `server.AsciiServer`.  Python 3 only.
+
+        Returns
+        -------
+        AsciiServer : the server, after it's done, for its stats.
+
+        """
+        import cv2
+        from asciisciit.server import AsciiServer, DEFAULT_MAX_BUFFER
+        fps = fps or self.video.get(cv2.CAP_PROP_FPS) or 15.0
+        self.capture = LatestFrameCapture(self.video)
+        converter = self._converter = Converter(self.scalefactor,
+                                                self.invert,
+                                                self.equalize,
+                                                self.lut,
+                                                smoothing=self.smoothing)
+
+        def source():
+            while True:
+                result, image = self.capture.read()
+                if not result:
+                    return
+                yield image
+
+        server = AsciiServer(source(), converter.convert, fps,
+                             catch_up=False, host=host, port=port,
+                             max_buffer=max_buffer or DEFAULT_MAX_BUFFER)
+        print("Serving camera %s on %s:%d" % (self.camera_id, host, port))
+        try:
+            server.run()
+        finally:
+            self.capture.stop()
+            self.release()
+        return server
+
     def release(self):
         self.video.release()
 
@@ -427,34 +995,71 @@ def generate_sequence(imageseq,
                       invert=False,
                       equalize=True,
                       lut='simple',
-                      font_path=None):
-    seq = []
-    for im in imageseq:
-        seq.append(
-            AsciiImage(
-                im,
-                scalefactor,
-                invert=invert,
-                equalize=equalize,
-                lut=lut,
-                font_path=font_path
-            )
-        )
-    return seq
-
-
-def play_sequence(seq, fps=30, repeats=1):
+                      font_path=None,
+                      batched=False):
+    """
+    Converts a sequence of images to a list of AsciiImage, which share one
+        converter.
+
+    With `batched`, a list of AsciiFrame is returned instead, and numpy
+        stacks (like the ones from `gif_to_numpy`) are converted in one
+        `frames_to_ascii` call, which is much faster.  That resizes and
+        equalizes the way opencv does, so the text can differ a little from
+        AsciiImage's.
+    """
+    converter = Converter(scalefactor,
+                          invert,
+                          equalize,
+                          lut,
+                          font_path,
+                          lock_size=False)
+    if not batched:
+        return [AsciiImage(im, converter=converter) for im in imageseq]
+    if isinstance(imageseq, np.ndarray):
+        return frames_to_ascii(imageseq,
+                               scalefactor,
+                               invert,
+                               equalize,
+                               lut,
+                               converter.aspect_correction_factor)
+    return [converter.convert(im) for im in imageseq]
+
+
+def play_sequence(seq, fps=30, repeats=1, writer=None, scheduler=None):
+    """
+    Plays a sequence of frames in the terminal.  Frames are drawn with
+        `writer` (see `terminal.get_writer`), a differential writer by
+        default, and paced by `scheduler`, which skips frames that are
+        already late (the last one is always shown).
+
+    Frames are only looked up in `seq` when they're shown, so lazy sequences
+        like `moviefile.AsciiMovieReader` never decode dropped frames.
+
+    Returns
+    -------
+    FrameScheduler : the scheduler, with dropped and late frame counts.
+
+    """
     shape = seq[0].size
     console.set_terminal_size(shape)
-    t = time.time()
-    for im in seq:
-        console.clear_term()
-        print(im)
-        interval = time.time()-t
-        t = time.time()
-        remaining = 1.0/fps-interval
-        if remaining > 0:
-            time.sleep(remaining)
+    close = writer is None
+    if writer is None:
+        writer = get_writer()
+    if scheduler is None:
+        scheduler = FrameScheduler(fps)
+    scheduler.reset()
+    last = len(seq) - 1
+    try:
+        for index in range(len(seq)):
+            if index < last and scheduler.is_late(index):
+                scheduler.drop(index)
+                continue
+            scheduler.wait(index)
+            writer.write(seq[index])
+    finally:
+        if close:
+            writer.close()
+    return scheduler
 
 
 if __name__ == '__main__':
@@ -14,22 +14,32 @@ Examples
 
     ascii.py dealwithit.gif -s 0.2 -f 15.0
 
+    ascii.py movie.mp4 movie.ascm -s 0.2
+
+    ascii.py movie.ascm
+
     ascii.py -w 0 --n
 
-"""
+    ascii.py -w 0 --serve 8023
 
+    ascii.py assets/ "extra/*.png" -o out --format png -j 8
+
+"""
+from __future__ import print_function
 import argparse
 import sys
 import os
 import platform
 
 import asciisciit.console as console
+from asciisciit.batch import convert_files, BatchReport
 from asciisciit.asciiart import *
 from asciisciit.misc import *
 
 MOVIES = [".mp4", '.avi', '.mpg', '.mpeg']
 IMAGES = ['.png', '.jpeg', '.jpg', '.tif', '.bmp']
 GIFS = ['.gif']
+MOVIE_FILES = ['.ascm']
 
 
 def run_in_new_terminal(**args):
@@ -61,11 +71,34 @@ def run_in_new_terminal(**args):
 
     console.new_term(call_str, size)  # call in new terminal without --n argument
 
+def run_batch(**args):
+    report = BatchReport()
+    results = convert_files(args['files'], args['o'],
+                            format=args['format'],
+                            scalefactor=args['s'],
+                            invert=args['i'],
+                            equalize=args['e'],
+                            lut=args['l'],
+                            font_path=args['t'],
+                            font_size=args['p'],
+                            workers=args['j'],
+                            cache_dir=args['cache_dir'])
+    for result in results:
+        report.add(result)
+        if result.error is None:
+            print(result.output)
+        else:
+            print("Skipped %s: %s" % (result.path, result.error),
+                  file=sys.stderr)
+    print(report.summary(), file=sys.stderr)
+    return 1 if report.failed else 0
+
 def main():
     parser = argparse.ArgumentParser(
         description='Convert Images, Movies, Gifs, Plots to ASCII')
-    parser.add_argument('infile', nargs='?', type=str)
-    parser.add_argument('outfile', nargs='?', type=str)
+    parser.add_argument('files', nargs='*', type=str, metavar='FILE',
+                        help='Input file and optional output file, or with '
+                             '-o any number of images, globs and directories')
     parser.add_argument('-r', type=int, help='Number of repeats',
                         default=-1)
     parser.add_argument('-s', type=float, help='Scale factor',
@@ -78,9 +111,31 @@ def main():
     parser.add_argument('-l', type=str, help='lookup table', default='simple')
     parser.add_argument('-t', type=str, help='Font path', default=None)
     parser.add_argument('--n', help='New terminal', action='store_true')
+    parser.add_argument('--serve', type=int, nargs='?', const=8023,
+                        default=None, metavar='PORT',
+                        help='Stream to telnet/netcat clients on PORT')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='Interface to serve on')
+    parser.add_argument('-o', type=str, metavar='OUTDIR', default=None,
+                        help='Batch convert FILEs into OUTDIR')
+    parser.add_argument('-j', type=int, default=None,
+                        help='Batch worker processes, defaults to one per CPU')
+    parser.add_argument('--format', choices=['text', 'png'], default='text',
+                        help='Batch output format')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Reuse batch conversions from earlier runs kept here')
     args = parser.parse_args()
     args = vars(args)
 
+    if args['o'] is not None:
+        if not args['files']:
+            parser.error("-o needs files to convert")
+        sys.exit(run_batch(**args))
+    if len(args['files']) > 2:
+        parser.error("more than one input file needs an output directory, -o")
+    args['infile'] = args['files'][0] if args['files'] else None
+    args['outfile'] = args['files'][1] if len(args['files']) > 1 else None
+
     #new terminal
     if args['n']:
         run_in_new_terminal(**args)
@@ -90,7 +145,7 @@ def main():
         if args['infile']:
             _,ext = os.path.splitext(args['infile'])
             ext = ext.lower()
-            if ext in MOVIES+GIFS:
+            if ext in MOVIES+GIFS+MOVIE_FILES:
                 task = AsciiMovie(args['infile'],
                                   scalefactor=args['s'],
                                   invert=args['i'],
@@ -98,6 +153,14 @@ def main():
                                   lut=args['l'],
                                   font_path=args['t'])
                 if args['outfile']:
+                    _, out_ext = os.path.splitext(args['outfile'])
+                if args['serve'] is not None:
+                    task.serve(args['host'], args['serve'], fps=args['f'],
+                               repeats=args['r'])
+                elif args['outfile'] and out_ext.lower() in MOVIE_FILES:
+                    # convert once, to play later
+                    task.save(args['outfile'], fps=args['f'])
+                elif args['outfile']:
                     task.render(args['outfile'],
                                 fps=args['f'],
                                 font_size=args['p'])
@@ -117,7 +180,7 @@ def main():
                 else:
                     task.show()
             else:
-                print("Unknown file format.Try:", MOVIES+IMAGES+GIFS)
+                print("Unknown file format.Try:", MOVIES+IMAGES+GIFS+MOVIE_FILES)
 
         #a webcam?
         elif args['w'] > -1:
@@ -126,8 +189,11 @@ def main():
                                invert=args['i'],
                                equalize=args['e'],
                                lut=args['l'])
-            task.stream(fps=args['f'])
-            task.release()
+            if args['serve'] is not None:
+                task.serve(args['host'], args['serve'], fps=args['f'])
+            else:
+                task.stream(fps=args['f'])
+                task.release()
 
 if __name__ == '__main__':
     main()
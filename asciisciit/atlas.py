@@ -0,0 +1,235 @@
+"""
+
+atlas.py
+
+@author: derricw
+
+Glyph atlas for rendering ascii text to images.
+
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import PIL
+from PIL import Image, ImageDraw
+
+# Pillow 10.2 started alpha compositing glyphs that overlap within a line
+#   instead of keeping the max coverage
+PIL_VERSION = tuple(int(v) for v in PIL.__version__.split(".")[:2])
+COMPOSITE_GLYPHS = PIL_VERSION >= (10, 2)
+
+# glyph stacks kept per atlas, one per lookup table.  Custom lookups come
+#   from clients of the service, so only the most recently used are kept.
+MAX_STACKS = 16
+
+
+def _div255(a):
+    # same rounding PIL uses when it blends text onto an image
+    a = a + 128
+    return ((a >> 8) + a) >> 8
+
+
+class GlyphAtlas(object):
+    """
+    Glyphs rasterized once for a font, cell size and pair of colors.  Images
+        are then composed by placing glyph tiles on the cell grid instead of
+        laying out and rasterizing text every time.
+
+    Glyphs are rendered the same way ImageDraw.text renders them and blended
+        with the same arithmetic, so the output matches drawing the text one
+        line at a time pixel-for-pixel, as long as every glyph advances by
+        exactly one cell width (true for monospace fonts).  Otherwise glyphs
+        are kept on the cell grid instead of drifting with their advances.
+
+    Ink that spills out of a glyph's cell (descenders, wide glyphs) is kept
+        and composed the same way PIL does: max (or alpha composited, in
+        Pillow >= 10.2) within a line, blended line after line.
+
+    Parameters
+    ----------
+    font : PIL.ImageFont
+        Font to render with.
+    cell_size : tuple
+        (width, height) of a character cell in pixels, including padding.
+    bg_color : tuple (20,20,20)
+        (R,G,B) values for image background.
+    fg_color : tuple (255,255,255)
+        (R,G,B) values for text color.
+
+    """
+    def __init__(self,
+                 font,
+                 cell_size,
+                 bg_color=(20, 20, 20),
+                 fg_color=(255, 255, 255)):
+        self.font = font
+        self.cell_width, self.cell_height = cell_size
+        self.bg_color = tuple(bg_color)
+        self.fg_color = tuple(fg_color)
+        self._bg = np.array(bg_color, dtype=np.int32)
+        self._fg = np.array(fg_color, dtype=np.int32)
+        alpha = np.arange(256, dtype=np.int32)[:, np.newaxis]
+        self._blend = _div255(
+            self._bg*(255-alpha) + self._fg*alpha).astype(np.uint8)
+        self._glyphs = {}
+        self._stacks = OrderedDict()
+        self._stacks_lock = threading.Lock()
+
+    def glyph(self, char):
+        """
+        Coverage mask of a single glyph, split into cell sized blocks.
+
+        Returns
+        -------
+        dict : {(row_offset, col_offset): uint8 ndarray}, the block at (0, 0)
+            is the glyph's own cell.
+        """
+        blocks = self._glyphs.get(char)
+        if blocks is None:
+            blocks = self._glyphs[char] = self._rasterize(char)
+        return blocks
+
+    def _rasterize(self, char):
+        cw, ch = self.cell_width, self.cell_height
+        x0, y0, x1, y1 = self.font.getbbox(char)
+        left = -(min(x0, 0) // cw)
+        top = -(min(y0, 0) // ch)
+        right = max(0, -(-(x1 - cw) // cw))
+        bottom = max(0, -(-(y1 - ch) // ch))
+        canvas = Image.new("L", ((left+right+1)*cw, (top+bottom+1)*ch), 0)
+        ImageDraw.Draw(canvas).text((left*cw, top*ch), char, 255,
+                                    font=self.font)
+        canvas = np.asarray(canvas)
+        blocks = {}
+        for row in range(top+bottom+1):
+            for col in range(left+right+1):
+                block = canvas[row*ch:(row+1)*ch, col*cw:(col+1)*cw]
+                if (row, col) == (top, left) or block.any():
+                    blocks[(row-top, col-left)] = block.copy()
+        return blocks
+
+    def stack(self, chars):
+        """
+        Glyph blocks for a sequence of characters, stacked so they can be
+            indexed with an array of character indices.
+
+        Returns
+        -------
+        dict : {(row_offset, col_offset): (len(chars), h, w) uint8 ndarray}
+        """
+        key = u"".join(chars)
+        with self._stacks_lock:
+            stack = self._stacks.pop(key, None)
+            if stack is not None:
+                self._stacks[key] = stack  # most recently used
+        if stack is None:
+            glyphs = [self.glyph(char) for char in chars]
+            offsets = set()
+            for blocks in glyphs:
+                offsets.update(blocks)
+            empty = np.zeros((self.cell_height, self.cell_width), np.uint8)
+            stack = {}
+            for offset in offsets:
+                stack[offset] = np.stack([blocks.get(offset, empty)
+                                          for blocks in glyphs])
+            with self._stacks_lock:
+                self._stacks[key] = stack
+                while len(self._stacks) > MAX_STACKS:
+                    self._stacks.popitem(last=False)
+        return stack
+
+    def _layers(self, chars, indices, line_offset, lines):
+        # coverage of the glyphs, one layer per row offset in drawing order
+        rows, cols = indices.shape
+        ch, cw = self.cell_height, self.cell_width
+        stack = self.stack(chars)
+
+        # lines are drawn top to bottom, so ink spilling down from the line
+        #   above lands first and ink spilling up from the line below last
+        layers = []
+        for row_offset in sorted(set(o[0] for o in stack), reverse=True):
+            layer = np.zeros((lines, cols, ch, cw), dtype=np.uint8)
+            empty = True
+            # glyphs are drawn left to right, so spill from the left first
+            for (oy, ox) in sorted(stack, key=lambda o: -o[1]):
+                if oy != row_offset:
+                    continue
+                blocks = stack[(oy, ox)]
+                dst_y = line_offset + oy
+                y0, y1 = max(dst_y, 0), min(dst_y + rows, lines)
+                x0, x1 = max(ox, 0), min(ox + cols, cols)
+                if y0 >= y1 or x0 >= x1:
+                    continue
+                tiles = blocks[indices[y0-dst_y:y1-dst_y, x0-ox:x1-ox]]
+                target = layer[y0:y1, x0:x1]
+                if empty:
+                    target[:] = tiles
+                    empty = False
+                elif COMPOSITE_GLYPHS:
+                    target[:] = tiles + _div255(
+                        target.astype(np.int32)*(255-tiles.astype(np.int32)))
+                else:
+                    np.maximum(target, tiles, out=target)
+            layers.append(layer)
+        return layers
+
+    def _to_image(self, out):
+        lines, cols, ch, cw = out.shape[:4]
+        out = out.transpose((0, 2, 1, 3) + tuple(range(4, out.ndim)))
+        return out.reshape((lines*ch, cols*cw) + out.shape[4:])
+
+    def render(self, chars, indices, line_offset=0, lines=None):
+        """
+        Renders a grid of characters.
+
+        Parameters
+        ----------
+        chars : sequence
+            Characters referenced by `indices`.
+        indices : ndarray
+            (rows, columns) array of indices into `chars`.
+        line_offset : int
+            Text line of the first row of `indices`.
+        lines : int
+            Total number of text lines in the image.  Defaults to the last
+            row of `indices`.
+
+        Returns
+        -------
+        PIL.Image
+
+        """
+        if lines is None:
+            lines = line_offset + indices.shape[0]
+        layers = self._layers(chars, indices, line_offset, lines)
+        if len(layers) == 1:
+            out = self._blend[layers[0]]
+        else:
+            out = np.empty(layers[0].shape + (3,), dtype=np.int32)
+            out[:] = self._bg
+            for layer in layers:
+                alpha = layer[..., np.newaxis].astype(np.int32)
+                out = _div255(out*(255-alpha) + self._fg*alpha)
+            out = out.astype(np.uint8)
+        return Image.fromarray(self._to_image(out))
+
+    def coverage(self, chars, indices, line_offset=0, lines=None):
+        """
+        Renders a grid of characters as text coverage instead of colors, 0
+            where the image is background and 255 where it's text.  Same
+            parameters as `render`.
+
+        Returns
+        -------
+        ndarray : (height, width) uint8 array.
+
+        """
+        if lines is None:
+            lines = line_offset + indices.shape[0]
+        layers = self._layers(chars, indices, line_offset, lines)
+        out = layers[0]
+        for layer in layers[1:]:
+            alpha = layer.astype(np.int32)
+            out = (alpha + _div255(out*(255-alpha))).astype(np.uint8)
+        return self._to_image(out)
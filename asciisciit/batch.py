@@ -0,0 +1,288 @@
+"""
+
+batch.py
+
+@author: derricw
+
+Converts many image files on a pool of worker processes.  Each worker sets up
+    its converter, font and glyph atlas once and then works through files,
+    so a directory of thousands of images pays for one interpreter start
+    instead of thousands.
+
+"""
+import collections
+import glob
+import io
+import multiprocessing
+import os
+
+from asciisciit.cache import ResultCache, convert_cached
+from asciisciit.conversions import Converter, ascii_to_pil
+from asciisciit.misc import read_image_bytes
+from asciisciit.playback import StageStats, timer
+
+IMAGE_EXTENSIONS = ('.png', '.jpeg', '.jpg', '.tif', '.tiff', '.bmp')
+FORMATS = {"text": ".txt", "png": ".png"}
+
+# outcome of one file: where it was written, or why it wasn't (`output` is
+#   None and `error` is the message), and how long the worker spent on it
+BatchResult = collections.namedtuple("BatchResult",
+                                     ["path", "output", "error", "seconds"])
+
+# per-process state for pool workers, set up once by _init_worker
+_WORKER = {}
+
+
+def _init_worker(settings):
+    _WORKER["converter"] = Converter(settings["scalefactor"],
+                                     settings["invert"],
+                                     settings["equalize"],
+                                     settings["lut"],
+                                     settings["font_path"],
+                                     lock_size=False)
+    _WORKER["settings"] = settings
+    cache_dir = settings["cache_dir"]
+    _WORKER["cache"] = ResultCache(cache_dir) if cache_dir else None
+
+
+def _convert_task(item):
+    path, output = item
+    settings = _WORKER["settings"]
+    t0 = timer()
+    try:
+        data = read_image_bytes(path)
+        frame = convert_cached(_WORKER["converter"], data, _WORKER["cache"])
+        directory = os.path.dirname(output)
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                pass  # made by another worker meanwhile
+        if settings["format"] == "png":
+            img = ascii_to_pil(frame, settings["font_size"],
+                               settings["bg_color"], settings["fg_color"],
+                               font_path=settings["font_path"])
+            img.save(output)
+        else:
+            with io.open(output, "w", encoding="utf-8") as f:
+                f.write(frame.text)
+    except Exception as e:
+        # one bad file shouldn't stop the batch
+        return BatchResult(path, None, "%s: %s" % (type(e).__name__, e),
+                           timer() - t0)
+    return BatchResult(path, output, None, timer() - t0)
+
+
+def find_images(paths, extensions=IMAGE_EXTENSIONS):
+    """
+    Expands files, glob patterns and directories (searched recursively) into
+        a list of image files.  Files named explicitly are kept whatever
+        their extension, the rest are filtered by `extensions`.
+
+    Returns
+    -------
+    list of (path, root) tuples, where `root` is the directory the path was
+        found under, or None if it was named or matched directly.
+
+    """
+    found = []
+    seen = set()
+
+    def add(path, root=None):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            found.append((path, root))
+
+    def is_image(path):
+        return os.path.splitext(path)[1].lower() in extensions
+
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if is_image(name):
+                        add(os.path.join(dirpath, name), path)
+        elif os.path.isfile(path):
+            add(path)
+        else:
+            for match in sorted(glob.glob(path)):
+                if os.path.isfile(match) and is_image(match):
+                    add(match)
+    return found
+
+
+def output_path(path, output_dir, format="text", root=None):
+    """
+    Where `path` goes in `output_dir`: its name with the extension of
+        `format` added (x.png becomes x.png.txt, so x.jpg doesn't land on
+        the same file), under the same sub-directories it had below `root`.
+    """
+    if root is None:
+        name = os.path.basename(path)
+    else:
+        name = os.path.relpath(path, root)
+    return os.path.join(output_dir, name + FORMATS[format])
+
+
+def _collisions(items):
+    # outputs more than one input would write, files named from different
+    #   directories for instance
+    paths = collections.defaultdict(list)
+    for path, output in items:
+        paths[os.path.normcase(os.path.abspath(output))].append(path)
+    return dict((path, others) for others in paths.values()
+                if len(others) > 1 for path in others)
+
+
+def convert_files(paths,
+                  output_dir,
+                  format="text",
+                  scalefactor=0.2,
+                  invert=False,
+                  equalize=True,
+                  lut="simple",
+                  font_path=None,
+                  font_size=10,
+                  bg_color=(20, 20, 20),
+                  fg_color=(255, 255, 255),
+                  workers=None,
+                  cache_dir=None):
+    """
+    Converts image files to ascii text or rendered PNGs in a pool of worker
+        processes.  Results are yielded as they finish, in whatever order
+        that is.  Files that fail are reported and skipped, and so are files
+        that would be written to the same output as another one.
+
+    Parameters
+    ----------
+    paths : list
+        Files, glob patterns and directories, see `find_images`.
+    output_dir : str
+        Where to write the output.  Files found in a directory keep their
+        sub-directories in here.
+    format : str
+        "text" for .txt files or "png" for rendered images.
+    scalefactor : float
+        ASCII characters per pixel.
+    invert : bool
+        Invert luminance?
+    equalize : bool
+        Equalize histogram?
+    lut : str
+        Name of the lookup table to use.
+    font_path : str
+        Font to render with.
+    font_size : int
+        Font size of rendered PNGs.
+    bg_color : tuple (20,20,20)
+        (R,G,B) values for the PNG background.
+    fg_color : tuple (255,255,255)
+        (R,G,B) values for the PNG text.
+    workers : int
+        Number of worker processes.  Defaults to the number of CPUs.  0 or 1
+        converts in this process.
+    cache_dir : str
+        Keep conversions in a `ResultCache` here, shared by all the workers,
+        so files that didn't change since the last batch are not converted
+        again.
+
+    Yields
+    ------
+    BatchResult for each file.
+
+    Examples
+    --------
+
+    >>> for result in convert_files(["assets/"], "out", format="png"):
+    ...     print(result.error or result.output)
+
+    """
+    if format not in FORMATS:
+        raise ValueError("format must be one of %s" % sorted(FORMATS))
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    settings = {"format": format,
+                "scalefactor": scalefactor,
+                "invert": invert,
+                "equalize": equalize,
+                "lut": lut,
+                "font_path": font_path,
+                "font_size": font_size,
+                "bg_color": bg_color,
+                "fg_color": fg_color,
+                "cache_dir": cache_dir}
+    items = [(path, output_path(path, output_dir, format, root))
+             for path, root in find_images(paths)]
+    collisions = _collisions(items)
+    for path, _ in items:
+        if path in collisions:
+            others = [other for other in collisions[path] if other != path]
+            yield BatchResult(path, None, "same output as %s" %
+                              ", ".join(others), 0.0)
+    items = [item for item in items if item[0] not in collisions]
+    if not items:
+        return
+
+    if workers <= 1:
+        _init_worker(settings)
+        try:
+            for item in items:
+                yield _convert_task(item)
+        finally:
+            _WORKER.clear()
+        return
+
+    workers = min(workers, len(items))
+    pool = multiprocessing.Pool(workers, _init_worker, (settings,))
+    # small chunks keep results streaming back, but amortize the round trips
+    chunksize = max(1, min(16, len(items) // (4*workers)))
+    try:
+        for result in pool.imap_unordered(_convert_task, items, chunksize):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class BatchReport(object):
+    """
+    Tallies `BatchResult`s for a throughput summary.
+
+    Attributes
+    ----------
+    converted : int
+        Files written.
+    failed : list
+        `BatchResult`s of the files that weren't.
+    latency : StageStats
+        Time the workers spent per file.
+
+    """
+    def __init__(self):
+        self.converted = 0
+        self.failed = []
+        self.latency = StageStats()
+        self._start = timer()
+
+    @property
+    def elapsed(self):
+        return timer() - self._start
+
+    def add(self, result):
+        if result.error is None:
+            self.converted += 1
+        else:
+            self.failed.append(result)
+        self.latency.add(result.seconds)
+
+    def summary(self):
+        elapsed = self.elapsed
+        total = self.converted + len(self.failed)
+        rate = total / elapsed if elapsed > 0 else 0.0
+        return ("Converted %d of %d files in %.2f s (%.1f files/s, "
+                "%.1f ms per file, %d failed)" %
+                (self.converted, total, elapsed, rate,
+                 self.latency.mean*1000.0, len(self.failed)))
@@ -0,0 +1,362 @@
+"""
+
+cache.py
+
+@author: derricw
+
+Content-addressed cache for conversion results and downloaded images.
+    Results are keyed on a hash of the input bytes and every parameter that
+    affects the output, so the same image converted the same way is only
+    converted once, wherever it came from.
+
+"""
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from asciisciit.frame import AsciiFrame
+
+
+def cache_key(data, params=None):
+    """
+    Key for `data` (bytes) processed with `params` (a dict of json-able
+        values): the sha256 of both.
+    """
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps(params or {}, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def converter_params(converter):
+    """ Everything about a `Converter` that changes its output. """
+    chars, bins = converter.lookup.legacy_lookup()
+    # a locked output size overrides the scalefactor
+    size = converter._output_size if converter.lock_size else None
+    return {"scalefactor": converter.scalefactor,
+            "invert": bool(converter.invert),
+            "equalize": bool(converter.equalize),
+            "lut": u"".join(chars),
+            "bins": bins,
+            "aspect_correction_factor": converter.aspect_correction_factor,
+            "font_path": converter.font_path,
+            "size": None if size is None else list(size)}
+
+
+class ResultCache(object):
+    """
+    Two level cache of bytes values: a least recently used in-memory cache
+        in front of an optional on-disk store.  Both are bounded by the total
+        size of what they hold.  Thread-safe, and the disk store can be
+        shared between processes.
+
+    Parameters
+    ----------
+    directory : str
+        Where to keep the disk store, None for memory only.
+    memory_bytes : int
+        Size of the in-memory cache.
+    disk_bytes : int
+        Size of the disk store.  The least recently used entries are deleted
+        when it grows past this.
+
+    Examples
+    --------
+
+    >>> cache = ResultCache("~/.cache/asciisciit")
+    >>> key = cache_key(data, {"scalefactor": 0.2})
+    >>> text = cache.get(key)
+    >>> if text is None:
+    ...     text = convert(data)
+    ...     cache.put(key, text)
+
+    """
+    def __init__(self, directory=None, memory_bytes=64*1024*1024,
+                 disk_bytes=1024*1024*1024):
+        if directory is not None:
+            directory = os.path.expanduser(directory)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()  # key: size, least recently used first
+        self._disk_size = 0
+        self._lock = threading.RLock()
+        if directory is not None:
+            self._scan()
+
+    @property
+    def hits(self):
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits,
+                    "memory_hits": self.memory_hits,
+                    "disk_hits": self.disk_hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hit_rate,
+                    "evictions": self.evictions,
+                    "memory_entries": len(self._memory),
+                    "memory_bytes": self._memory_size,
+                    "disk_entries": len(self._disk),
+                    "disk_bytes": self._disk_size}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _scan(self):
+        entries = []
+        for sub in os.listdir(self.directory):
+            subdir = os.path.join(self.directory, sub)
+            if len(sub) != 2 or not os.path.isdir(subdir):
+                continue
+            for name in os.listdir(subdir):
+                if name.startswith("."):
+                    continue  # unfinished write
+                stat = os.stat(os.path.join(subdir, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+        self._evict_disk()
+
+    def get(self, key):
+        """ Value for `key`, None if it isn't cached. """
+        with self._lock:
+            value = self._memory.pop(key, None)
+            if value is not None:
+                self._memory[key] = value
+                self.memory_hits += 1
+                return value
+            value = self._read(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, value)
+            return value
+
+    def put(self, key, value):
+        """ Caches `value` (bytes) under `key`. """
+        with self._lock:
+            self._remember(key, value)
+            if self.directory is not None:
+                self._write(key, value)
+
+    def clear(self):
+        """ Empties both levels. """
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            for key in list(self._disk):
+                self._delete(key)
+
+    def _remember(self, key, value):
+        if len(value) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = value
+        self._memory_size += len(value)
+        while self._memory_size > self.memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= len(old)
+
+    def _read(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+        except (IOError, OSError):
+            # deleted, maybe by another process
+            self._disk_size -= self._disk.pop(key, 0)
+            return None
+        # another process may have written it
+        if key in self._disk:
+            self._disk.pop(key)
+        else:
+            self._disk_size += len(value)
+        self._disk[key] = len(value)
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def _write(self, key, value):
+        path = self._path(key)
+        subdir = os.path.dirname(path)
+        if not os.path.isdir(subdir):
+            try:
+                os.makedirs(subdir)
+            except OSError:
+                pass  # made by someone else meanwhile
+        # write then rename, so readers never see half a file
+        fd, tmp = tempfile.mkstemp(prefix=".", dir=subdir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(value)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            os.remove(path)  # windows won't rename over a file
+            os.rename(tmp, path)
+        self._disk_size += len(value) - self._disk.pop(key, 0)
+        self._disk[key] = len(value)
+        self._evict_disk()
+
+    def _delete(self, key):
+        self._disk_size -= self._disk.pop(key)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        while self._disk_size > self.disk_bytes and self._disk:
+            self._delete(next(iter(self._disk)))
+            self.evictions += 1
+
+
+def pack_frame(frame):
+    """ Bytes of an AsciiFrame's character indices, see `unpack_frame`. """
+    out = io.BytesIO()
+    np.save(out, frame.indices, allow_pickle=False)
+    return out.getvalue()
+
+
+def unpack_frame(data, lookup):
+    """ AsciiFrame from `pack_frame` bytes and the lookup table it used. """
+    return AsciiFrame(np.load(io.BytesIO(data), allow_pickle=False), lookup)
+
+
+def convert_cached(converter, data, cache=None):
+    """
+    `converter.convert(data)` for encoded image bytes, looked up in `cache`
+        (a ResultCache) first.  Converters with temporal `smoothing` depend
+        on the frames before this one, so they always convert.
+
+    Returns
+    -------
+    AsciiFrame
+
+    """
+    if cache is None or converter.smoothing:
+        return converter.convert(data)
+    key = cache_key(data, converter_params(converter))
+    packed = cache.get(key)
+    if packed is not None:
+        frame = unpack_frame(packed, converter.lookup)
+        if converter.lock_size and converter._output_size is None:
+            # lock it, same as converting would have
+            rows, cols = frame.shape
+            converter._output_size = (cols, rows)
+        return frame
+    frame = converter.convert(data)
+    cache.put(key, pack_frame(frame))
+    return frame
+
+
+def _max_age(cache_control):
+    max_age = None
+    for directive in cache_control.lower().split(","):
+        name, _, value = directive.strip().partition("=")
+        if name in ("no-cache", "no-store"):
+            return 0
+        if name == "max-age":
+            try:
+                max_age = int(value.strip('"'))
+            except ValueError:
+                return 0
+    return max_age
+
+
+def fetch_url(url, cache=None, timeout=None):
+    """
+    Downloads `url`, keeping the bytes in `cache` (a ResultCache) along with
+        the response's validators.  A cached copy is used as is while it's
+        fresh (Cache-Control max-age), and after that only once the server
+        confirms it hasn't changed (ETag / Last-Modified, answered with 304).
+        Responses without validators or max-age aren't cached.
+
+    Parameters
+    ----------
+    url : str
+        Address to fetch.
+    cache : ResultCache
+        Cache to use, None just downloads.
+    timeout : float
+        Socket timeout in seconds.
+
+    Returns
+    -------
+    bytes
+
+    """
+    # urllib brings in http.client, email and ssl, so it's only imported
+    #   once there's something to download
+    if sys.version_info < (3, 0):
+        from urllib2 import urlopen, Request, HTTPError
+    else:
+        from urllib.request import urlopen, Request
+        from urllib.error import HTTPError
+    if cache is None:
+        return urlopen(url, timeout=timeout).read()
+    key = cache_key(url.encode("utf-8"), {"fetch": 1})
+    meta, body = None, None
+    entry = cache.get(key)
+    if entry is not None:
+        length = int(entry[:8], 16)
+        meta = json.loads(entry[8:8+length].decode("utf-8"))
+        body = entry[8+length:]
+        if meta.get("expires", 0) > time.time():
+            return body
+    request = Request(url)
+    if meta is not None:
+        if meta.get("etag"):
+            request.add_header("If-None-Match", meta["etag"])
+        if meta.get("last_modified"):
+            request.add_header("If-Modified-Since", meta["last_modified"])
+    try:
+        response = urlopen(request, timeout=timeout)
+    except HTTPError as e:
+        if e.code != 304 or body is None:
+            raise
+        headers, fresh = e.headers, body
+    else:
+        headers, fresh = response.headers, response.read()
+    max_age = _max_age(headers.get("Cache-Control") or "")
+    if meta is None or fresh is not body:
+        meta = {}
+    meta.update((name, value) for name, value in
+                (("etag", headers.get("ETag")),
+                 ("last_modified", headers.get("Last-Modified"))) if value)
+    if max_age:
+        meta["expires"] = time.time() + max_age
+    if "no-store" not in (headers.get("Cache-Control") or "").lower() and \
+            (max_age or meta.get("etag") or meta.get("last_modified")):
+        meta = json.dumps(meta).encode("utf-8")
+        cache.put(key, b"%08x" % len(meta) + meta + fresh)
+    return fresh
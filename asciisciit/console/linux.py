@@ -13,6 +13,13 @@ def clear_term():
     print(chr(27) + "[2J")
 
 
+def enable_ansi():
+    """
+    Terminals here understand ANSI escapes already.
+    """
+    return True
+
+
 def set_terminal_size(size):
     """
     Can't get this to work....
@@ -9,12 +9,33 @@ Windows support functions.
 """
 
 import os
+import ctypes
+
+ENABLE_VIRTUAL_TERMINAL_PROCESSING = 0x0004
+STD_OUTPUT_HANDLE = -11
 
 
 def clear_term():
     os.system("cls")
 
 
+def enable_ansi():
+    """
+    Turns on ANSI escape handling for the console (Windows 10 and up).
+        Returns False if the console doesn't support it.
+    """
+    try:
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(STD_OUTPUT_HANDLE)
+        mode = ctypes.c_uint32()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        mode = mode.value | ENABLE_VIRTUAL_TERMINAL_PROCESSING
+        return bool(kernel32.SetConsoleMode(handle, mode))
+    except Exception:
+        return False
+
+
 def set_terminal_size(size):
     try:
         width, height = size
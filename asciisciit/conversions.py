@@ -10,17 +10,24 @@ Conversion functions.
 from bisect import bisect
 import random
 import os
+import io
 
-from PIL import Image, ImageOps, ImageDraw, ImageFont
+from PIL import Image
 import numpy as np
-import cv2
-import imageio
 
 from asciisciit.misc import *
-from asciisciit.lut import get_lut, relative_width
+from asciisciit.lut import get_lut, relative_width, NEWLINE, PY2
+from asciisciit.fonts import FONT_CACHE, get_font
+from asciisciit.frame import AsciiFrame
+from asciisciit.writers import GifWriter
+from asciisciit.cache import convert_cached
 
 DEFAULT_ASPECT_CORRECTION_FACTOR = 6.0/11.0
 RESOURCE_DIR = os.path.join(os.path.dirname(__file__),'res')
+DEFAULT_GIF_DURATION = 100  # ms, what browsers show frames without one for
+MAX_RESIZE_CHANNELS = 128  # CV_CN_MAX is 512 in opencv 4, 128 in 5
+INTER_AREA = 3  # cv2.INTER_AREA, without importing opencv for it
+STRING_TYPES = (basestring,) if PY2 else (str, bytes)
 
 
 def image_to_ascii(img,
@@ -28,7 +35,8 @@ def image_to_ascii(img,
                    invert=False,
                    equalize=True,
                    lut='simple',
-                   aspect_correction_factor=None):
+                   aspect_correction_factor=None,
+                   cache=None):
     """
     Generates and ascii string from an image of some kind.
 
@@ -42,6 +50,9 @@ def image_to_ascii(img,
         Invert luminance?
     equalize : bool
         Equalize histogram?
+    cache : ResultCache
+        Look file and url images up in this cache before converting them,
+        see `cache.ResultCache`.
 
     Returns
     -------
@@ -55,7 +66,14 @@ def image_to_ascii(img,
 
     """
     if type(img) == str:
-        img = open_pil_img(img)
+        # decoded at reduced size by the converter
+        converter = Converter(scalefactor, invert, equalize, lut,
+                              aspect_correction_factor=aspect_correction_factor,
+                              lock_size=False)
+        if cache is not None:
+            data = read_image_bytes(img, cache)
+            return convert_cached(converter, data, cache).text
+        return converter.convert(img).text
     elif type(img) == np.ndarray:
         img = numpy_to_pil(img)
     try:
@@ -113,19 +131,188 @@ def pil_to_ascii(img,
         aspect_correction_factor = get_aspect_correction_factor(lookup.exemplar)
 
     img = img.resize(
-        (int(img.size[0]*scalefactor), 
-         int(img.size[1]*scalefactor*aspect_correction_factor)),
+        get_output_size(img.size, scalefactor, aspect_correction_factor),
         Image.BILINEAR)
     img = img.convert("L")  # convert to mono
-    if equalize:
-        img = ImageOps.equalize(img)
+    img = np.array(img, dtype=np.uint8)
 
-    if invert:
-        img = ImageOps.invert(img)
+    # equalization and inversion are folded into the lookup table
+    mapping = pil_equalize_table(get_histogram(img)) if equalize else None
+    return lookup.to_text(img, invert, mapping)
 
-    img = np.array(img, dtype=np.uint8)
 
-    return u"\n" + u"".join(lookup.apply(img).flatten().tolist())
+class Converter(object):
+    """
+    Reusable converter for streams of frames.  Everything that doesn't depend
+        on pixel data (lookup table, aspect correction, output size) is worked
+        out once so that `convert` only does the pixel work.
+
+    Parameters
+    ----------
+    scalefactor : float
+        ASCII characters per pixel.
+    invert : bool
+        Invert luminance?
+    equalize : bool
+        equalize histogram (for best results do this).
+    lut : str
+        Name of the lookup table to use.
+    font_path : str
+        Font used to compute the aspect correction factor.
+    aspect_correction_factor : float
+        Overrides the factor computed from the lut and font.
+    lock_size : bool
+        Lock the output dimensions on the first frame.  Later frames are
+        resized to the same number of rows and columns, until `scalefactor`
+        is changed.
+    smoothing : float
+        Temporal smoothing for histogram equalization, between 0 and 1.
+        The equalization histogram is blended across frames with this much
+        weight given to the previous frames, which stops video from
+        flickering.  0 equalizes every frame on its own.
+
+    Examples
+    --------
+
+    >>> converter = Converter(scalefactor=0.2, lut="simple")
+    >>> for frame in frames:
+    ...     print(converter.convert(frame))
+
+    """
+    def __init__(self,
+                 scalefactor=0.2,
+                 invert=False,
+                 equalize=True,
+                 lut='simple',
+                 font_path=None,
+                 aspect_correction_factor=None,
+                 lock_size=True,
+                 smoothing=0.0):
+        self.scalefactor = scalefactor
+        self.invert = invert
+        self.equalize = equalize
+        self.lut = lut
+        self.font_path = font_path
+        self.lookup = get_lut(lut)
+        if aspect_correction_factor is None:
+            aspect_correction_factor = get_aspect_correction_factor(
+                self.lookup.exemplar, font_path)
+        self.aspect_correction_factor = aspect_correction_factor
+        self.lock_size = lock_size
+        if not 0.0 <= smoothing < 1.0:
+            raise ValueError("smoothing must be in [0, 1)")
+        self.smoothing = smoothing
+        self._output_size = None
+        self._histogram = None
+
+    @property
+    def scalefactor(self):
+        return self._scalefactor
+
+    @scalefactor.setter
+    def scalefactor(self, val):
+        # a new scale unlocks the output size, the next frame picks a new one
+        if val != getattr(self, "_scalefactor", None):
+            self._scalefactor = val
+            self._output_size = None
+
+    @property
+    def size(self):
+        """ (rows, columns) of the ascii output, None before the first frame. """
+        if self._output_size is None:
+            return None
+        cols, rows = self._output_size
+        # matches get_ascii_image_size, which also counts the empty strings
+        #   around the leading and trailing newlines
+        return (rows + 2, cols)
+
+    def reset(self):
+        """ Unlocks the output dimensions and forgets the smoothed histogram. """
+        self._output_size = None
+        self._histogram = None
+
+    def _equalize_table(self, img):
+        histogram = get_histogram(img)
+        if not self.smoothing:
+            return pil_equalize_table(histogram)
+        histogram = histogram.astype(np.float64)
+        if self._histogram is None:
+            self._histogram = histogram
+        else:
+            # blended in pixel counts of this frame, in case its size changed
+            previous = self._histogram * (histogram.sum() /
+                                          max(self._histogram.sum(), 1.0))
+            self._histogram = (self.smoothing * previous +
+                               (1.0 - self.smoothing) * histogram)
+        # same mapping as without smoothing, only the histogram is blended
+        return pil_equalize_table(self._histogram)
+
+    def output_size(self, input_size):
+        """
+        (columns, rows) of the output for frames of `input_size` (width,
+            height).  With `lock_size`, this locks the output size, so
+            frames that were already shrunk to it can be converted.
+        """
+        return self._get_output_size(input_size)
+
+    def _get_output_size(self, input_size):
+        if self._output_size is None or not self.lock_size:
+            self._output_size = get_output_size(input_size,
+                                                self.scalefactor,
+                                                self.aspect_correction_factor)
+        return self._output_size
+
+    def convert(self, frame):
+        """
+        Converts a single frame to ascii.
+
+        Parameters
+        ----------
+        frame : str, bytes, ndarray, PIL.Image
+            Frame to convert.  Files, urls and encoded image bytes are
+            decoded at close to the output size (see `decode_reduced`).
+
+        Returns
+        -------
+        AsciiFrame
+
+        """
+        if isinstance(frame, np.ndarray):
+            frame = numpy_to_pil(frame)
+        elif isinstance(frame, STRING_TYPES):
+            # we own this one, so decode it at close to the output size
+            if is_encoded_image(frame):
+                frame = Image.open(io.BytesIO(frame))
+            else:
+                frame = open_pil_img(frame)
+            size = self._get_output_size(frame.size)
+            return self._convert_pil(decode_reduced(frame, size), size)
+        elif not isinstance(frame, Image.Image):
+            raise TypeError("That image type doesn't work.  Try PIL, Numpy, or file path...")
+        return self._convert_pil(frame, self._get_output_size(frame.size))
+
+    def _convert_pil(self, frame, size):
+        img = frame.resize(size, Image.BILINEAR)
+        img = np.array(img.convert("L"), dtype=np.uint8)
+        mapping = self._equalize_table(img) if self.equalize else None
+        return AsciiFrame(self.lookup.indices(img, self.invert, mapping),
+                          self.lookup)
+
+
+def is_encoded_image(data):
+    """
+    Whether `data` is encoded image bytes rather than a file path or url.
+        On python 2, where paths are bytes too, paths are told apart by not
+        holding NUL bytes (every image header has one) and existing, or
+        looking like a url.
+    """
+    if not isinstance(data, bytes):
+        return False
+    if not PY2:
+        return True
+    if b"\0" in data[:64]:
+        return True
+    return not (b"://" in data[:16] or os.path.exists(data))
 
 
 def ascii_to_pil(text, font_size=10, bg_color=(20, 20, 20),
@@ -136,8 +323,9 @@ def ascii_to_pil(text, font_size=10, bg_color=(20, 20, 20),
 
     Parameters
     ----------
-    text : str
-        Ascii text to render.
+    text : str, AsciiFrame
+        Ascii text to render.  Frames are rendered straight from their
+        character indices.
     font_size : int (10)
         Font size for rendered image.
     bg_color : tuple (20,20,20)
@@ -159,37 +347,80 @@ def ascii_to_pil(text, font_size=10, bg_color=(20, 20, 20),
     >>> pil.show()
 
     """
-    font = get_font(font_path, font_size)
-    if relative_width(text[1]) == 2:
-        font_width, font_height = font.getsize(u"\u3000")
-    else:
-        font_width, font_height = font.getsize(u" ")
+    if isinstance(text, AsciiFrame):
+        atlas = get_atlas(font_path, font_size, bg_color, fg_color, text.wide)
+        rows, _ = text.shape
+        return atlas.render(text.chars, text.indices, 1, rows + 2)
+    wide = relative_width(text[1]) == 2
+    atlas = get_atlas(font_path, font_size, bg_color, fg_color, wide)
+    chars, indices, line_offset, lines = text_to_grid(text)
+    return atlas.render(chars, indices, line_offset, lines)
+
+
+def get_atlas(font_path=None, font_size=10, bg_color=(20, 20, 20),
+              fg_color=(255, 255, 255), wide=False):
+    """
+    Glyph atlas for rendering text in a font, size and colors.  Atlases are
+        kept in the font cache so each glyph is only rasterized once.
 
-    img_height, img_width = get_ascii_image_size(text)
+    Parameters
+    ----------
+    wide : bool
+        Use cells sized for wide (CJK) characters.
 
-    y_padding = 1
+    Returns
+    -------
+    GlyphAtlas
 
-    out_img = np.zeros(((font_height+y_padding)*img_height, 
-                         font_width*img_width,
-                         3),
-                       dtype=np.uint8)
-    out_img[:, :, 0] += bg_color[0]
-    out_img[:, :, 1] += bg_color[1]
-    out_img[:, :, 2] += bg_color[2]
+    """
+    return FONT_CACHE.get_atlas(font_path, font_size, bg_color, fg_color, wide)
 
-    img = Image.fromarray(out_img)
-    draw = ImageDraw.Draw(img)
 
-    for index, line in enumerate(text.split("\n")):
-        y = (font_height+y_padding)*index
-        draw.text((0, y), line, fg_color, font=font)
-    return img
+def text_to_grid(text):
+    """
+    Splits ascii text into a grid of characters.  The grid is as wide as
+        the second line, like get_ascii_image_size.  Shorter lines are
+        padded with spaces.
+
+    Returns
+    -------
+    tuple : (chars, indices, line_offset, lines)
+        `indices` is a (rows, columns) array of indices into `chars`,
+        `line_offset` the text line of its first row and `lines` the total
+        number of text lines.
+
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+    newlines = np.flatnonzero(codes == NEWLINE)
+    columns = len(text.split("\n", 2)[1])
+    rows = len(newlines) - 1
+    if (rows >= 0 and len(codes) == rows*(columns+1) + 1 and
+            np.array_equal(newlines, np.arange(0, len(codes), columns+1))):
+        # the frames we make: leading newline, every row terminated
+        grid = codes[1:].reshape(rows, columns+1)[:, :-1]
+        line_offset, lines = 1, rows + 2
+    else:
+        split = text.split("\n")
+        padded = u"".join(line[:columns].ljust(columns) for line in split)
+        grid = np.frombuffer(padded.encode("utf-32-le"), dtype="<u4")
+        grid = grid.reshape(len(split), columns)
+        line_offset, lines = 0, len(split)
+    unique, indices = np.unique(grid, return_inverse=True)
+    chars = list(unique.astype("<u4").tobytes().decode("utf-32-le"))
+    return chars, indices.reshape(grid.shape), line_offset, lines
 
 
 def ascii_seq_to_gif(seq, output_path, fps=15.0, font_size=10,
-                     font_path=None):
+                     font_path=None, colors=2, bg_color=(20, 20, 20),
+                     fg_color=(255, 255, 255), optimize=True,
+                     durations=None):
     """ Creates a gif from a sequence of ascii images.
 
+        Frames are rendered straight to palette indices and streamed to
+            the file one at a time (see `GifWriter`), so any length of
+            sequence, including generators, can be written in constant
+            memory.
+
         Parameters
         ----------
         output_path : str
@@ -198,32 +429,74 @@ def ascii_seq_to_gif(seq, output_path, fps=15.0, font_size=10,
             FPS for gif playback.
         font_size : int
             Font size for ascii.
+        colors : int
+            Number of shades between the background and text color.  2
+            gives the smallest files, up to 255 keeps the anti-aliasing.
+        bg_color : tuple (20,20,20)
+            (R,G,B) values for image background.
+        fg_color : tuple (255,255,255)
+            (R,G,B) values for text color.
+        optimize : bool
+            Only store the part of each frame that changed.
+        durations : iterable
+            Milliseconds to show each frame for, instead of `fps`.  Read
+            along with `seq`, so it can be a generator too.
     """
-    images = []
-
-    status = StatusBar(len(seq), text="Generating frames: ",)
+    if not 2 <= colors <= 255:
+        raise ValueError("colors must be between 2 and 255")
+    bg = np.array(bg_color, dtype=np.float64)
+    fg = np.array(fg_color, dtype=np.float64)
+    palette = [tuple(np.round(bg + (fg - bg)*i/(colors - 1)).astype(int))
+               for i in range(colors)]
+    # text coverage (0-255) to the nearest shade
+    levels = ((np.arange(256)*(colors - 1) + 127)//255).astype(np.uint8)
 
-    for index, ascii_img in enumerate(seq):
-        if type(ascii_img) == str:
-            #raw text
-            text = ascii_img
-        else:
-            #AsciiImage instance
-            text = ascii_img.data
-        images.append(
-            ascii_to_pil(text,
-                         font_size=font_size,
-                         font_path=font_path
-                        )
-                    )
-        status.update(index)
+    try:
+        total = len(seq)
+    except TypeError:
+        total = None
+    status = StatusBar(total or 0, text="Generating frames: ",)
+
+    if durations is not None:
+        durations = iter(durations)
+    with GifWriter(output_path, palette, 1000.0/fps,
+                   optimize=optimize) as gif:
+        for index, ascii_img in enumerate(seq):
+            if isinstance(ascii_img, (str, AsciiFrame)):
+                #raw text
+                text = ascii_img
+            else:
+                #AsciiImage instance
+                text = ascii_img.frame
+            duration = None if durations is None else next(durations)
+            gif.write(levels[ascii_to_coverage(text, font_size, font_path)],
+                      duration)
+            if total:
+                status.update(index)
+            else:
+                status.update_custom(index)
 
     status.complete()
 
-    duration = 1.0/fps
 
-    images_np = [np.array(img) for img in images]
-    imageio.mimsave(output_path, images_np, duration=duration)
+def ascii_to_coverage(text, font_size=10, font_path=None):
+    """
+    Renders Ascii text like `ascii_to_pil`, but as text coverage instead of
+        colors: 0 where the image is background, 255 where it's text.
+
+    Returns
+    -------
+    ndarray : (height, width) uint8 array.
+
+    """
+    if isinstance(text, AsciiFrame):
+        atlas = get_atlas(font_path, font_size, wide=text.wide)
+        rows, _ = text.shape
+        return atlas.coverage(text.chars, text.indices, 1, rows + 2)
+    wide = relative_width(text[1]) == 2
+    atlas = get_atlas(font_path, font_size, wide=wide)
+    chars, indices, line_offset, lines = text_to_grid(text)
+    return atlas.coverage(chars, indices, line_offset, lines)
 
 
 def numpy_to_ascii(img,
@@ -253,30 +526,107 @@ def numpy_to_ascii(img,
     -------
     str
     """
+    import cv2
     lookup = get_lut(lut)
     if aspect_correction_factor is None:
         aspect_correction_factor = get_aspect_correction_factor(lookup.exemplar)
-    h, w = img.shape
+    h, w = img.shape[:2]
 
     img = cv2.resize(
         img,
-        (
-            int(w*scalefactor),
-            int(h*scalefactor*aspect_correction_factor)
-        )
+        get_output_size((w, h), scalefactor, aspect_correction_factor)
     )
 
     if img.ndim == 3: # weak check for RGB
         # works in opencv 3.4.3 but who knows, they keep moving/renaming stuff
         img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
 
-    if equalize:
-        img=cv2.equalizeHist(img)
+    # equalization and inversion are folded into the lookup table
+    mapping = cv2_equalize_table(get_histogram(img)) if equalize else None
+    return lookup.to_text(img, invert, mapping)
+
+
+def frames_to_ascii(stack,
+                    scalefactor=0.2,
+                    invert=False,
+                    equalize=True,
+                    lut="simple",
+                    aspect_correction_factor=None,
+                    interpolation=INTER_AREA,
+                    as_frames=True):
+    """
+    Converts a whole stack of frames (a movie or gif from `gif_to_numpy`)
+        at once.  Resizing, grayscale conversion, equalization and the
+        lookup are done for many frames per numpy/cv2 call instead of frame
+        by frame.
+
+    Parameters
+    ----------
+    stack : ndarray
+        (N, H, W) gray or (N, H, W, C) RGB or RGBA frames.
+    scalefactor : float
+        ASCII characters per pixel.
+    invert : bool
+        Invert luminance?
+    equalize : bool
+        equalize histogram of each frame (for best results do this).
+    lut : str
+        Name of the lookup table to use.
+    interpolation : int
+        cv2 interpolation for resizing.  cv2.INTER_AREA averages pixels
+        when shrinking.  With cv2.INTER_LINEAR gray frames come out the same
+        as from `numpy_to_ascii`.  Color frames are converted to gray before
+        resizing, so they can differ from it by rounding.
+    as_frames : bool
+        Return a list of AsciiFrame instead of the character index array.
 
-    if invert:
-        img = 255-img
+    Returns
+    -------
+    list of AsciiFrame, or (N, rows, columns) ndarray of character indices
+
+    """
+    import cv2
+    lookup = get_lut(lut)
+    if aspect_correction_factor is None:
+        aspect_correction_factor = get_aspect_correction_factor(lookup.exemplar)
+    stack = np.asarray(stack)
+    n, h, w = stack.shape[:3]
+    channels = stack.shape[3] if stack.ndim == 4 else 1
+    size = get_output_size((w, h), scalefactor, aspect_correction_factor)
+    cols, rows = size
+    table = lookup.index_table(invert)
+    indices = np.empty((n, rows, cols), dtype=table.dtype)
+
+    # gray frames are stacked along the channel axis so cv2 resizes a batch
+    #   per call, up to the number of channels it supports
+    if interpolation == INTER_AREA:
+        batch = 4  # area resizing only handles up to 4 channels
+    else:
+        batch = MAX_RESIZE_CHANNELS
+    for start in range(0, n, batch):
+        chunk = np.ascontiguousarray(stack[start:start+batch])
+        k = len(chunk)
+        if channels == 3:
+            chunk = cv2.cvtColor(chunk.reshape(k*h, w, 3), cv2.COLOR_RGB2GRAY)
+        elif channels == 4:
+            chunk = cv2.cvtColor(chunk.reshape(k*h, w, 4), cv2.COLOR_RGBA2GRAY)
+        chunk = np.ascontiguousarray(chunk.reshape(k, h, w).transpose(1, 2, 0))
+        small = cv2.resize(chunk, size, interpolation=interpolation)
+        small = small.reshape(rows, cols, k).transpose(2, 0, 1).reshape(k, -1)
+        if equalize:
+            # one histogram and one fused lookup per frame
+            offsets = (np.arange(k) * 256)[:, np.newaxis]
+            histograms = np.bincount((small + offsets).ravel(),
+                                     minlength=256*k).reshape(k, 256)
+            tables = table[cv2_equalize_table(histograms)]
+            cells = np.take_along_axis(tables, small, axis=1)
+        else:
+            cells = table[small]
+        indices[start:start+k] = cells.reshape(k, rows, cols)
 
-    return u"\n" + u"".join(lookup.apply(img).flatten().tolist())
+    if as_frames:
+        return [AsciiFrame(cells, lookup) for cells in indices]
+    return indices
 
 
 def image_to_numpy(path):
@@ -294,64 +644,159 @@ def numpy_to_pil(nparray):
     return Image.fromarray(nparray)
 
 
-def get_font(font_path=None, font_size=10):
-    if not font_path:
-        font_path = os.path.join(RESOURCE_DIR, "Cousine-Regular.ttf")
+def get_histogram(img):
+    """
+    256 bin histogram of a uint8 image.
+    """
+    return np.bincount(img.ravel(), minlength=256)
+
 
-    return ImageFont.truetype(font_path, font_size)
+def pil_equalize_table(histogram):
+    """
+    256-entry mapping that equalizes an image with the given histogram.
+        Gives the same result as PIL.ImageOps.equalize.  Also accepts float
+        (blended) histograms, in pixel counts.
+
+    Parameters
+    ----------
+    histogram : ndarray
+        256 bin histogram from `get_histogram`.
+
+    Returns
+    -------
+    ndarray : uint8 mapping, index it with the image to equalize it.
+    """
+    histogram = np.asarray(histogram)
+    if histogram.dtype.kind != "f":
+        histogram = histogram.astype(np.int64)
+    used = histogram[histogram > 0]
+    if len(used) <= 1:
+        return np.arange(256, dtype=np.uint8)
+    step = (used.sum() - used[-1]) // 255
+    if not step:
+        return np.arange(256, dtype=np.uint8)
+    n = step // 2 + np.concatenate(([0], np.cumsum(histogram)[:-1]))
+    return np.minimum(n // step, 255).astype(np.uint8)
+
+
+def cv2_equalize_table(histogram):
+    """
+    256-entry mapping that equalizes an image with the given histogram.
+        Gives the same result as cv2.equalizeHist.  Also accepts float
+        (normalized or blended) histograms, and stacks of histograms.
+
+    Parameters
+    ----------
+    histogram : ndarray
+        256 bin histogram from `get_histogram`, or (..., 256) histograms.
+
+    Returns
+    -------
+    ndarray : uint8 mapping, index it with the image to equalize it.  One
+        mapping per histogram for stacks.
+    """
+    histogram = np.asarray(histogram)
+    first = np.argmax(histogram > 0, axis=-1)[..., np.newaxis]
+    first_count = np.take_along_axis(histogram, first, axis=-1)
+    total = histogram.sum(axis=-1, keepdims=True)
+    remaining = (total - first_count).astype(np.float32)
+    # opencv does this math in single precision
+    scale = np.float32(255.0) / np.where(remaining > 0, remaining, 1)
+    cumulative = (np.cumsum(histogram, axis=-1) - first_count).astype(np.float32)
+    table = np.clip(np.rint(cumulative * scale), 0, 255).astype(np.uint8)
+    bins = np.arange(256)
+    table[bins < first] = 0
+    # flat images map everything to their one value, empty ones are left be
+    flat = (remaining <= 0)[..., 0]
+    table[flat] = first[flat]
+    table[(total == 0)[..., 0]] = bins
+    return table
+
+
+def get_output_size(input_size, scalefactor, aspect_correction_factor):
+    """
+    Ascii output dimensions for an image.
+
+    Parameters
+    ----------
+    input_size : tuple
+        (width, height) of the input image in pixels.
+
+    Returns
+    -------
+    tuple : (columns, rows)
+    """
+    width, height = input_size
+    return (int(width*scalefactor),
+            int(height*scalefactor*aspect_correction_factor))
 
 
 def get_aspect_correction_factor(exemplar, font_path=None, font_size=10):
     if font_path is None:
         factor = relative_width(exemplar)*DEFAULT_ASPECT_CORRECTION_FACTOR
     else:
-        font = get_font(font_path, font_size)
-        width, height = font.getsize(exemplar)
-        factor = float(width) / height
+        factor = FONT_CACHE.get_aspect_correction_factor(exemplar,
+                                                         font_path,
+                                                         font_size)
 
     return factor
 
 
-def gif_to_numpy(gif_path):
+def read_gif(gif, size=None, gray=False):
     """
-    Converts a GIF into a numpy movie.
+    Reads the frames of a GIF one at a time, in a single pass.  Only the
+        current frame is held in memory.
+
+    Frames are composited the way GIFs are displayed (partial frames drawn
+        over the previous ones, disposal methods applied).
+
+    Parameters
+    ----------
+    gif : str, PIL.Image
+        File path, url or opened GIF.
+    size : tuple
+        (width, height) to resize frames to as they're read.  Use with
+        `gray` to read straight at the ascii resolution (see
+        `Converter.output_size`).
+    gray : bool
+        Convert frames to gray, (h, w) instead of (h, w, 4) RGBA.
+
+    Yields
+    ------
+    tuple : (frame, duration) with the frame as a uint8 ndarray and its
+        duration in milliseconds.
+
     """
-    gif = open_pil_img(gif_path)
-    if hasattr(gif, 'info'):
-        frame_duration = gif.info.get('duration', None)
-    else:
-        frame_duration = None
-    length = get_length_of_gif(gif)
-
-    size = gif.size
-    
-    status = StatusBar(length, "Reading frames: ")
-
-    frames = []
-    frame_count = 0
-    while gif:
-        new_img = Image.new("RGBA",size)
-        new_img.paste(gif)
-        frames.append(new_img)
-        frame_count += 1
+    if not isinstance(gif, Image.Image):
+        gif = open_pil_img(gif)
+    index = 0
+    while True:
         try:
-            gif.seek(frame_count)
+            gif.seek(index)
         except EOFError:
             break
-        status.update(frame_count)
+        duration = gif.info.get("duration") or DEFAULT_GIF_DURATION
+        frame = gif.convert("L" if gray else "RGBA")
+        if size is not None and frame.size != tuple(size):
+            frame = frame.resize(size, Image.BILINEAR)
+        yield np.asarray(frame), duration
+        index += 1
 
-    status.complete()
 
-    assert(length==len(frames))
+def gif_to_numpy(gif_path):
+    """
+    Converts a GIF into a numpy movie.  See `read_gif` for reading it one
+        frame at a time instead.
 
-    final_frame_count = len(frames)
-    frame1 = np.array(frames[0])
-    shape = frame1.shape
-    matrix = np.zeros((final_frame_count,shape[0],shape[1],shape[2]), dtype=np.uint8)
-    for i, frame in enumerate(frames):
-        img = np.asarray(frame)
-        matrix[i] = img
-    return matrix, frame_duration
+    Returns
+    -------
+    tuple : ((N, H, W, 4) RGBA ndarray, duration of the first frame in ms,
+        None if it doesn't have one)
+    """
+    gif = open_pil_img(gif_path)
+    frame_duration = gif.info.get('duration', None)
+    frames = [frame for frame, _ in read_gif(gif)]
+    return np.stack(frames), frame_duration
 
 
 def figure_to_numpy(mpl_figure):
@@ -0,0 +1,159 @@
+"""
+
+fonts.py
+
+@author: derricw
+
+Font loading and glyph metrics, cached for the whole library.
+
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import ImageFont
+
+from asciisciit.atlas import GlyphAtlas
+
+RESOURCE_DIR = os.path.join(os.path.dirname(__file__), 'res')
+DEFAULT_FONT_PATH = os.path.join(RESOURCE_DIR, "Cousine-Regular.ttf")
+Y_PADDING = 1
+
+
+def get_text_size(font, text):
+    """
+    (width, height) of text drawn at the origin.  Same as the
+        `FreeTypeFont.getsize` that was removed in Pillow 10.
+    """
+    _, _, right, bottom = font.getbbox(text)
+    return (right, bottom)
+
+
+class _FontEntry(object):
+    __slots__ = ("font", "cell_sizes", "aspect_factors", "atlases")
+
+    def __init__(self, font):
+        self.font = font
+        self.cell_sizes = {}
+        self.aspect_factors = {}
+        self.atlases = OrderedDict()
+
+
+class FontCache(object):
+    """
+    Bounded, thread-safe cache of loaded fonts and everything derived from
+        them (cell sizes, aspect correction factors, glyph atlases), keyed
+        by (font_path, font_size).  The least recently used font is evicted
+        along with its metrics once `maxsize` fonts are loaded, and the least
+        recently used atlas of a font once it has `max_atlases` of them (one
+        per pair of colors).
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of (font_path, font_size) entries.
+    max_atlases : int
+        Maximum number of glyph atlases per entry.
+
+    """
+    def __init__(self, maxsize=32, max_atlases=16):
+        self.maxsize = maxsize
+        self.max_atlases = max_atlases
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _entry(self, font_path, font_size):
+        if not font_path:
+            font_path = DEFAULT_FONT_PATH
+        key = (font_path, font_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.pop(key)
+                self._entries[key] = entry  # most recently used
+                self.hits += 1
+                return entry
+            self.misses += 1
+            entry = _FontEntry(ImageFont.truetype(font_path, font_size))
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return entry
+
+    def get_font(self, font_path=None, font_size=10):
+        return self._entry(font_path, font_size).font
+
+    def get_cell_size(self, font_path=None, font_size=10, wide=False):
+        """
+        (width, height) of a character cell, measured from a space, or an
+            ideographic space for wide characters.
+        """
+        return self._cell_size(self._entry(font_path, font_size), wide)
+
+    def _cell_size(self, entry, wide):
+        with self._lock:
+            size = entry.cell_sizes.get(wide)
+            if size is None:
+                size = get_text_size(entry.font, u"\u3000" if wide else u" ")
+                entry.cell_sizes[wide] = size
+        return size
+
+    def get_aspect_correction_factor(self, exemplar, font_path=None,
+                                     font_size=10):
+        """ Width / height of a character from a lookup table. """
+        entry = self._entry(font_path, font_size)
+        with self._lock:
+            factor = entry.aspect_factors.get(exemplar)
+            if factor is None:
+                width, height = get_text_size(entry.font, exemplar)
+                factor = float(width) / height
+                entry.aspect_factors[exemplar] = factor
+        return factor
+
+    def get_atlas(self, font_path=None, font_size=10, bg_color=(20, 20, 20),
+                  fg_color=(255, 255, 255), wide=False):
+        """ Glyph atlas for rendering text in this font, size and colors. """
+        entry = self._entry(font_path, font_size)
+        key = (tuple(bg_color), tuple(fg_color), wide)
+        with self._lock:
+            atlas = entry.atlases.pop(key, None)
+            if atlas is not None:
+                entry.atlases[key] = atlas  # most recently used
+        if atlas is None:
+            width, height = self._cell_size(entry, wide)
+            atlas = GlyphAtlas(entry.font,
+                               (width, height + Y_PADDING),
+                               bg_color,
+                               fg_color)
+            with self._lock:
+                atlas = entry.atlases.setdefault(key, atlas)
+                while len(entry.atlases) > self.max_atlases:
+                    entry.atlases.popitem(last=False)
+        return atlas
+
+    def stats(self):
+        """ Cache statistics. """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": float(self.hits) / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+FONT_CACHE = FontCache()
+
+
+def get_font(font_path=None, font_size=10):
+    return FONT_CACHE.get_font(font_path, font_size)
@@ -0,0 +1,115 @@
+"""
+
+frame.py
+
+@author: derricw
+
+Converted ascii frames.
+
+"""
+from asciisciit.lut import PY2, relative_width
+
+
+class AsciiFrame(object):
+    """
+    A converted frame, stored as character indices into a lookup table.  The
+        text is only built the first time something asks for it, so code
+        that works with the cells (renderers, diffing, writers) never pays
+        for it.
+
+    Frames stand in for the text they represent: they print, compare equal
+        to, and have the length and string methods of the text returned by
+        the conversion functions (leading newline, every row terminated).
+
+    Parameters
+    ----------
+    indices : ndarray
+        (rows, columns) array of character indices.
+    lut : LUT
+        Lookup table the indices refer to.
+    text : str
+        Already built text, if there is one.
+
+    """
+    __slots__ = ("indices", "lut", "_text")
+
+    def __init__(self, indices, lut, text=None):
+        self.indices = indices
+        self.lut = lut
+        self._text = text
+
+    @property
+    def shape(self):
+        """ (rows, columns) """
+        return self.indices.shape
+
+    @property
+    def size(self):
+        """ Same as get_ascii_image_size of the text. """
+        rows, cols = self.indices.shape
+        return (rows + 2, cols)
+
+    @property
+    def chars(self):
+        return self.lut.chars
+
+    @property
+    def wide(self):
+        return relative_width(self.lut.exemplar) == 2
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.lut.indices_to_text(self.indices)
+        return self._text
+
+    def __str__(self):
+        if PY2:
+            return self.text.encode('utf-8')
+        return self.text
+
+    def __unicode__(self):
+        return self.text
+
+    def __repr__(self):
+        rows, cols = self.indices.shape
+        return "<AsciiFrame %dx%d>" % (rows, cols)
+
+    def __len__(self):
+        rows, cols = self.indices.shape
+        return rows*(cols+1) + 1
+
+    def __eq__(self, other):
+        if isinstance(other, AsciiFrame):
+            if other.lut is self.lut:
+                return (self.indices.shape == other.indices.shape and
+                        (self.indices == other.indices).all())
+            other = other.text
+        return self.text == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __getitem__(self, key):
+        return self.text[key]
+
+    def __iter__(self):
+        return iter(self.text)
+
+    def __contains__(self, item):
+        return item in self.text
+
+    def __add__(self, other):
+        return self.text + other
+
+    def __radd__(self, other):
+        return other + self.text
+
+    def __getattr__(self, name):
+        # everything else behaves like the text
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.text, name)
@@ -6,13 +6,14 @@ Look up tables for asciisciit.
 """
 import os
 import sys
+import threading
+from collections import OrderedDict
 import numpy as np
-from PIL import ImageFont
 from unicodedata import east_asian_width as eaw
-from bisect import bisect
 
 PY2 = sys.version_info[0] < 3
 RESOURCE_DIR = os.path.join(os.path.dirname(__file__),'res')
+NEWLINE = ord(u"\n")
 
 
 RELATIVE_WIDTHS = {
@@ -41,67 +42,149 @@ class LUT(object):
         for i, char in enumerate(chars):
             self._chars[i] = char
         self._bins = np.array(bins, dtype=np.uint8)
+        # input is always uint8, so resolve every possible value up front
+        #   and turn each lookup into a single gather
+        index_dtype = np.uint8 if len(chars) <= 256 else np.uint16
+        self._index = np.digitize(np.arange(256), self._bins).astype(index_dtype)
+        self._index_inverted = self._index[::-1].copy()
+        self._table = self._chars[self._index]
+        self._table_inverted = self._chars[self._index_inverted]
+        # code points for building text in one contiguous buffer.  ascii
+        #   luts get a byte buffer, everything else UCS4
+        codes = [ord(char) for char in chars]
+        if max(codes) < 128:
+            self._codes = np.array(codes, dtype=np.uint8)
+            self._encoding = "ascii"
+        else:
+            self._codes = np.array(codes, dtype="<u4")
+            self._encoding = "utf-32-le"
+        self._code_table = self._codes[self._index]
+        self._code_table_inverted = self._codes[self._index_inverted]
 
     @property
     def exemplar(self):
         return self._chars.tolist()[0]
 
+    @property
+    def chars(self):
+        return self._chars.tolist()
+
     def legacy_lookup(self):
         """Return legacy LUT form (chars, bins)."""
         return self._chars.tolist(), self._bins.tolist()
 
-    def apply(self, img):
+    def index_table(self, invert=False, mapping=None):
+        """
+        Returns the 256-entry table mapping uint8 luminance to character
+            index, optionally with inversion folded in.  `mapping` is
+            another 256-entry table (histogram equalization for instance)
+            applied before the inversion and the lookup.
+        """
+        table = self._index_inverted if invert else self._index
+        if mapping is not None:
+            table = table[mapping]
+        return table
+
+    def indices(self, img, invert=False, mapping=None):
+        """Character index for every pixel of a uint8 image."""
+        return self.index_table(invert, mapping)[img]
+
+    def apply(self, img, invert=False):
         text = np.chararray((img.shape[0], img.shape[1]+1), unicode=True)
         text[:,-1] = u"\n"
-        text[:,:-1] = self._chars[np.digitize(img, self._bins)]
+        table = self._table_inverted if invert else self._table
+        text[:,:-1] = table[img]
 
         return text
 
+    def to_text(self, img, invert=False, mapping=None):
+        """
+        Ascii text for a uint8 image.  Every row is terminated by a newline
+            and the text starts with one, same as `apply` flattened and
+            joined with a leading newline.  See `index_table` for `mapping`.
+        """
+        table = self._code_table_inverted if invert else self._code_table
+        if mapping is not None:
+            table = table[mapping]
+        return self._assemble(table, img)
+
+    def indices_to_text(self, indices):
+        """Ascii text for an array of character indices."""
+        return self._assemble(self._codes, indices)
+
+    def _assemble(self, table, arr):
+        rows, cols = arr.shape
+        buf = np.empty(rows*(cols+1)+1, dtype=table.dtype)
+        buf[0] = NEWLINE
+        body = buf[1:].reshape(rows, cols+1)
+        body[:, :-1] = table[arr]
+        body[:, -1] = NEWLINE
+        return buf.tobytes().decode(self._encoding)
+
 
 def linear_lut(chars):
     # probably needs some stricter validation
+    if len(chars) < 2:
+        raise ValueError("A linear lookup needs at least two characters")
     width = 255.0 / (len(chars) - 1)
     bins = np.linspace(width/2, 255 - width/2, len(chars) - 1, dtype=np.uint8)
     return LUT(chars, bins)
 
 
-# LUMINANCE LUTS
-UNICODE_LUTS = {
-    u'SIMPLE': LUT(
+# LUMINANCE LUTS, (chars, bins) or (chars, None) for a linear lut.  Built
+#   by get_lut the first time they're asked for.
+LUT_DEFINITIONS = {
+    u'SIMPLE': (
         " .'-:;!~*+em68g#WM@",
         [15, 25, 45, 60, 75, 90, 100, 115, 135, 155, 170, 185, 205, 220, 230, 240, 245, 250]
         ),
-    u'BINARY': LUT(
+    u'BINARY': (
         " @",
         [128]
     ),
-    u'CJK': linear_lut(u"\u3000\u4e36\u4e37\u4e4a\u4e41\u4e42\u4e49\u4e46\u4e65\u4eb2\u4eb7")
+    u'CJK': (u"\u3000\u4e36\u4e37\u4e4a\u4e41\u4e42\u4e49\u4e46\u4e65\u4eb2\u4eb7", None)
 }
 
+# built luts by name, least recently used first.  Custom luts (any other
+#   string) can come from anywhere, a service's query strings for instance,
+#   so only the last MAX_CUSTOM_LUTS of them are kept.
+UNICODE_LUTS = OrderedDict()
+MAX_CUSTOM_LUTS = 64
+_LUTS_LOCK = threading.Lock()
+
 
 def get_lut(string):
-    global UNICODE_LUTS
     if PY2 and isinstance(string, str):
         string = string.decode("unicode_escape")
-    lut = UNICODE_LUTS.get(string.upper(), None)
-    # Create a linear lookup and name 
-    if not lut:
-        lut = linear_lut(string)
-        UNICODE_LUTS[string.upper()] = lut # cache lookup
+    # built-in names are case insensitive, custom luts are their characters
+    name = string.upper()
+    if name not in LUT_DEFINITIONS:
+        name = string
+    with _LUTS_LOCK:
+        lut = UNICODE_LUTS.pop(name, None)
+        if lut is not None:
+            UNICODE_LUTS[name] = lut
+            return lut
+    chars, bins = LUT_DEFINITIONS.get(name, (string, None))
+    # Create a linear lookup and name
+    if bins is None:
+        lut = linear_lut(chars)
+    else:
+        lut = LUT(chars, bins)
+    with _LUTS_LOCK:
+        UNICODE_LUTS[name] = lut # cache lookup
+        custom = [key for key in UNICODE_LUTS if key not in LUT_DEFINITIONS]
+        for key in custom[:max(0, len(custom) - MAX_CUSTOM_LUTS)]:
+            del UNICODE_LUTS[key]
 
     return lut
 
 
 def bars(lut):
     """ Draws bars using the specified lut."""
-    chars, lums = get_lut(lut).legacy_lookup()
-    chars = list(chars)
-    arr = list(range(0, 255, 2))
-    line = ""
-    for v in arr:
-        row = bisect(lums, v)
-        character = chars[row]
-        line += character
+    lookup = get_lut(lut)
+    arr = np.arange(0, 255, 2, dtype=np.uint8)
+    line = u"".join(lookup.apply(arr[np.newaxis, :])[0, :-1].tolist())
     for _ in range(5):
         print(line)
 
@@ -10,14 +10,12 @@ Miscellaneous IO functions.
 
 import sys
 import io
-if sys.version_info < (3, 0):
-    from urllib2 import urlopen
-else:
-    from urllib.request import urlopen
 
-import cv2
 from PIL import Image
 
+from asciisciit.frame import AsciiFrame
+from asciisciit.cache import fetch_url
+
 
 def open_pil_img(path, *args, **kwargs):
     """
@@ -28,21 +26,70 @@ def open_pil_img(path, *args, **kwargs):
     ----------
     path : str
         File or url to open
+    cache : ResultCache
+        Keep downloads in this cache, see `cache.fetch_url`.
 
     All other arguments are passed to Image.open()
 
     """
+    cache = kwargs.pop("cache", None)
     try:
         #probably a file
         img = Image.open(path, *args, **kwargs)
     except IOError:
         #perhaps it is a web address?
-        fd = urlopen(path)
-        image_file = io.BytesIO(fd.read())
+        image_file = io.BytesIO(fetch_url(path, cache))
         img = Image.open(image_file, *args, **kwargs)
     return img
 
 
+def read_image_bytes(path, cache=None):
+    """
+    Reads the encoded bytes of an image file or web address.  Downloads are
+        kept in `cache` if one is given, see `cache.fetch_url`.
+    """
+    try:
+        with io.open(path, "rb") as f:
+            return f.read()
+    except IOError:
+        return fetch_url(path, cache)
+
+
+def decode_reduced(img, size, margin=2):
+    """
+    Decodes a freshly opened image at close to the size it will be resized
+        to instead of at full resolution.  JPEGs are decoded at 1/2, 1/4 or
+        1/8 scale and in grayscale (PIL's draft mode), other formats are
+        shrunk by an integer factor right after decoding.
+
+    Only use this on images you opened yourself: drafting changes the
+        image in place.
+
+    Parameters
+    ----------
+    img : PIL.Image
+        Image from `open_pil_img` that hasn't been loaded yet.
+    size : tuple
+        (width, height) the image will be resized to.
+    margin : int
+        Keep at least this many pixels per output pixel, so the final
+        resize still has something to average.
+
+    Returns
+    -------
+    PIL.Image
+
+    """
+    width, height = size[0]*margin, size[1]*margin
+    if img.format == "JPEG" and img.tile:
+        img.draft("L", (width, height))
+    img.load()
+    factor = min(img.size[0] // max(width, 1), img.size[1] // max(height, 1))
+    if factor >= 2 and img.mode in ("L", "RGB", "RGBA"):
+        img = img.reduce(factor)
+    return img
+
+
 def get_movie_size_pix(movie_path):
     """
     Gets frame resolution for a movie.
@@ -51,6 +98,7 @@ def get_movie_size_pix(movie_path):
     -------
     tuple : (x, y)
     """
+    import cv2
     video = cv2.VideoCapture(movie_path)
     _, frame = video.read()
     shape = frame.shape
@@ -85,6 +133,8 @@ def get_img_size_pix(img_path):
 
 
 def get_ascii_image_size(text):
+    if isinstance(text, AsciiFrame):
+        return text.size
     lines = text.split("\n")
     rows = len(lines)
     columns = len(lines[1])
@@ -0,0 +1,254 @@
+"""
+
+moviefile.py
+
+@author: derricw
+
+Binary file format for converted ascii movies, so they can be replayed
+    without decoding and converting them again.
+
+Layout (little endian):
+
+    header      magic "ASCM", version, bytes per cell index, rows, columns,
+                fps, keyframe interval, frame count, offset of the frame
+                index, then the lookup table (characters as utf-8 and bins)
+    frames      zlib compressed cell indices.  Keyframes store the indices,
+                other frames the XOR with the keyframe before them, so any
+                frame can be decoded from at most two records.
+    index       one (offset, size, keyframe, duration) record per frame
+
+"""
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from asciisciit.frame import AsciiFrame
+from asciisciit.lut import LUT, get_lut
+
+EXTENSION = ".ascm"
+MAGIC = b"ASCM"
+VERSION = 1
+HEADER = struct.Struct("<4sHBxIIdIIQ")
+# frame count and index offset are filled in when the file is closed
+_COUNTS = struct.Struct("<IQ")
+_COUNTS_OFFSET = HEADER.size - _COUNTS.size
+INDEX_DTYPE = np.dtype([("offset", "<u8"),
+                        ("size", "<u4"),
+                        ("keyframe", "<u4"),
+                        ("duration", "<f4")])
+
+
+class AsciiMovieWriter(object):
+    """
+    Writes converted frames to an ascii movie file.
+
+    Parameters
+    ----------
+    output_path : str
+        Output file path.
+    lut : str, LUT
+        Lookup table the frames were converted with.
+    fps : float
+        Frame rate, used for frames written without a duration.
+    keyframe_interval : int
+        Frames between keyframes.  Longer intervals make smaller files for
+        movies that don't change much.
+    level : int
+        zlib compression level.
+
+    Examples
+    --------
+
+    >>> with AsciiMovieWriter("movie.ascm", "simple", 24.0) as writer:
+    ...     for frame in frames:
+    ...         writer.write(converter.convert(frame))
+
+    """
+    def __init__(self, output_path, lut="simple", fps=15.0,
+                 keyframe_interval=30, level=6):
+        self.lookup = lut if isinstance(lut, LUT) else get_lut(lut)
+        self.fps = fps
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.shape = None
+        self._file = open(output_path, "wb")
+        self._index = []
+        self._keyframe = None
+        self._dtype = np.uint8 if len(self.lookup.chars) <= 256 else np.uint16
+
+    @property
+    def frames(self):
+        return len(self._index)
+
+    def _write_header(self):
+        rows, cols = self.shape
+        chars, bins = self.lookup.legacy_lookup()
+        chars = u"".join(chars).encode("utf-8")
+        self._file.write(HEADER.pack(MAGIC, VERSION,
+                                     np.dtype(self._dtype).itemsize,
+                                     rows, cols, self.fps,
+                                     self.keyframe_interval, 0, 0))
+        self._file.write(struct.pack("<I", len(chars)) + chars)
+        self._file.write(struct.pack("<I", len(bins)) +
+                         np.array(bins, dtype=np.uint8).tobytes())
+
+    def write(self, frame, duration=None):
+        """
+        Adds a frame.
+
+        Parameters
+        ----------
+        frame : AsciiFrame, ndarray
+            Converted frame, or its (rows, columns) character indices.
+        duration : float
+            Milliseconds to show the frame, defaults to 1 / fps.
+
+        """
+        if isinstance(frame, AsciiFrame):
+            frame = frame.indices
+        indices = np.ascontiguousarray(frame, dtype=self._dtype)
+        if self.shape is None:
+            self.shape = indices.shape
+            self._write_header()
+        elif indices.shape != self.shape:
+            raise ValueError("frame shape %s doesn't match the first frame's %s"
+                             % (indices.shape, self.shape))
+        number = len(self._index)
+        if number % self.keyframe_interval == 0:
+            self._keyframe = (number, indices)
+            data = indices
+        else:
+            data = indices ^ self._keyframe[1]
+        data = zlib.compress(data.tobytes(), self.level)
+        if duration is None:
+            duration = 1000.0/self.fps
+        self._index.append((self._file.tell(), len(data), self._keyframe[0],
+                            duration))
+        self._file.write(data)
+
+    def close(self):
+        """ Writes the frame index and finishes the file. """
+        if self._file is None:
+            return
+        if self.shape is None:
+            # no frames, still a valid (empty) movie
+            self.shape = (0, 0)
+            self._write_header()
+        index_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=INDEX_DTYPE).tobytes())
+        self._file.seek(_COUNTS_OFFSET)
+        self._file.write(_COUNTS.pack(len(self._index), index_offset))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AsciiMovieReader(object):
+    """
+    Reads an ascii movie file.  The file is memory mapped and frames are
+        decoded on demand, from their keyframe and at most one delta, so
+        seeking to any frame takes the same time.
+
+    Behaves like a read-only sequence of `AsciiFrame`.
+
+    Parameters
+    ----------
+    path : str
+        File to read.
+
+    Examples
+    --------
+
+    >>> movie = AsciiMovieReader("movie.ascm")
+    >>> print(movie[len(movie)//2])
+
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise IOError("%s is not an ascii movie" % path)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = self._mmap
+        (magic, version, itemsize, rows, cols, fps, keyframe_interval,
+         frames, index_offset) = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise IOError("%s is not an ascii movie" % path)
+        if version > VERSION:
+            raise IOError("%s is a newer version (%d) of ascii movie"
+                          % (path, version))
+        if index_offset == 0:
+            raise IOError("%s wasn't closed properly" % path)
+        pos = HEADER.size
+        length, = struct.unpack_from("<I", buf, pos)
+        chars = buf[pos+4:pos+4+length].decode("utf-8")
+        pos += 4 + length
+        length, = struct.unpack_from("<I", buf, pos)
+        bins = bytearray(buf[pos+4:pos+4+length])
+        self.lookup = LUT(chars, list(bins))
+        self.shape = (rows, cols)
+        self.fps = fps
+        self.keyframe_interval = keyframe_interval
+        # a copy, so the map can be closed while frames are still around
+        self.index = np.frombuffer(buf, INDEX_DTYPE, frames,
+                                   index_offset).copy()
+        self._dtype = np.uint8 if itemsize == 1 else np.dtype("<u2")
+        self._keyframe = (None, None)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def durations(self):
+        """ Milliseconds each frame is shown for. """
+        return self.index["duration"].astype(np.float64)
+
+    @property
+    def timestamps(self):
+        """ Time of each frame in seconds from the first. """
+        durations = self.durations
+        return np.concatenate(([0.0], np.cumsum(durations[:-1])))/1000.0
+
+    def _decode(self, number):
+        offset, size = int(self.index["offset"][number]), \
+            int(self.index["size"][number])
+        data = zlib.decompress(self._mmap[offset:offset+size])
+        return np.frombuffer(data, self._dtype).reshape(self.shape)
+
+    def indices(self, number):
+        """ Character indices of frame `number`. """
+        if number < 0:
+            number += len(self)
+        if not 0 <= number < len(self):
+            raise IndexError("frame %d out of range" % number)
+        keyframe = int(self.index["keyframe"][number])
+        if self._keyframe[0] != keyframe:
+            self._keyframe = (keyframe, self._decode(keyframe))
+        key = self._keyframe[1]
+        if keyframe == number:
+            return key
+        return key ^ self._decode(number)
+
+    def __getitem__(self, number):
+        return AsciiFrame(self.indices(number), self.lookup)
+
+    def __iter__(self):
+        for number in range(len(self)):
+            yield self[number]
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
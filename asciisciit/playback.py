@@ -0,0 +1,607 @@
+"""
+
+playback.py
+
+@author: derricw
+
+Pipelined playback.  Decoding, conversion and display each run in their own
+    thread, linked by bounded queues.  Live sources are read in a capture
+    thread that only keeps the newest frame.
+
+"""
+import sys
+import threading
+import time
+
+try:
+    from queue import Queue, Empty, Full
+except ImportError:
+    from Queue import Queue, Empty, Full
+
+timer = getattr(time, "perf_counter", time.time)
+clock = getattr(time, "monotonic", time.time)
+
+_END = object()
+_POLL = 0.1  # seconds, how often blocked stages check for stop()
+
+
+def video_frames(video):
+    """
+    Yields frames from a cv2.VideoCapture until it runs out.
+    """
+    while True:
+        result, image = video.read()
+        if not result or image is None:
+            return
+        yield image
+
+
+class LatestFrameCapture(object):
+    """
+    Reads a cv2.VideoCapture in a background thread and keeps only the
+        newest frame.  Cameras queue frames up while nobody reads them, so
+        when conversion is slower than the camera, reading synchronously
+        shows frames that get older and older.  Here a slow reader just
+        skips the frames it missed and always gets the latest one.
+
+    `read` has the same signature as `cv2.VideoCapture.read`.
+
+    Parameters
+    ----------
+    video : cv2.VideoCapture
+        Source to read.  Only the capture thread touches it until `stop`.
+    fps : float
+        Reads at most this many frames per second.  Cameras deliver frames
+        in real time on their own, this makes files behave like one.
+
+    Attributes
+    ----------
+    timestamp : float
+        `clock()` time the frame last returned by `read` was captured.
+    index : int
+        Index of that frame in the source.
+    captured : int
+        Frames read from the source.
+    skipped : int
+        Frames replaced by a newer one before they were read.
+
+    Examples
+    --------
+
+    >>> capture = LatestFrameCapture(cv2.VideoCapture(0))
+    >>> result, image = capture.read()
+    >>> age = clock() - capture.timestamp
+    >>> capture.stop()
+
+    """
+    def __init__(self, video, fps=None):
+        self.video = video
+        self.fps = fps
+        self.timestamp = None
+        self.index = -1
+        self.captured = 0
+        self.skipped = 0
+        self._latest = None
+        self._ended = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Starts the capture thread, `read` does this on its first call. """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._capture)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the capture thread and waits for it to exit. """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def read(self, timeout=None):
+        """
+        Waits for a frame newer than the last one returned.
+
+        Parameters
+        ----------
+        timeout : float
+            Seconds to wait, None waits until a frame arrives or the source
+            runs out.
+
+        Returns
+        -------
+        (bool, ndarray) : (False, None) once the source has run out (or on a
+            timeout), else (True, frame).
+
+        """
+        self.start()
+        deadline = None if timeout is None else clock() + timeout
+        with self._condition:
+            while self._latest is None and not self._ended:
+                wait = _POLL
+                if deadline is not None:
+                    wait = min(wait, deadline - clock())
+                    if wait <= 0:
+                        break
+                self._condition.wait(wait)
+            latest, self._latest = self._latest, None
+        if latest is None:
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise error
+            return False, None
+        self.timestamp, self.index, image = latest
+        return True, image
+
+    def _capture(self):
+        interval = 1.0/self.fps if self.fps else 0.0
+        next_read = clock()
+        try:
+            while not self._stopped.is_set():
+                if interval:
+                    delay = next_read - clock()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_read = max(next_read + interval, clock())
+                result, image = self.video.read()
+                if not result or image is None:
+                    break
+                with self._condition:
+                    if self._latest is not None:
+                        self.skipped += 1
+                    self._latest = (clock(), self.captured, image)
+                    self.captured += 1
+                    self._condition.notify()
+        except Exception:
+            self._error = sys.exc_info()[1]
+        with self._condition:
+            self._ended = True
+            self._condition.notify()
+
+
+class StageStats(object):
+    """
+    Latency of a pipeline stage, in seconds per frame.
+    """
+    __slots__ = ("count", "total", "last", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.last = latency
+        if latency > self.max:
+            self.max = latency
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {"count": self.count,
+                "mean": self.mean,
+                "last": self.last,
+                "max": self.max}
+
+
+class FrameScheduler(object):
+    """
+    Paces playback against absolute deadlines on a monotonic clock.  Frame
+        `index` is due `index / fps` seconds after the first one was shown,
+        so slow frames don't push every later frame back and playback stays
+        in sync with the source.
+
+    Frames that are already more than `max_lateness` behind can be skipped
+        before they're converted (see `is_late`).  Sources that can't skip
+        ahead, like cameras, should pass `catch_up=False`, which instead moves
+        the schedule forward whenever playback falls that far behind.
+
+    Parameters
+    ----------
+    fps : float
+        Playback rate.
+    max_lateness : float
+        Seconds a frame may fall behind before it's dropped.  Defaults to one
+        frame interval.
+    catch_up : bool
+        Drop late frames to catch up with the schedule.
+    timestamps : sequence
+        Time of each frame in seconds from the first, for sources whose
+        frames don't all last 1 / fps (like GIFs).
+
+    Examples
+    --------
+
+    >>> scheduler = FrameScheduler(24.0)
+    >>> for index, frame in enumerate(frames):
+    ...     if scheduler.is_late(index):
+    ...         scheduler.drop(index)
+    ...         continue
+    ...     ascii_frame = converter.convert(frame)
+    ...     scheduler.wait(index)
+    ...     writer.write(ascii_frame)
+
+    """
+    def __init__(self, fps, max_lateness=None, catch_up=True,
+                 timestamps=None):
+        self.fps = float(fps)
+        self.timestamps = timestamps
+        self.interval = 1.0/self.fps
+        if max_lateness is None:
+            max_lateness = self.interval
+        self.max_lateness = max_lateness
+        self.catch_up = catch_up
+        self.displayed = 0
+        self.dropped = 0
+        self.late = 0
+        self.worst_lateness = 0.0
+        self._start = None
+        # the convert and display threads of a Pipeline both drop frames
+        self._drop_lock = threading.Lock()
+
+    def reset(self):
+        """ Starts a new schedule at the next frame shown. """
+        self._start = None
+
+    def _offset(self, index):
+        if self.timestamps is not None:
+            return self.timestamps[index]
+        return index*self.interval
+
+    def deadline(self, index):
+        """ Clock time frame `index` is due, None before the first frame. """
+        if self._start is None:
+            return None
+        return self._start + self._offset(index)
+
+    def is_late(self, index):
+        """ Whether frame `index` is too late to be worth converting. """
+        deadline = self.deadline(index)
+        if deadline is None or not self.catch_up:
+            return False
+        return clock() - deadline > self.max_lateness
+
+    def drop(self, index):
+        """ Records that frame `index` was skipped.  Thread safe. """
+        with self._drop_lock:
+            self.dropped += 1
+
+    def wait(self, index):
+        """
+        Sleeps until frame `index` is due.  Call right before showing it.
+
+        Returns
+        -------
+        float : how late the frame is, in seconds (0 if it's on time).
+
+        """
+        now = clock()
+        if self._start is None:
+            self._start = now - self._offset(index)
+        lateness = now - self.deadline(index)
+        self.displayed += 1
+        if lateness < 0:
+            time.sleep(-lateness)
+            return 0.0
+        if lateness > 0:
+            self.late += 1
+            self.worst_lateness = max(self.worst_lateness, lateness)
+            if not self.catch_up and lateness > self.max_lateness:
+                self._start += lateness
+        return lateness
+
+    def stats(self):
+        return {"fps": self.fps,
+                "displayed": self.displayed,
+                "dropped": self.dropped,
+                "late": self.late,
+                "worst_lateness": self.worst_lateness}
+
+
+class AdaptiveScale(object):
+    """
+    Adjusts the scalefactor of live playback to hold a target frame rate.
+        Measured frame times (conversion plus drawing) are averaged and
+        compared to the frame budget: above `high` of it the scalefactor is
+        stepped down, below `low` of it back up towards the configured one.
+
+    Work grows with the square of the scalefactor, so `low` is kept below
+        `high * step**2` to leave a gap between the two thresholds.  After
+        every step, the average is rescaled to the new size and no further
+        step is taken for `cooldown` frames, so the scale doesn't oscillate.
+
+    Parameters
+    ----------
+    fps : float
+        Target frame rate.
+    scalefactor : float
+        Configured (and maximum) scalefactor.
+    min_scalefactor : float
+        Smallest scalefactor to step down to.  Defaults to a quarter of
+        `scalefactor`.
+    step : float
+        Ratio between successive scalefactors.
+    high : float
+        Fraction of the frame budget above which to step down.
+    low : float
+        Fraction of the frame budget below which to step up.
+    cooldown : int
+        Frames to wait after a step before taking another one.
+    smoothing : float
+        Weight of past frames in the averaged frame time.
+
+    Examples
+    --------
+
+    >>> adaptive = AdaptiveScale(24.0, 0.3)
+    >>> converter = Converter(adaptive.scalefactor)
+    >>> for frame in frames:
+    ...     t0 = time.time()
+    ...     writer.write(converter.convert(frame))
+    ...     converter.scalefactor = adaptive.update(time.time() - t0)
+
+    """
+    def __init__(self, fps, scalefactor, min_scalefactor=None, step=0.85,
+                 high=0.9, low=0.5, cooldown=10, smoothing=0.8):
+        if not low < high*step**2:
+            raise ValueError("low must be less than high * step**2")
+        self.budget = 1.0/fps
+        self.max_scalefactor = scalefactor
+        if min_scalefactor is None:
+            min_scalefactor = scalefactor/4.0
+        self.min_scalefactor = min(min_scalefactor, scalefactor)
+        self.step = step
+        self.high = high
+        self.low = low
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.scalefactor = scalefactor
+        self.steps_down = 0
+        self.steps_up = 0
+        self.frame_time = None
+        self._wait = 0
+
+    def update(self, frame_time):
+        """
+        Records how long a frame took.
+
+        Returns
+        -------
+        float : scalefactor to use for the next frame.
+
+        """
+        if self.frame_time is None:
+            self.frame_time = frame_time
+        else:
+            self.frame_time = (self.smoothing*self.frame_time +
+                               (1.0 - self.smoothing)*frame_time)
+        if self._wait > 0:
+            self._wait -= 1
+            return self.scalefactor
+        scalefactor = self.scalefactor
+        if self.frame_time > self.high*self.budget:
+            scalefactor = max(scalefactor*self.step, self.min_scalefactor)
+        elif self.frame_time < self.low*self.budget:
+            scalefactor = min(scalefactor/self.step, self.max_scalefactor)
+        if scalefactor != self.scalefactor:
+            if scalefactor < self.scalefactor:
+                self.steps_down += 1
+            else:
+                self.steps_up += 1
+            self.frame_time *= (scalefactor/self.scalefactor)**2
+            self.scalefactor = scalefactor
+            self._wait = self.cooldown
+        return self.scalefactor
+
+
+class Pipeline(object):
+    """
+    Decode -> convert -> display pipeline.  Frames are pulled from `source`
+        in a decoder thread and converted in a conversion thread, which both
+        spend most of their time in cv2 with the GIL released.  They're
+        displayed in the thread that calls `run`.
+
+    The queues between the stages are bounded, so a stage that gets ahead
+        blocks until the next one catches up instead of buffering the whole
+        movie.
+
+    Playback is paced by a `FrameScheduler`.  Frames that are already late
+        when they reach the conversion stage are dropped without being
+        converted, and converted frames that are late by the time they'd be
+        displayed are dropped if a newer one is waiting.
+
+    Parameters
+    ----------
+    source : iterable
+        Decoded frames, for example `video_frames(cv2.VideoCapture(path))`.
+    convert : callable
+        Converts a decoded frame, for example `Converter.convert`.
+    queue_size : int
+        Maximum number of frames waiting between two stages.
+
+    Examples
+    --------
+
+    >>> video = cv2.VideoCapture("awesome_movie.avi")
+    >>> pipeline = Pipeline(video_frames(video), Converter(0.2).convert)
+    >>> pipeline.run(TerminalWriter().write, fps=24.0)
+    >>> pipeline.stats()
+
+    """
+    def __init__(self, source, convert, queue_size=4):
+        self.source = source
+        self.convert = convert
+        self.queue_size = queue_size
+        self.decoded = Queue(queue_size)
+        self.converted = Queue(queue_size)
+        self.latency = {"decode": StageStats(),
+                        "convert": StageStats(),
+                        "display": StageStats(),
+                        "total": StageStats()}
+        self.max_depths = {"decoded": 0, "converted": 0}
+        self.frames = 0
+        self.frame_intervals = []
+        self.scheduler = None
+        self._stopped = threading.Event()
+        self._threads = []
+        self._error = None
+
+    @property
+    def queue_depths(self):
+        """ Number of frames currently waiting in each queue. """
+        return {"decoded": self.decoded.qsize(),
+                "converted": self.converted.qsize()}
+
+    def stats(self):
+        """
+        Per stage latency (seconds per frame, "total" is decode start to
+            display end), current and maximum queue depths.
+        """
+        stats = dict((name, stage.as_dict())
+                     for name, stage in self.latency.items())
+        stats["queue_depths"] = self.queue_depths
+        stats["max_queue_depths"] = dict(self.max_depths)
+        stats["frames"] = self.frames
+        if self.scheduler is not None:
+            stats["scheduler"] = self.scheduler.stats()
+        return stats
+
+    def start(self):
+        """ Starts the decoder and conversion threads. """
+        if self._threads:
+            return
+        for target in (self._decode, self._convert):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """ Stops all stages and waits for the threads to exit. """
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def run(self, display, fps=None, scheduler=None):
+        """
+        Displays frames until the source runs out or `stop` is called.
+
+        Parameters
+        ----------
+        display : callable
+            Called with each converted frame, in order.
+        fps : float
+            Playback rate.  Frames are displayed as soon as they're ready if
+            neither this nor `scheduler` is specified.
+        scheduler : FrameScheduler
+            Scheduler to pace playback with, instead of one for `fps`.
+
+        Returns
+        -------
+        int : number of frames displayed.
+
+        """
+        if scheduler is None and fps:
+            scheduler = FrameScheduler(fps)
+        self.scheduler = scheduler
+        self.start()
+        t = None
+        try:
+            while True:
+                item = self._get(self.converted)
+                if item is _END:
+                    break
+                started, index, frame = item
+                self._sample_depths()
+                if scheduler is not None:
+                    if (scheduler.is_late(index) and
+                            not self.converted.empty()):
+                        scheduler.drop(index)
+                        continue
+                    scheduler.wait(index)
+                t0 = timer()
+                if t is not None:
+                    self.frame_intervals.append(t0 - t)
+                t = t0
+                display(frame)
+                t1 = timer()
+                self.latency["display"].add(t1 - t0)
+                self.latency["total"].add(t1 - started)
+                self.frames += 1
+        finally:
+            self.stop()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        return self.frames
+
+    def _sample_depths(self):
+        for name, depth in self.queue_depths.items():
+            if depth > self.max_depths[name]:
+                self.max_depths[name] = depth
+
+    def _put(self, queue, item):
+        while not self._stopped.is_set():
+            try:
+                queue.put(item, timeout=_POLL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _get(self, queue):
+        while not self._stopped.is_set():
+            try:
+                return queue.get(timeout=_POLL)
+            except Empty:
+                pass
+        return _END
+
+    def _decode(self):
+        try:
+            frames = iter(self.source)
+            index = 0
+            while not self._stopped.is_set():
+                t0 = timer()
+                try:
+                    frame = next(frames)
+                except StopIteration:
+                    break
+                self.latency["decode"].add(timer() - t0)
+                if not self._put(self.decoded, (t0, index, frame)):
+                    return
+                index += 1
+        except Exception:
+            self._error = sys.exc_info()[1]
+        self._put(self.decoded, _END)
+
+    def _convert(self):
+        try:
+            while True:
+                item = self._get(self.decoded)
+                if item is _END:
+                    break
+                started, index, frame = item
+                scheduler = self.scheduler
+                if scheduler is not None and scheduler.is_late(index):
+                    scheduler.drop(index)
+                    continue
+                t0 = timer()
+                frame = self.convert(frame)
+                self.latency["convert"].add(timer() - t0)
+                if not self._put(self.converted, (started, index, frame)):
+                    return
+        except Exception:
+            self._error = sys.exc_info()[1]
+        self._put(self.converted, _END)
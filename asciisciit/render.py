@@ -0,0 +1,162 @@
+"""
+
+render.py
+
+@author: derricw
+
+Parallel rendering of frame sequences to images.
+
+"""
+import io
+import multiprocessing
+from collections import deque
+
+import numpy as np
+
+from asciisciit.conversions import ascii_to_pil
+from asciisciit.frame import AsciiFrame
+
+# per-process state for pool workers, set up once by _init_worker
+_WORKER = {}
+
+
+def _init_worker(converter, convert, render_kwargs, encode):
+    _WORKER["converter"] = converter
+    _WORKER["convert"] = convert
+    _WORKER["render_kwargs"] = render_kwargs
+    _WORKER["encode"] = encode
+
+
+def _render_task(item):
+    converter = _WORKER["converter"]
+    if _WORKER["convert"]:
+        frame = converter.convert(item)
+    else:
+        frame = AsciiFrame(item, converter.lookup)
+    img = ascii_to_pil(frame, **_WORKER["render_kwargs"])
+    return _WORKER["encode"](img)
+
+
+def encode_jpeg(img):
+    """ JPEG bytes of a PIL image. """
+    data = io.BytesIO()
+    img.save(data, "JPEG")
+    return data.getvalue()
+
+
+def encode_rgb(img):
+    """ (h, w, 3) uint8 array of a PIL image. """
+    return np.asarray(img.convert("RGB"))
+
+
+def encode_gray(img):
+    """
+    (h, w) uint8 array of a PIL image rendered in shades of gray, a third
+        the size of the RGB one.
+    """
+    return np.array(np.asarray(img)[..., 0])
+
+
+def is_gray(*colors):
+    """ Whether all of these (R,G,B) colors are shades of gray. """
+    return all(len(set(color)) == 1 for color in colors)
+
+
+def render_frames(frames,
+                  converter,
+                  font_size=10,
+                  font_path=None,
+                  bg_color=(20, 20, 20),
+                  fg_color=(255, 255, 255),
+                  encode=encode_jpeg,
+                  workers=None,
+                  progress=None,
+                  total=None):
+    """
+    Converts and renders a sequence of frames in a pool of worker processes.
+        Frames are pulled from `frames` as workers need them and results
+        come back in order, so long videos are never held in memory.
+
+    Each worker gets its own copy of `converter`.  Converters with temporal
+        `smoothing` carry state from frame to frame, so in that case frames
+        are converted here, in order, and only rendering is farmed out.
+
+    Parameters
+    ----------
+    frames : iterable
+        Frames to convert (anything `Converter.convert` takes).
+    converter : Converter
+        Converter to convert frames with.
+    font_size : int
+        Font size of the rendered text.
+    font_path : str
+        Font to render with.
+    bg_color : tuple (20,20,20)
+        (R,G,B) values for image background.
+    fg_color : tuple (255,255,255)
+        (R,G,B) values for text color.
+    encode : callable
+        Run in the workers on every rendered PIL.Image, its result is what's
+        yielded.  Must be picklable (a module level function).  Defaults to
+        JPEG encoding.
+    workers : int
+        Number of worker processes.  Defaults to the number of CPUs.  0 or 1
+        renders in this process.
+    progress : callable
+        Called as `progress(done, total)` after each frame.
+    total : int
+        Number of frames, passed on to `progress`, if known.
+
+    Yields
+    ------
+    Result of `encode` for each frame, in order.
+
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    convert = not converter.smoothing
+    render_kwargs = {"font_size": font_size,
+                     "font_path": font_path,
+                     "bg_color": bg_color,
+                     "fg_color": fg_color}
+    if convert:
+        items = frames
+    else:
+        items = (converter.convert(frame).indices for frame in frames)
+
+    if workers <= 1:
+        _init_worker(converter, convert, render_kwargs, encode)
+        try:
+            for done, item in enumerate(items, 1):
+                yield _render_task(item)
+                if progress is not None:
+                    progress(done, total)
+        finally:
+            _WORKER.clear()
+        return
+
+    pool = multiprocessing.Pool(workers, _init_worker,
+                                (converter, convert, render_kwargs, encode))
+    # keep every worker busy without reading ahead of them
+    max_pending = 2*workers
+    pending = deque()
+    done = 0
+    try:
+        items = iter(items)
+        while True:
+            while len(pending) < max_pending:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                pending.append(pool.apply_async(_render_task, (item,)))
+            if not pending:
+                break
+            yield pending.popleft().get()
+            done += 1
+            if progress is not None:
+                progress(done, total)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
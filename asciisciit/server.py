@@ -0,0 +1,263 @@
+"""
+
+server.py
+
+@author: derricw
+
+Streams ascii frames to any number of terminals over TCP (telnet, netcat).
+    Each frame is converted once and broadcast to every client.  Requires
+    Python 3.7+ (asyncio).
+
+"""
+import asyncio
+import socket
+import sys
+import threading
+
+from asciisciit.playback import FrameScheduler, StageStats, clock
+from asciisciit.terminal import TerminalWriter
+
+DEFAULT_PORT = 8023
+# bytes a client may have waiting in the socket buffer before it's skipped
+DEFAULT_MAX_BUFFER = 64*1024
+
+
+class _Client(object):
+    """ Connection state of one viewer. """
+    def __init__(self, reader, writer, full_redraw_ratio):
+        self.reader = reader
+        self.writer = writer
+        self.peer = writer.get_extra_info("peername")
+        self.terminal = TerminalWriter(None, full_redraw_ratio)
+        self.ready = asyncio.Event()
+        self.sequence = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+        self.task = None
+
+    def stats(self):
+        return {"peer": self.peer,
+                "frames_sent": self.frames_sent,
+                "frames_skipped": self.frames_skipped,
+                "full_redraws": self.terminal.full_redraws,
+                "bytes_sent": self.bytes_sent}
+
+
+class AsciiServer(object):
+    """
+    Broadcasts a stream of frames to TCP clients.
+
+    Frames are pulled from `source` and converted in a producer thread, paced
+        by a `FrameScheduler`, and handed to the event loop, which sends them
+        to every connected client.  Each client gets the newest frame as soon
+        as it has taken the last one: a client that can't keep up just skips
+        the frames it missed, and since every client has its own
+        `TerminalWriter`, it's sent only the cells that changed since the
+        frame it has on screen.  Nobody waits for the slowest viewer.
+
+    Parameters
+    ----------
+    source : iterable
+        Frames to serve, raw (see `convert`) or already converted.
+    convert : callable
+        Converts a frame from `source` (for example `Converter.convert`).
+        None if `source` yields AsciiFrames or text.
+    fps : float
+        Rate frames are broadcast at.
+    catch_up : bool
+        Skip frames to catch up when the producer falls behind.  Use False
+        for live sources that can't skip ahead.
+    host : str
+        Interface to listen on.
+    port : int
+        Port to listen on, 0 picks a free one (see `port` once started).
+    max_buffer : int
+        Bytes that may be waiting to go to a client before it's considered
+        slow and skips frames.
+    full_redraw_ratio : float
+        See `TerminalWriter`.
+
+    Examples
+    --------
+
+    >>> video = cv2.VideoCapture("awesome_movie.avi")
+    >>> server = AsciiServer(video_frames(video), Converter(0.2).convert, 24.0)
+    >>> server.run()  # then `telnet localhost 8023` from a few terminals
+
+    """
+    def __init__(self,
+                 source,
+                 convert=None,
+                 fps=15.0,
+                 catch_up=True,
+                 host="127.0.0.1",
+                 port=DEFAULT_PORT,
+                 max_buffer=DEFAULT_MAX_BUFFER,
+                 full_redraw_ratio=0.5):
+        self.source = source
+        self.convert = convert
+        self.scheduler = FrameScheduler(fps, catch_up=catch_up)
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.full_redraw_ratio = full_redraw_ratio
+        self.clients = set()
+        self.frame = None
+        self.sequence = 0
+        self.conversions = 0
+        self.convert_latency = StageStats()
+        self.finished = False
+        self._loop = None
+        self._server = None
+        self._done = None
+        self._producer = None
+        self._stopped = threading.Event()
+        self._error = None
+
+    def stats(self):
+        """ Frames broadcast, conversion latency, scheduling and clients. """
+        return {"frames": self.sequence,
+                "conversions": self.conversions,
+                "convert": self.convert_latency.as_dict(),
+                "scheduler": self.scheduler.stats(),
+                "clients": [client.stats() for client in self.clients]}
+
+    async def start(self):
+        """ Starts listening and producing frames. """
+        self._loop = asyncio.get_event_loop()
+        self._done = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle,
+                                                  self.host,
+                                                  self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._producer = threading.Thread(target=self._produce)
+        self._producer.daemon = True
+        self._producer.start()
+
+    async def serve(self):
+        """
+        Serves until the source runs out and every client has been sent the
+            last frame.
+        """
+        if self._server is None:
+            await self.start()
+        try:
+            await self._done.wait()
+            tasks = [client.task for client in list(self.clients)]
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await self.close()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def run(self):
+        """ Serves in a new event loop, until the source runs out or ^C. """
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def close(self):
+        """ Stops producing, disconnects every client and stops listening. """
+        self._stopped.set()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for client in list(self.clients):
+            if client.task is not None:
+                client.task.cancel()
+            client.writer.close()
+        if self._producer is not None:
+            await self._loop.run_in_executor(None, self._producer.join)
+            self._producer = None
+
+    def _produce(self):
+        scheduler = self.scheduler
+        try:
+            for index, frame in enumerate(self.source):
+                if self._stopped.is_set():
+                    break
+                if scheduler.is_late(index):
+                    scheduler.drop(index)
+                    continue
+                if self.convert is not None:
+                    t0 = clock()
+                    frame = self.convert(frame)
+                    self.convert_latency.add(clock() - t0)
+                    self.conversions += 1
+                scheduler.wait(index)
+                self._loop.call_soon_threadsafe(self._publish, frame)
+        except Exception:
+            self._error = sys.exc_info()[1]
+        if not self._stopped.is_set():
+            self._loop.call_soon_threadsafe(self._finish)
+
+    def _publish(self, frame):
+        self.frame = frame
+        self.sequence += 1
+        for client in self.clients:
+            client.ready.set()
+
+    def _finish(self):
+        self.finished = True
+        for client in self.clients:
+            client.ready.set()
+        self._done.set()
+
+    async def _handle(self, reader, writer):
+        client = _Client(reader, writer, self.full_redraw_ratio)
+        # keep the kernel from buffering much more than max_buffer either,
+        #   or a slow client is only noticed once it's seconds behind
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                            self.max_buffer)
+        writer.transport.set_write_buffer_limits(high=self.max_buffer)
+        self.clients.add(client)
+        client.task = asyncio.ensure_future(self._send(client))
+        watcher = asyncio.ensure_future(self._watch(client))
+        try:
+            await client.task
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            watcher.cancel()
+            self.clients.discard(client)
+            writer.close()
+
+    async def _watch(self, client):
+        # nothing is read from clients, but reading notices them hanging up
+        while await client.reader.read(1024):
+            pass
+        client.task.cancel()
+
+    async def _send(self, client):
+        if self.frame is not None:
+            client.ready.set()
+        while True:
+            await client.ready.wait()
+            client.ready.clear()
+            sequence = self.sequence
+            if sequence != client.sequence and self.frame is not None:
+                if client.sequence:
+                    client.frames_skipped += sequence - client.sequence - 1
+                client.sequence = sequence
+                await self._write(client, client.terminal.render(self.frame))
+                client.frames_sent += 1
+            if self.finished and client.sequence == self.sequence:
+                await self._write(client, client.terminal.finish())
+                return
+
+    async def _write(self, client, out):
+        if not out:
+            return
+        # telnet wants CRLF, which terminals are happy with too
+        data = out.replace(u"\n", u"\r\n").encode("utf-8")
+        client.writer.write(data)
+        client.bytes_sent += len(data)
+        # only waits while the client is more than max_buffer behind, new
+        #   frames that arrive meanwhile replace each other
+        await client.writer.drain()
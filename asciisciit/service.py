@@ -0,0 +1,522 @@
+"""
+
+service.py
+
+@author: derricw
+
+Local HTTP service for converting images to text, ANSI or PNG.
+
+    POST /convert?format=text&scalefactor=0.2   image bytes in the body
+    GET  /metrics                                counters and latencies
+    GET  /health
+
+Conversions run on a pool of worker threads or processes that are started,
+    and have their lookup tables, fonts and glyph atlases loaded, before the
+    first request.  Requests wait in a bounded queue for a free worker.
+
+"""
+from __future__ import print_function
+import argparse
+import io
+import json
+import multiprocessing
+import multiprocessing.pool
+import sys
+import threading
+from collections import OrderedDict
+
+if sys.version_info < (3, 0):
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+else:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from asciisciit.cache import ResultCache, cache_key
+from asciisciit.conversions import Converter, ascii_to_pil
+from asciisciit.lut import get_lut
+from asciisciit.playback import StageStats, timer
+from asciisciit.terminal import TerminalWriter
+
+FORMATS = {"text": "text/plain; charset=utf-8",
+           "ansi": "text/plain; charset=utf-8",
+           "png": "image/png"}
+DEFAULT_PORT = 8080
+MAX_BODY = 32*1024*1024
+MAX_CONVERTERS = 16  # per worker, requests choose their settings
+
+# per-thread state in pool workers, set up by _init_worker.  Converters keep
+#   the output size of the last image, so threads can't share them.
+_WORKER = threading.local()
+
+
+class RequestError(ValueError):
+    """ A request the service can't handle, with the HTTP status to send. """
+    def __init__(self, status, message):
+        # both in args, so it pickles back from worker processes
+        ValueError.__init__(self, status, message)
+        self.status = status
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+def _init_worker(luts, font_size, font_path):
+    # load everything the first requests would otherwise wait for: the
+    #   lookup tables, the font and its glyph atlas
+    blank = np.zeros((64, 64), dtype=np.uint8)
+    for lut in luts:
+        converter = _converter(0.2, False, True, lut, font_path)
+        ascii_to_pil(converter.convert(blank), font_size, font_path=font_path)
+
+
+def _converter(scalefactor, invert, equalize, lut, font_path):
+    converters = getattr(_WORKER, "converters", None)
+    if converters is None:
+        converters = _WORKER.converters = OrderedDict()
+    key = (scalefactor, invert, equalize, lut, font_path)
+    converter = converters.pop(key, None)
+    if converter is None:
+        converter = Converter(scalefactor, invert, equalize, lut, font_path,
+                              lock_size=False)
+        if len(converters) >= MAX_CONVERTERS:
+            converters.popitem(last=False)
+    converters[key] = converter
+    return converter
+
+
+def convert_image(data, format="text", scalefactor=0.2, invert=False,
+                  equalize=True, lut="simple", font_size=10, font_path=None,
+                  bg_color=(20, 20, 20), fg_color=(255, 255, 255)):
+    """
+    Converts encoded image bytes.  This is what the service's workers run.
+
+    Parameters
+    ----------
+    data : bytes
+        Encoded image (PNG, JPEG...).
+    format : str
+        "text", "ansi" (text with the escapes that draw it on a cleared
+        terminal) or "png" (rendered text).
+
+    Other parameters are as for `Converter` and `ascii_to_pil`.
+
+    Returns
+    -------
+    (bytes, float) : the output and seconds spent converting.
+
+    """
+    t0 = timer()
+    converter = _converter(scalefactor, invert, equalize, lut, font_path)
+    try:
+        frame = converter.convert(data)
+    except IOError:
+        raise RequestError(400, "can't decode the image")
+    except ValueError:
+        raise RequestError(400, "image too small for this scalefactor")
+    if format == "png":
+        out = io.BytesIO()
+        ascii_to_pil(frame, font_size, bg_color, fg_color,
+                     font_path).save(out, "PNG")
+        out = out.getvalue()
+    elif format == "ansi":
+        terminal = TerminalWriter(None)
+        out = (terminal.render(frame) + terminal.finish()).encode("utf-8")
+    else:
+        out = frame.text.encode("utf-8")
+    return out, timer() - t0
+
+
+def _flag(value):
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def _color(value):
+    color = tuple(int(c) for c in value.split(","))
+    if len(color) != 3:
+        raise ValueError("colors are R,G,B")
+    return color
+
+
+# convert_image's defaults, for cache keys
+DEFAULTS = {"format": "text",
+            "scalefactor": 0.2,
+            "invert": False,
+            "equalize": True,
+            "lut": "simple",
+            "font_size": 10,
+            "font_path": None,
+            "bg_color": (20, 20, 20),
+            "fg_color": (255, 255, 255)}
+
+# query parameters and how to parse them
+PARAMS = {"format": str,
+          "scalefactor": float,
+          "invert": _flag,
+          "equalize": _flag,
+          "lut": str,
+          "font_size": int,
+          "bg_color": _color,
+          "fg_color": _color}
+
+
+def parse_params(query):
+    """ Keyword arguments for `convert_image` from a query string. """
+    params = {}
+    for name, values in parse_qs(query).items():
+        if name not in PARAMS:
+            raise RequestError(400, "unknown parameter %r" % name)
+        try:
+            params[name] = PARAMS[name](values[-1])
+        except ValueError:
+            raise RequestError(400, "bad value for %s: %r" % (name, values[-1]))
+    if params.get("format", "text") not in FORMATS:
+        raise RequestError(400, "format must be one of %s" % sorted(FORMATS))
+    if not 0.0 < params.get("scalefactor", 0.2) <= 4.0:
+        raise RequestError(400, "scalefactor must be in (0, 4]")
+    if not 1 <= params.get("font_size", 10) <= 200:
+        raise RequestError(400, "font_size must be in [1, 200]")
+    if "lut" in params:
+        try:
+            get_lut(params["lut"])
+        except (ValueError, AssertionError):
+            raise RequestError(400, "bad lut %r" % params["lut"])
+    return params
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        if self.server.service.verbose:
+            BaseHTTPRequestHandler.log_message(self, *args)
+
+    def _send(self, status, body, content_type="text/plain; charset=utf-8",
+              headers=None):
+        if not isinstance(body, bytes):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send(200, "ok\n")
+        elif path == "/metrics":
+            self._send(200, json.dumps(self.server.service.metrics(),
+                                       indent=2, sort_keys=True),
+                       "application/json")
+        else:
+            self._send(404, "not found\n")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/convert":
+            self._send(404, "not found\n")
+            return
+        service = self.server.service
+        data = None
+        try:
+            length = self.headers.get("Content-Length")
+            if length is None:
+                raise RequestError(411, "Content-Length required")
+            try:
+                length = int(length)
+            except ValueError:
+                length = -1
+            if length < 0:
+                raise RequestError(400, "invalid Content-Length")
+            if length > service.max_body:
+                raise RequestError(413, "image too large")
+            data = self.rfile.read(length)
+            params = parse_params(url.query)
+            body = service.convert(data, **params)
+        except RequestError as e:
+            service._count(e.status)
+            headers = {"Retry-After": "1"} if e.status == 503 else None
+            if data is None:
+                # the body wasn't read, so the connection can't be reused
+                headers = {"Connection": "close"}
+                self.close_connection = True
+            self._send(e.status, "%s\n" % e, headers=headers)
+            return
+        except Exception as e:
+            service._count(500)
+            self._send(500, "%s: %s\n" % (type(e).__name__, e))
+            return
+        service._count(200)
+        self._send(200, body, FORMATS[params.get("format", "text")])
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class AsciiService(object):
+    """
+    HTTP conversion service.  See the module docstring for the endpoints.
+
+    Each request is handled in its own thread, which hands the conversion to
+        the worker pool and waits for it.  At most `workers` conversions run
+        at once and at most `max_queue` more wait for a worker, requests
+        beyond that are turned away with 503.
+
+    Parameters
+    ----------
+    host : str
+        Interface to listen on.
+    port : int
+        Port to listen on, 0 picks a free one (see `port` once started).
+    workers : int
+        Conversions that can run at once.  Defaults to the number of CPUs.
+    processes : bool
+        Convert in worker processes instead of threads.  Processes don't
+        share the GIL, threads start faster and use less memory.
+    max_queue : int
+        Requests that may wait for a free worker.
+    timeout : float
+        Seconds a request may wait for its conversion before a 504.
+    luts : sequence
+        Lookup tables to load in the workers up front.
+    font_size : int
+        Font size to load the glyph atlas for up front.
+    font_path : str
+        Font to render and size characters with.
+    max_body : int
+        Largest upload accepted, in bytes.
+    cache : ResultCache
+        Answer repeated requests (same image bytes and parameters) from this
+        cache.  See `cache.ResultCache`.
+    verbose : bool
+        Log every request to stderr.
+
+    Examples
+    --------
+
+    >>> with AsciiService(port=8080) as service:
+    ...     service.serve_forever()
+
+    $ curl --data-binary @cat.jpg "localhost:8080/convert?scalefactor=0.1"
+
+    """
+    def __init__(self,
+                 host="127.0.0.1",
+                 port=DEFAULT_PORT,
+                 workers=None,
+                 processes=False,
+                 max_queue=32,
+                 timeout=30.0,
+                 luts=("simple",),
+                 font_size=10,
+                 font_path=None,
+                 max_body=MAX_BODY,
+                 cache=None,
+                 verbose=False):
+        self.host = host
+        self.port = port
+        self.workers = workers or multiprocessing.cpu_count()
+        self.processes = processes
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.luts = tuple(luts)
+        self.font_size = font_size
+        self.font_path = font_path
+        self.max_body = max_body
+        self.cache = cache
+        self.verbose = verbose
+        self.latency = {"queue": StageStats(),
+                        "convert": StageStats(),
+                        "total": StageStats()}
+        self.responses = {}
+        self.active = 0
+        self.max_active = 0
+        self._pool = None
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+        # jobs that timed out but are still running, they hold their slot
+        self._abandoned = []
+
+    @property
+    def url(self):
+        return "http://%s:%d" % (self.host, self.port)
+
+    def start(self):
+        """
+        Starts the workers and binds the port, waiting until every worker is
+            warmed up.  Requests are only answered once `serve_forever` runs
+            (`serve_in_thread` does both).
+        """
+        if self._pool is not None:
+            return
+        pool = multiprocessing.Pool if self.processes else \
+            multiprocessing.pool.ThreadPool
+        args = (self.luts, self.font_size, self.font_path)
+        self._pool = pool(self.workers, _init_worker, args)
+        # the initializer has run in a worker once it takes a task
+        self._pool.map(abs, range(self.workers), chunksize=1)
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.service = self
+        self.port = self._server.server_address[1]
+
+    def serve_forever(self):
+        """ Answers requests until `close` is called from another thread. """
+        self.start()
+        self._server.serve_forever()
+
+    def serve_in_thread(self):
+        """ Starts answering requests in a background thread. """
+        self.start()
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self._thread
+
+    def close(self):
+        """ Stops answering requests and shuts the workers down. """
+        if self._server is not None:
+            if self._thread is not None:
+                self._server.shutdown()
+                self._thread.join()
+                self._thread = None
+            self._server.server_close()
+            self._server = None
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def convert(self, data, **params):
+        """
+        Converts image bytes on the pool, see `convert_image`.  Raises
+            RequestError (503) if too many requests are already waiting.
+        """
+        t0 = timer()
+        params.setdefault("font_path", self.font_path)
+        key = None
+        if self.cache is not None:
+            # defaults filled in, so leaving a parameter out hits the same
+            #   entry as passing its default
+            key = cache_key(data, dict(DEFAULTS, **params))
+            body = self.cache.get(key)
+            if body is not None:
+                with self._lock:
+                    self.latency["total"].add(timer() - t0)
+                return body
+        with self._lock:
+            self._release_abandoned()
+            if self.active >= self.workers + self.max_queue:
+                raise RequestError(503, "too many requests waiting")
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            result = self._pool.apply_async(convert_image, (data,), params)
+            body, convert_time = result.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            with self._lock:
+                # the worker is still on it, keep its slot until it's done
+                self._abandoned.append(result)
+            raise RequestError(504, "conversion timed out")
+        except Exception:
+            with self._lock:
+                self.active -= 1
+            raise
+        with self._lock:
+            self.active -= 1
+        total = timer() - t0
+        with self._lock:
+            self.latency["convert"].add(convert_time)
+            self.latency["queue"].add(max(total - convert_time, 0.0))
+            self.latency["total"].add(total)
+        if key is not None:
+            self.cache.put(key, body)
+        return body
+
+    def _release_abandoned(self):
+        # call with the lock held
+        running = [result for result in self._abandoned if not result.ready()]
+        self.active -= len(self._abandoned) - len(running)
+        self._abandoned = running
+
+    def _count(self, status):
+        with self._lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+
+    def metrics(self):
+        """
+        Responses by status, requests in flight and latencies in seconds
+            ("queue" is everything but the conversion itself).
+        """
+        with self._lock:
+            self._release_abandoned()
+            return {"workers": self.workers,
+                    "processes": self.processes,
+                    "max_queue": self.max_queue,
+                    "active": self.active,
+                    "max_active": self.max_active,
+                    "responses": dict((str(status), count) for status, count
+                                      in self.responses.items()),
+                    "latency": dict((name, stage.as_dict()) for name, stage
+                                    in self.latency.items()),
+                    "cache": (None if self.cache is None else
+                              self.cache.stats())}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Local HTTP service converting images to ASCII')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Conversions at once, defaults to the CPUs')
+    parser.add_argument('--processes', action='store_true',
+                        help='Convert in processes instead of threads')
+    parser.add_argument('-q', '--max-queue', type=int, default=32,
+                        help='Requests that may wait for a worker')
+    parser.add_argument('-l', '--luts', type=str, nargs='+',
+                        default=['simple'], help='Lookup tables to preload')
+    parser.add_argument('-t', '--font', type=str, default=None,
+                        help='Font path')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Keep results on disk here')
+    parser.add_argument('--cache-mb', type=int, default=0,
+                        help='Result cache size in memory, 0 disables it '
+                             'unless there is a --cache-dir')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+    cache = None
+    if args.cache_dir or args.cache_mb:
+        cache = ResultCache(args.cache_dir,
+                            memory_bytes=(args.cache_mb or 64)*1024*1024)
+    service = AsciiService(args.host, args.port, args.workers,
+                           args.processes, args.max_queue, luts=args.luts,
+                           font_path=args.font, cache=cache,
+                           verbose=args.verbose)
+    with service:
+        print("Serving on", service.url)
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+
+terminal.py
+
+@author: derricw
+
+Differential terminal output.
+
+"""
+from __future__ import print_function
+import sys
+
+import numpy as np
+
+from asciisciit.frame import AsciiFrame
+from asciisciit.lut import PY2, NEWLINE, relative_width
+import asciisciit.console as console
+
+CSI = u"\x1b["
+CLEAR = CSI + u"2J"
+HOME = CSI + u"H"
+HIDE_CURSOR = CSI + u"?25l"
+SHOW_CURSOR = CSI + u"?25h"
+
+
+def move_to(row, col):
+    """ Escape sequence that moves the cursor to a 0-based cell. """
+    return u"%s%d;%dH" % (CSI, row + 1, col + 1)
+
+
+def _text_cells(text):
+    # the text we make is a leading newline and rows of equal length, each
+    #   terminated by a newline.  anything else can't be diffed.
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+    newlines = np.flatnonzero(codes == NEWLINE)
+    if len(newlines) < 2 or newlines[0] != 0:
+        return None
+    cols = newlines[1] - 1
+    rows = len(newlines) - 1
+    if (len(codes) != rows*(cols+1) + 1 or
+            not np.array_equal(newlines, np.arange(0, len(codes), cols+1))):
+        return None
+    return codes[1:].reshape(rows, cols+1)[:, :-1]
+
+
+def _cell_width(cells):
+    # terminal columns per cell, None unless every character is as wide
+    to_char = unichr if PY2 else chr
+    widths = set(relative_width(to_char(code))
+                 for code in np.unique(cells).tolist())
+    return widths.pop() if len(widths) == 1 else None
+
+
+class TerminalWriter(object):
+    """
+    Writes a stream of frames to an ANSI terminal.  Each frame is compared to
+        the previous one and only runs of cells that changed are rewritten,
+        with cursor-positioning escapes in between, as one write.  When most
+        of the frame changed it is redrawn whole instead, without clearing
+        the screen, so there is no flicker either way.
+
+    Parameters
+    ----------
+    stream : file
+        Where to write.  Defaults to sys.stdout.
+    full_redraw_ratio : float
+        Redraw the whole frame when more than this fraction of the cells
+        changed.
+    merge_gap : int
+        Unchanged runs this short between two changed runs are rewritten
+        anyway, since that's cheaper than another cursor move.
+
+    Examples
+    --------
+
+    >>> writer = TerminalWriter()
+    >>> for frame in frames:
+    ...     writer.write(converter.convert(frame))
+    >>> writer.close()
+
+    """
+    def __init__(self, stream=None, full_redraw_ratio=0.5, merge_gap=6):
+        self.stream = stream or sys.stdout
+        self.full_redraw_ratio = full_redraw_ratio
+        self.merge_gap = merge_gap
+        self.frames = 0
+        self.full_redraws = 0
+        self.chars_written = 0
+        self._previous = None
+        self._previous_lut = None
+        self._started = False
+
+    def reset(self):
+        """ Forget the previous frame, so the next one is drawn in full. """
+        self._previous = None
+        self._previous_lut = None
+
+    def render(self, frame):
+        """
+        Escapes and text that update the screen from the previous frame to
+            `frame`, without writing them anywhere.  Use this to draw to
+            something that isn't a file, like a socket.
+
+        Parameters
+        ----------
+        frame : AsciiFrame, AsciiImage, str
+            Frame to draw.
+
+        Returns
+        -------
+        str : output for the terminal.
+
+        """
+        frame = getattr(frame, "frame", frame)  # AsciiImage
+        if isinstance(frame, AsciiFrame):
+            cells, lut, width = frame.indices, frame.lut, 2 if frame.wide else 1
+            text = frame.text
+        else:
+            text = frame
+            cells, lut, width = _text_cells(text), None, 1
+            if cells is not None:
+                width = _cell_width(cells)
+                if width is None:
+                    cells = None  # can't tell where the changes go
+        out = self._update(text, cells, lut, width)
+        self._previous = cells
+        self._previous_lut = lut
+        self.frames += 1
+        return out
+
+    def write(self, frame):
+        """
+        Draws a frame.
+
+        Parameters
+        ----------
+        frame : AsciiFrame, AsciiImage, str
+            Frame to draw.
+
+        Returns
+        -------
+        int : number of characters written.
+
+        """
+        return self._write(self.render(frame))
+
+    def finish(self):
+        """
+        Output that leaves the cursor below the last frame and shows it
+            again, like `close` but without writing it.
+        """
+        out = u""
+        if self._started:
+            rows = 0 if self._previous is None else len(self._previous)
+            out = move_to(rows, 0) + SHOW_CURSOR
+            self._started = False
+        self.reset()
+        return out
+
+    def close(self):
+        """ Leaves the cursor below the last frame and shows it again. """
+        out = self.finish()
+        if out:
+            self._write(out)
+
+    def _write(self, out):
+        if PY2:
+            self.stream.write(out.encode("utf-8"))
+        else:
+            self.stream.write(out)
+        self.stream.flush()
+        self.chars_written += len(out)
+        return len(out)
+
+    def _full(self, text, clear=False):
+        self.full_redraws += 1
+        if not self._started:
+            self._started = True
+            prefix = HIDE_CURSOR + CLEAR + HOME
+        elif clear:
+            prefix = CLEAR + HOME
+        else:
+            prefix = HOME
+        # no trailing newline, it would scroll a frame that fills the screen
+        if text.startswith(u"\n"):
+            text = text[1:]
+        if text.endswith(u"\n"):
+            text = text[:-1]
+        return prefix + text
+
+    def _update(self, text, cells, lut, width):
+        previous = self._previous
+        if (previous is None or cells is None or
+                previous.shape != cells.shape):
+            # clear whatever the previous frame might leave uncovered
+            return self._full(text, clear=True)
+        if lut is not self._previous_lut:
+            return self._full(text)
+        changed = previous != cells
+        n_changed = np.count_nonzero(changed)
+        if n_changed == 0:
+            return u""
+        if n_changed > self.full_redraw_ratio * changed.size:
+            return self._full(text)
+
+        # runs of changed cells, found on the flattened grid with a column of
+        #   False at the end of each row so runs can't wrap
+        rows, cols = changed.shape
+        padded = np.zeros((rows, cols+1), dtype=np.int8)
+        padded[:, :-1] = changed
+        edges = np.diff(np.concatenate(([0], padded.ravel())))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        # merge runs separated by short gaps in the same row
+        split = ((starts[1:] - ends[:-1] > self.merge_gap) |
+                 (starts[1:] // (cols+1) != ends[:-1] // (cols+1)))
+        starts = starts[np.concatenate(([True], split))]
+        ends = ends[np.concatenate((split, [True]))]
+
+        pieces = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            row, col = divmod(start, cols+1)
+            # text has a leading newline and cols+1 characters per row
+            offset = 1 + start
+            pieces.append(move_to(row, col*width))
+            pieces.append(text[offset:offset + end - start])
+        return u"".join(pieces)
+
+
+class ClearingWriter(object):
+    """
+    Clears the terminal and prints every frame in full.  Used where the
+        terminal doesn't understand ANSI escapes.
+    """
+    def __init__(self):
+        self.frames = 0
+        self.full_redraws = 0
+
+    def reset(self):
+        pass
+
+    def write(self, frame):
+        console.clear_term()
+        print(frame)
+        self.frames += 1
+        self.full_redraws += 1
+        return len(frame)
+
+    def close(self):
+        pass
+
+
+def get_writer(differential=True, stream=None, full_redraw_ratio=0.5):
+    """
+    Writer for playing frames in the terminal.  A `TerminalWriter` if
+        `differential` and the terminal supports it, otherwise a
+        `ClearingWriter`.
+    """
+    if differential and (stream is not None or console.enable_ansi()):
+        return TerminalWriter(stream, full_redraw_ratio)
+    return ClearingWriter()
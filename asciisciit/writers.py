@@ -0,0 +1,367 @@
+"""
+
+writers.py
+
+@author: derricw
+
+Movie writers for rendered frames.
+
+"""
+import struct
+from subprocess import Popen, PIPE
+
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+PIX_FMTS = {1: "gray", 3: "rgb24"}
+
+
+def _as_array(frame):
+    frame = np.asarray(frame)
+    if frame.dtype != np.uint8:
+        raise TypeError("frames must be uint8")
+    if frame.ndim == 3 and frame.shape[2] == 1:
+        frame = frame[..., 0]
+    if frame.ndim not in (2, 3) or (frame.ndim == 3 and frame.shape[2] != 3):
+        raise ValueError("frames must be (h, w) gray or (h, w, 3) RGB")
+    return frame
+
+
+class FFmpegWriter(object):
+    """
+    Streams raw frames into ffmpeg over a pipe.  Frames go in as rawvideo
+        (gray8 or rgb24), so nothing is compressed before ffmpeg encodes
+        them, and thin glyph strokes don't pick up JPEG artifacts.
+
+    ffmpeg is started on the first frame, which sets the size and pixel
+        format of the movie.  Odd sizes are padded to even ones, which most
+        codecs need for yuv420p.
+
+    Parameters
+    ----------
+    output_path : str
+        Output file path.
+    fps : float
+        Frame rate.
+    codec : str
+        ffmpeg video codec.
+    crf : int
+        Constant rate factor (quality) for codecs that support it, like
+        libx264.  None leaves the codec's default.
+    preset : str
+        Encoder preset, for codecs that support it.
+    pix_fmt : str
+        Output pixel format.
+    ffmpeg : str
+        ffmpeg executable.
+    extra_args : list
+        More output options, inserted before the output path.
+
+    Examples
+    --------
+
+    >>> with FFmpegWriter("out.mp4", fps=24.0, crf=20) as writer:
+    ...     for img in images:
+    ...         writer.write(img)
+
+    """
+    def __init__(self,
+                 output_path,
+                 fps=15.0,
+                 codec="libx264",
+                 crf=18,
+                 preset=None,
+                 pix_fmt="yuv420p",
+                 ffmpeg="ffmpeg",
+                 extra_args=None):
+        self.output_path = output_path
+        self.fps = fps
+        self.codec = codec
+        self.crf = crf
+        self.preset = preset
+        self.pix_fmt = pix_fmt
+        self.ffmpeg = ffmpeg
+        self.extra_args = list(extra_args or [])
+        self.size = None
+        self.input_pix_fmt = None
+        self.frames = 0
+        self._shape = None
+        self._process = None
+
+    def command(self, size, input_pix_fmt):
+        """ ffmpeg command line for frames of `size` (width, height). """
+        width, height = size
+        cmd = [self.ffmpeg, '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', input_pix_fmt,
+               '-s', '%dx%d' % (width, height), '-r', str(self.fps),
+               '-i', '-', '-an', '-vcodec', self.codec]
+        if self.crf is not None:
+            cmd += ['-crf', str(self.crf)]
+        if self.preset is not None:
+            cmd += ['-preset', self.preset]
+        if self.pix_fmt is not None:
+            cmd += ['-pix_fmt', self.pix_fmt]
+        if width % 2 or height % 2:
+            cmd += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+        return cmd + self.extra_args + [self.output_path]
+
+    def write(self, frame):
+        """
+        Writes a frame.
+
+        Parameters
+        ----------
+        frame : ndarray, PIL.Image
+            (h, w) gray or (h, w, 3) RGB uint8 frame.  Every frame must have
+            the same shape as the first.
+
+        """
+        frame = _as_array(frame)
+        if self._process is None:
+            self._shape = frame.shape
+            self.size = (frame.shape[1], frame.shape[0])
+            self.input_pix_fmt = PIX_FMTS[1 if frame.ndim == 2 else 3]
+            self._process = Popen(self.command(self.size, self.input_pix_fmt),
+                                  stdin=PIPE)
+        elif frame.shape != self._shape:
+            raise ValueError("frame shape %s doesn't match the first frame's %s"
+                             % (frame.shape, self._shape))
+        self._process.stdin.write(np.ascontiguousarray(frame).data)
+        self.frames += 1
+
+    def close(self):
+        """ Finishes the movie.  Raises IOError if ffmpeg failed. """
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        process.stdin.close()
+        if process.wait() != 0:
+            raise IOError("ffmpeg exited with %d" % process.returncode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ImageioWriter(object):
+    """
+    Writes frames with imageio's ffmpeg plugin (the imageio-ffmpeg package)
+        instead of a system ffmpeg.  Same interface as `FFmpegWriter`.
+    """
+    def __init__(self,
+                 output_path,
+                 fps=15.0,
+                 codec="libx264",
+                 crf=18,
+                 preset=None,
+                 pix_fmt="yuv420p",
+                 extra_args=None):
+        import imageio
+        params = []
+        if crf is not None:
+            params += ['-crf', str(crf)]
+        if preset is not None:
+            params += ['-preset', preset]
+        params += list(extra_args or [])
+        self.output_path = output_path
+        self.fps = fps
+        self.frames = 0
+        self.size = None
+        # macro_block_size=2 only pads to even sizes, like FFmpegWriter
+        self._writer = imageio.get_writer(output_path,
+                                          format="FFMPEG",
+                                          mode="I",
+                                          fps=fps,
+                                          codec=codec,
+                                          pixelformat=pix_fmt,
+                                          quality=None,
+                                          macro_block_size=2,
+                                          ffmpeg_params=params)
+
+    def write(self, frame):
+        frame = _as_array(frame)
+        if self.size is None:
+            self.size = (frame.shape[1], frame.shape[0])
+        self._writer.append_data(frame)
+        self.frames += 1
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class GifWriter(object):
+    """
+    Streaming GIF writer for palette frames.  Each frame is encoded and
+        written as soon as the next one arrives, so memory use doesn't grow
+        with the length of the animation.
+
+    With `optimize`, every frame after the first only stores the rectangle
+        that changed since the previous frame, with the unchanged pixels in
+        it transparent, and frames identical to the previous one just extend
+        its duration.
+
+    Parameters
+    ----------
+    output_path : str, file
+        Output file path, or a binary file object.
+    palette : sequence
+        (R,G,B) colors, frames are indices into it.  At most 255 colors with
+        `optimize` (one index is needed for transparency), else 256.
+    duration : float
+        Milliseconds per frame.
+    loop : int
+        Times to loop, 0 loops forever, None plays once.
+    optimize : bool
+        Only store what changed from frame to frame.
+
+    Examples
+    --------
+
+    >>> with GifWriter("out.gif", [(0, 0, 0), (255, 255, 255)], 100) as gif:
+    ...     for frame in frames:
+    ...         gif.write(frame > 127)
+
+    """
+    def __init__(self, output_path, palette, duration=100.0, loop=0,
+                 optimize=True):
+        palette = [tuple(color) for color in palette]
+        colors = len(palette) + (1 if optimize else 0)
+        if not 1 <= colors <= 256:
+            raise ValueError("palette must have 1 to %d colors"
+                             % (255 if optimize else 256))
+        self.palette = palette
+        self.duration = duration
+        self.loop = loop
+        self.optimize = optimize
+        self.transparency = len(palette) if optimize else None
+        self.frames = 0
+        self.size = None
+        self._bits = max(1, int(np.ceil(np.log2(colors))))
+        if hasattr(output_path, "write"):
+            self._file, self._owned = output_path, False
+        else:
+            self._file, self._owned = open(output_path, "wb"), True
+        self._previous = None
+        self._pending = None
+
+    def _write_header(self, width, height):
+        table = list(self.palette)
+        table += [(0, 0, 0)]*(2**self._bits - len(table))
+        flags = 0x80 | (self._bits - 1) << 4 | (self._bits - 1)
+        self._file.write(b"GIF89a" + struct.pack("<HHBBB", width, height,
+                                                  flags, 0, 0))
+        self._file.write(b"".join(struct.pack("BBB", *c) for c in table))
+        if self.loop is not None:
+            self._file.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" +
+                             struct.pack("<H", self.loop) + b"\x00")
+
+    def write(self, frame, duration=None):
+        """
+        Adds a frame.
+
+        Parameters
+        ----------
+        frame : ndarray
+            (h, w) array of palette indices.  Every frame must have the
+            same shape.
+        duration : float
+            Milliseconds to show this frame, defaults to `duration`.
+
+        """
+        frame = np.asarray(frame).astype(np.uint8, copy=False)
+        if duration is None:
+            duration = self.duration
+        previous = self._previous
+        if previous is None:
+            self.size = (frame.shape[1], frame.shape[0])
+            self._write_header(*self.size)
+            pending = (frame, (0, 0))
+        elif frame.shape != previous.shape:
+            raise ValueError("frame shape %s doesn't match the first frame's %s"
+                             % (frame.shape, previous.shape))
+        elif not self.optimize:
+            pending = (frame, (0, 0))
+        else:
+            changed = frame != previous
+            rows = np.flatnonzero(changed.any(axis=1))
+            if not len(rows):
+                # nothing new, show the last frame longer
+                self._pending[2] += duration
+                self.frames += 1
+                return
+            cols = np.flatnonzero(changed.any(axis=0))
+            y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+            delta = np.where(changed[y0:y1, x0:x1], frame[y0:y1, x0:x1],
+                             np.uint8(self.transparency))
+            pending = (delta, (int(x0), int(y0)))
+        self._flush()
+        self._pending = [pending[0], pending[1], duration]
+        self._previous = frame.copy()
+        self.frames += 1
+
+    def _flush(self):
+        if self._pending is None:
+            return
+        pixels, offset, duration = self._pending
+        # gif delays are in hundredths of a second
+        params = {"duration": int(round(duration/10.0))*10, "disposal": 1}
+        if self.transparency is not None:
+            params["transparency"] = self.transparency
+        img = Image.fromarray(np.ascontiguousarray(pixels), "L")
+        for data in GifImagePlugin.getdata(img, offset, **params):
+            self._file.write(data)
+        self._pending = None
+
+    def close(self):
+        """ Writes the last frame and finishes the file. """
+        if self._file is None:
+            return
+        self._flush()
+        if self._previous is not None:
+            self._file.write(b";")
+        if self._owned:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+WRITERS = {"ffmpeg": FFmpegWriter,
+           "imageio": ImageioWriter}
+
+
+def get_movie_writer(output_path, fps=15.0, backend="ffmpeg", **kwargs):
+    """
+    Movie writer for rendered frames.
+
+    Parameters
+    ----------
+    output_path : str
+        Output file path.
+    fps : float
+        Frame rate.
+    backend : str
+        "ffmpeg" pipes frames to an ffmpeg executable, "imageio" uses
+        imageio's ffmpeg plugin.
+    **kwargs
+        Passed on to the writer (codec, crf, preset...).
+
+    """
+    try:
+        writer = WRITERS[backend]
+    except KeyError:
+        raise ValueError("unknown writer backend %r, options are %s"
+                         % (backend, sorted(WRITERS)))
+    return writer(output_path, fps, **kwargs)
@@ -32,6 +32,7 @@ setup(name="asciisciit",
       zip_safe=True,
       install_requires=['opencv-python', 'numpy', 'pillow', 'imageio'],
       package_data = {"":["res/*.ttf"]},
-      entry_points = {'console_scripts': ['asciit = asciisciit.asciit:main',],},
+      entry_points = {'console_scripts': ['asciit = asciisciit.asciit:main',
+                                          'asciit-service = asciisciit.service:main',],},
       )
 
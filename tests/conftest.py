@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+
+def _write_movie(path, frames=10):
+    import cv2
+    video = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30.0,
+                            (320, 240))
+    for _ in range(frames):
+        video.write(np.random.randint(0, 255, (240, 320, 3), dtype=np.uint8))
+    video.release()
+
+
+@pytest.fixture
+def write_movie():
+    """ Writes a 320x240, 30fps MJPG movie of `frames` random frames. """
+    return _write_movie
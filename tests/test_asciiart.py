@@ -26,3 +26,92 @@ def test_ascii_image(output, scalefactor, invert, equalize, lut, tmpdir_factory)
         aimg.to_file(tpath)
         ipath = str(tmpdir_factory.mktemp("test").join("test.png"))
         aimg.render(ipath)
+
+
+def test_ascii_image_cache(monkeypatch):
+    calls = []
+    convert = aart.Converter.convert
+
+    def counting_convert(self, frame):
+        calls.append(frame)
+        return convert(self, frame)
+
+    monkeypatch.setattr(aart.Converter, "convert", counting_convert)
+    img = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    aimg = aart.AsciiImage(img, 0.1)
+    text = aimg.data
+    assert(aimg.size == aart.get_ascii_image_size(text))
+    str(aimg)
+    assert(len(calls) == 1)
+    for name, value in (("scalefactor", 0.2), ("invert", True),
+                        ("equalize", False), ("lut", "binary"),
+                        ("font_path", aart.os.path.join(aart.RESOURCE_DIR,
+                                                        "Cousine-Regular.ttf")),
+                        ("image", img[:240])):
+        setattr(aimg, name, value)
+        assert(aimg.data != text)
+        text = aimg.data
+        assert(aimg.size == aart.get_ascii_image_size(text))
+    assert(len(calls) == 7)
+
+
+@pytest.mark.parametrize("invert,equalize",
+                         itertools.product((True, False), (True, False)))
+def test_generate_sequence(invert, equalize):
+    stack = np.random.randint(0, 255, (5, 120, 160), dtype=np.uint8)
+    seq = aart.generate_sequence(stack, 0.2, invert, equalize)
+    for image, frame in zip(seq, stack):
+        assert(isinstance(image, aart.AsciiImage))
+        assert(image.data ==
+               aart.AsciiImage(frame, 0.2, invert, equalize).data)
+    assert(len(set(image.converter for image in seq)) == 1)
+    frames = aart.generate_sequence(stack, 0.2, invert, equalize,
+                                    batched=True)
+    assert(frames == aart.frames_to_ascii(stack, 0.2, invert, equalize))
+    frames = aart.generate_sequence(list(stack), 0.2, invert, equalize,
+                                    batched=True)
+    assert([frame.text for frame in frames] == [image.data for image in seq])
+
+
+def test_ascii_movie_gif(tmpdir):
+    from PIL import Image, ImageSequence
+    frames = [Image.fromarray(np.random.randint(0, 255, (120, 160),
+                                                dtype=np.uint8))
+              for _ in range(4)]
+    path = str(tmpdir.join("test.gif"))
+    frames[0].save(path, save_all=True, append_images=frames[1:],
+                   duration=[40, 80, 40, 120], loop=0)
+    movie = aart.AsciiMovie(path, scalefactor=0.2)
+    assert(movie.default_fps == 25.0)
+    movie.play(repeats=1, differential=False)
+    assert(movie.scheduler.displayed + movie.scheduler.dropped == 4)
+    # durations carry over to the rendered gif
+    output = str(tmpdir.join("out.gif"))
+    movie.render(output)
+    durations = [f.info["duration"] for f in
+                 ImageSequence.Iterator(Image.open(output))]
+    assert(durations == [40, 80, 40, 120])
+
+
+def test_ascii_movie_gif_url(tmpdir):
+    from PIL import Image
+    from test_cache import ImageServer
+    frames = [Image.fromarray(np.random.randint(0, 255, (120, 160),
+                                                dtype=np.uint8))
+              for _ in range(3)]
+    path = str(tmpdir.join("test.gif"))
+    frames[0].save(path, save_all=True, append_images=frames[1:],
+                   duration=50, loop=0)
+    server = ImageServer({}, "test.gif")
+    try:
+        with open(path, "rb") as f:
+            server.body = f.read()
+        movie = aart.AsciiMovie(server.url, scalefactor=0.2)
+        movie.play(repeats=1, differential=False)
+        movie.render(str(tmpdir.join("out.gif")))
+        movie.save(str(tmpdir.join("out.ascm")))
+    finally:
+        server.close()
+    # downloaded once, not for every read
+    assert(len(server.requests) == 1)
+    assert(movie.size == (160, 120))
@@ -0,0 +1,66 @@
+import itertools
+from asciisciit import conversions as conv
+from asciisciit.atlas import GlyphAtlas, MAX_STACKS
+from asciisciit.fonts import get_text_size
+from PIL import Image, ImageDraw
+import numpy as np
+import pytest
+
+
+def draw_text(text, font_size, bg_color, fg_color):
+    # the per-line ImageDraw renderer the atlas replaces
+    font = conv.get_font(None, font_size)
+    if conv.relative_width(text[1]) == 2:
+        font_width, font_height = get_text_size(font, u"\u3000")
+    else:
+        font_width, font_height = get_text_size(font, u" ")
+    img_height, img_width = conv.get_ascii_image_size(text)
+    img = Image.new("RGB", (font_width*img_width, (font_height+1)*img_height),
+                    bg_color)
+    draw = ImageDraw.Draw(img)
+    for index, line in enumerate(text.split("\n")):
+        draw.text((0, (font_height+1)*index), line, fg_color, font=font)
+    return img
+
+
+@pytest.mark.parametrize("lut,font_size,colors",
+                         itertools.product((u"simple", u"binary", u"\u3105\u3106\u3107"),
+                                           (8, 10, 17),
+                                           (((20, 20, 20), (255, 255, 255)),
+                                            ((250, 240, 10), (3, 7, 90)))))
+def test_ascii_to_pil(lut, font_size, colors):
+    img = np.random.randint(0, 255, (60, 90), dtype=np.uint8)
+    text = conv.numpy_to_ascii(img, 0.5, False, True, lut)
+    expected = np.asarray(draw_text(text, font_size, *colors))
+    rendered = np.asarray(conv.ascii_to_pil(text, font_size, *colors))
+    assert(np.array_equal(rendered, expected))
+
+
+@pytest.mark.parametrize("text", (u"hello\nworld gy\n\nabc",
+                                  u"\nab\nabcdef\ng",
+                                  u"x\nyy\n"))
+def test_ascii_to_pil_ragged(text):
+    expected = np.asarray(draw_text(text, 10, (20, 20, 20), (255, 255, 255)))
+    assert(np.array_equal(np.asarray(conv.ascii_to_pil(text)), expected))
+
+
+def test_glyph_atlas():
+    atlas = GlyphAtlas(conv.get_font(), (6, 10))
+    assert(atlas.glyph(u"g") is atlas.glyph(u"g"))
+    assert(not atlas.glyph(u" ")[(0, 0)].any())
+    # descender spills into the cell below
+    assert((1, 0) in atlas.glyph(u"g"))
+    indices = np.array([[0, 1], [1, 0]])
+    img = atlas.render([u" ", u"@"], indices)
+    assert(img.size == (12, 20))
+    assert(np.asarray(img)[:10, :6].max() == 20)
+
+
+def test_glyph_atlas_stacks_bounded():
+    atlas = GlyphAtlas(conv.get_font(), (6, 10))
+    stack = atlas.stack(u" @")
+    assert(atlas.stack(u" @") is stack)
+    for i in range(100):
+        atlas.stack(u" @%d" % i)
+    assert(len(atlas._stacks) == MAX_STACKS)
+    assert(atlas.stack(u" @") is not stack)
@@ -0,0 +1,131 @@
+import itertools
+import io
+import os
+import sys
+from asciisciit import asciit
+from asciisciit import conversions as conv
+from asciisciit.batch import (convert_files, find_images, output_path,
+                              BatchReport)
+from PIL import Image
+import numpy as np
+import pytest
+
+
+def make_images(directory):
+    """ A few images in `directory` and a sub-directory, and one bad one. """
+    paths = []
+    for i, name in enumerate(["a.png", "b.jpg", os.path.join("sub", "c.png")]):
+        path = os.path.join(directory, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        img = np.random.randint(0, 255, (60 + i*10, 80), dtype=np.uint8)
+        Image.fromarray(img).save(path)
+        paths.append(path)
+    with open(os.path.join(directory, "notes.txt"), "w") as f:
+        f.write("not an image")
+    with open(os.path.join(directory, "broken.png"), "wb") as f:
+        f.write(b"not an image either")
+    return paths
+
+
+def test_find_images(tmpdir):
+    directory = str(tmpdir)
+    a, b, c = make_images(directory)
+    broken = os.path.join(directory, "broken.png")
+    found = find_images([directory])
+    assert([path for path, _ in found] == [a, b, broken, c])
+    assert(set(root for _, root in found) == set([directory]))
+    # globs and named files, each found once
+    found = find_images([os.path.join(directory, "*.png"), a,
+                         os.path.join(directory, "notes.txt")])
+    assert(found == [(a, None), (broken, None),
+                     (os.path.join(directory, "notes.txt"), None)])
+    assert(find_images([os.path.join(directory, "nothing*")]) == [])
+    assert(output_path(c, "out", "png", directory) ==
+           os.path.join("out", "sub", "c.png.png"))
+    assert(output_path(c, "out") == os.path.join("out", "c.png.txt"))
+
+
+def test_output_collisions(tmpdir):
+    directory = str(tmpdir.join("in"))
+    out = str(tmpdir.join("out"))
+    img = np.random.randint(0, 255, (60, 80), dtype=np.uint8)
+    names = [os.path.join("a", "x.png"), os.path.join("b", "x.png"),
+             os.path.join("a", "x.jpg")]
+    for name in names:
+        path = os.path.join(directory, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        Image.fromarray(img).save(path)
+    # a directory keeps them apart
+    results = list(convert_files([directory], out, workers=1))
+    outputs = set(r.output for r in results if r.error is None)
+    assert(len(outputs) == 3)
+    # the same name from two directories is reported, not overwritten
+    a, b, c = [os.path.join(directory, name) for name in names]
+    results = list(convert_files([os.path.join(directory, "*", "*.png"), c],
+                                 str(tmpdir.join("flat")), workers=2))
+    errors = dict((r.path, r.error) for r in results if r.error)
+    assert(sorted(errors) == sorted([a, b]))
+    assert(b in errors[a] and a in errors[b])
+    assert([r.output for r in results if r.error is None] ==
+           [os.path.join(str(tmpdir.join("flat")), "x.jpg.txt")])
+
+
+@pytest.mark.parametrize("format,workers",
+                         itertools.product(("text", "png"), (1, 2)))
+def test_convert_files(tmpdir, format, workers):
+    directory = str(tmpdir.join("in"))
+    out = str(tmpdir.join("out"))
+    paths = make_images(directory)
+    report = BatchReport()
+    for result in convert_files([directory], out, format, scalefactor=0.2,
+                                workers=workers):
+        report.add(result)
+    # the bad file is skipped, the rest are written
+    assert(report.converted == 3)
+    assert([r.path for r in report.failed] ==
+           [os.path.join(directory, "broken.png")])
+    assert(report.failed[0].output is None)
+    assert(report.latency.count == 4)
+    assert("3 of 4 files" in report.summary())
+    for path in paths:
+        frame = conv.Converter(0.2, lock_size=False).convert(path)
+        output = output_path(path, out, format, directory)
+        if format == "text":
+            with io.open(output, encoding="utf-8") as f:
+                assert(f.read() == frame.text)
+        else:
+            assert(np.array_equal(np.asarray(Image.open(output)),
+                                  np.asarray(conv.ascii_to_pil(frame))))
+    with pytest.raises(ValueError):
+        list(convert_files([directory], out, "gif"))
+
+
+def test_convert_files_cached(tmpdir):
+    directory = str(tmpdir.join("in"))
+    cache_dir = str(tmpdir.join("cache"))
+    make_images(directory)
+    for _ in range(2):
+        results = list(convert_files([directory], str(tmpdir.join("out")),
+                                     workers=2, cache_dir=cache_dir))
+        assert(len([r for r in results if r.error is None]) == 3)
+    # one entry per converted image, shared by both runs
+    entries = [name for _, _, names in os.walk(cache_dir) for name in names]
+    assert(len(entries) == 3)
+
+
+def test_cli(tmpdir, monkeypatch, capsys):
+    directory = str(tmpdir.join("in"))
+    out = str(tmpdir.join("out"))
+    make_images(directory)
+    monkeypatch.setattr(sys, "argv", ["asciit", directory, "-o", out,
+                                      "-j", "2", "--format", "png"])
+    with pytest.raises(SystemExit) as e:
+        asciit.main()
+    # a file failed
+    assert(e.value.code == 1)
+    stdout, stderr = capsys.readouterr()
+    assert(len(stdout.split()) == 3)
+    assert("Skipped" in stderr and "3 of 4 files" in stderr)
+    assert(os.path.isfile(os.path.join(out, "sub", "c.png.png")))
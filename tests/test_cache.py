@@ -0,0 +1,192 @@
+import io
+import itertools
+import os
+import sys
+import threading
+if sys.version_info < (3, 0):
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+else:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+from asciisciit import asciiart as aart
+from asciisciit import conversions as conv
+from asciisciit.cache import (ResultCache, cache_key, convert_cached,
+                              fetch_url)
+from PIL import Image
+import numpy as np
+import pytest
+
+
+def png_bytes(shape=(120, 160)):
+    img = Image.fromarray(np.random.randint(0, 255, shape, dtype=np.uint8))
+    data = io.BytesIO()
+    img.save(data, "PNG")
+    return data.getvalue()
+
+
+class ImageServer(object):
+    """ Local stand-in for an image host, counting what it's asked. """
+    def __init__(self, headers, name="img.png"):
+        self.body = png_bytes()
+        self.headers = headers
+        self.requests = []
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                owner.requests.append(dict(self.headers.items()))
+                etag = owner.headers.get("ETag")
+                if etag and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                for name, value in owner.headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(owner.body)))
+                self.end_headers()
+                self.wfile.write(owner.body)
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:%d/%s" % (self.server.server_address[1],
+                                               name)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def image_server(request):
+    server = ImageServer(request.param)
+    yield server
+    server.close()
+
+
+def test_result_cache(tmpdir):
+    directory = str(tmpdir.join("cache"))
+    cache = ResultCache(directory, memory_bytes=250, disk_bytes=500)
+    values = [bytes(bytearray([i]))*100 for i in range(6)]
+    keys = [cache_key(value) for value in values]
+    for key, value in zip(keys, values):
+        cache.put(key, value)
+    stats = cache.stats()
+    # two fit in memory, five on disk
+    assert(stats["memory_entries"] == 2)
+    assert(stats["disk_entries"] == 5)
+    assert(stats["evictions"] == 1)
+    assert(cache.get(keys[5]) == values[5])
+    assert(cache.get(keys[1]) == values[1])
+    assert(cache.get(keys[0]) is None)
+    assert((cache.memory_hits, cache.disk_hits, cache.misses) == (1, 1, 1))
+    assert(cache.hit_rate == 2.0/3)
+
+    # the disk store outlives the process, least recently used first
+    #   (last modified, which reads touch)
+    for age, key in enumerate([keys[1], keys[5], keys[4], keys[3], keys[2]]):
+        path = cache._path(key)
+        os.utime(path, (os.path.getatime(path), 1e9 - age))
+    cache = ResultCache(directory, memory_bytes=250, disk_bytes=300)
+    assert(cache.stats()["disk_entries"] == 3)
+    assert(cache.get(keys[1]) == values[1])
+    assert(cache.get(keys[2]) is None)
+    cache.clear()
+    assert(cache.get(keys[1]) is None)
+
+    memory_only = ResultCache(memory_bytes=1000)
+    memory_only.put(keys[0], values[0])
+    assert(memory_only.get(keys[0]) == values[0])
+
+
+@pytest.mark.parametrize("scalefactor,invert,lut",
+                         itertools.product((0.1, 0.2), (True, False),
+                                           ("simple", "binary")))
+def test_convert_cached(scalefactor, invert, lut):
+    data = png_bytes()
+    cache = ResultCache()
+    converter = conv.Converter(scalefactor, invert, lut=lut, lock_size=False)
+    first = convert_cached(converter, data, cache)
+    second = convert_cached(converter, data, cache)
+    assert(cache.hits == 1)
+    assert(first == second)
+    assert(second.text == converter.convert(data).text)
+    other = conv.Converter(scalefactor, not invert, lut=lut)
+    assert(convert_cached(other, data, cache) != first)
+    assert(cache.misses == 2)
+
+
+def test_convert_cached_params():
+    data = png_bytes()
+    cache = ResultCache()
+    # same characters, different bins
+    simple = conv.Converter(0.2, lut="simple", lock_size=False)
+    linear = conv.Converter(0.2, lut=u"".join(simple.lookup.chars),
+                            lock_size=False)
+    for converter in (simple, linear):
+        assert(convert_cached(converter, data, cache) ==
+               converter.convert(data))
+    assert(cache.misses == 2)
+    # temporal smoothing depends on earlier frames, so it isn't cached
+    smooth = conv.Converter(0.2, smoothing=0.5)
+    convert_cached(smooth, data, cache)
+    convert_cached(smooth, data, cache)
+    assert((cache.hits, cache.misses) == (0, 2))
+    # a locked size is part of the key, and a hit locks it too
+    locked = conv.Converter(0.2)
+    first = convert_cached(locked, data, cache)
+    assert(locked.size is not None)
+    other = conv.Converter(0.2)
+    assert(convert_cached(other, data, cache) == first)
+    assert(other.size == locked.size)
+    assert(convert_cached(locked, png_bytes((60, 80)), cache).shape ==
+           first.shape)
+
+
+@pytest.mark.parametrize("image_server",
+                         [{"ETag": '"v1"'}], indirect=True)
+def test_fetch_url_etag(image_server):
+    cache = ResultCache()
+    assert(fetch_url(image_server.url, cache) == image_server.body)
+    assert(fetch_url(image_server.url, cache) == image_server.body)
+    # revalidated, not downloaded again
+    assert(image_server.requests[1].get("If-None-Match") == '"v1"')
+    # a new version replaces the cached one
+    image_server.body = png_bytes()
+    image_server.headers["ETag"] = '"v2"'
+    assert(fetch_url(image_server.url, cache) == image_server.body)
+    assert(fetch_url(image_server.url, cache) == image_server.body)
+    assert(len(image_server.requests) == 4)
+
+
+@pytest.mark.parametrize("image_server",
+                         [{"Cache-Control": "max-age=60"}], indirect=True)
+def test_fetch_url_max_age(image_server, tmpdir):
+    cache = ResultCache(str(tmpdir))
+    for _ in range(3):
+        assert(fetch_url(image_server.url, cache) == image_server.body)
+    assert(len(image_server.requests) == 1)
+    # urls and conversions both come out of the cache
+    first = aart.AsciiImage(image_server.url, 0.2, cache=cache)
+    second = aart.AsciiImage(image_server.url, 0.2, cache=cache)
+    assert(first.data == second.data)
+    assert(conv.image_to_ascii(image_server.url, 0.2, cache=cache) ==
+           first.data)
+    assert(len(image_server.requests) == 1)
+
+
+@pytest.mark.parametrize("image_server",
+                         [{}, {"ETag": '"v1"', "Cache-Control": "no-store"}],
+                         indirect=True)
+def test_fetch_url_uncacheable(image_server):
+    cache = ResultCache()
+    fetch_url(image_server.url, cache)
+    fetch_url(image_server.url, cache)
+    assert(len(image_server.requests) == 2)
+    assert("If-None-Match" not in image_server.requests[1])
+    assert(cache.stats()["memory_entries"] == 0)
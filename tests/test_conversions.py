@@ -36,3 +36,186 @@ def test_numpy_to_ascii(invert, equalize, lut):
     expected_len = int(h*0.5*correction)*(int(w*0.5)+1)+1
     text = conv.numpy_to_ascii(img, 0.5, invert, equalize, lut)
     assert(len(text) == expected_len)
+
+
+@pytest.mark.parametrize("invert,equalize,lut",
+                         itertools.product((True, False),
+                                           (True, False),
+                                           (u"simple", u"binary", u"\u3105\u3106\u3107")))
+def test_converter(invert, equalize, lut):
+    img = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    converter = conv.Converter(0.3, invert, equalize, lut)
+    assert(converter.size is None)
+    text = converter.convert(img)
+    assert(text == conv.image_to_ascii(img, 0.3, invert, equalize, lut))
+    assert(converter.size == conv.get_ascii_image_size(text))
+    # dimensions are locked on the first frame
+    text = converter.convert(img[:240, :320])
+    assert(converter.size == conv.get_ascii_image_size(text))
+    converter.reset()
+    converter.convert(img[:240, :320])
+    assert(converter.size != conv.get_ascii_image_size(text))
+    with pytest.raises(TypeError):
+        converter.convert(1)
+
+
+@pytest.mark.parametrize("kind", ("noise", "flat", "few", "narrow"))
+def test_equalize_tables(kind):
+    from PIL import ImageOps
+    import cv2
+    if kind == "noise":
+        img = np.random.randint(0, 255, (97, 131), dtype=np.uint8)
+    elif kind == "flat":
+        img = np.full((97, 131), 77, dtype=np.uint8)
+    elif kind == "few":
+        img = np.random.choice([3, 90, 200], (97, 131)).astype(np.uint8)
+    else:
+        img = np.random.randint(100, 110, (97, 131), dtype=np.uint8)
+    histogram = conv.get_histogram(img)
+    expected = np.array(ImageOps.equalize(conv.numpy_to_pil(img)))
+    assert(np.array_equal(conv.pil_equalize_table(histogram)[img], expected))
+    expected = cv2.equalizeHist(img)
+    assert(np.array_equal(conv.cv2_equalize_table(histogram)[img], expected))
+
+
+def test_converter_smoothing():
+    with pytest.raises(ValueError):
+        conv.Converter(smoothing=1.0)
+    bright = np.random.randint(128, 255, (200, 200), dtype=np.uint8)
+    dark = bright // 2
+    smooth = conv.Converter(0.5, smoothing=0.9)
+    fresh = conv.Converter(0.5, smoothing=0.9)
+    smooth.convert(bright)
+    first = smooth._histogram.copy()
+    smooth.convert(dark)
+    fresh.convert(dark)
+    # a sudden change is damped by the previous frames
+    assert(np.allclose(smooth._histogram,
+                       0.9*first + 0.1*fresh._histogram))
+    # on its own a frame equalizes the same, smoothed or not
+    plain = conv.Converter(0.5)
+    assert(fresh.convert(dark) == plain.convert(dark))
+    assert(conv.Converter(0.5, smoothing=1e-9).convert(bright) ==
+           plain.convert(bright))
+    smooth.reset()
+    assert(smooth._histogram is None)
+
+
+@pytest.mark.parametrize("invert,equalize,shape",
+                         itertools.product((True, False),
+                                           (True, False),
+                                           ((6, 120, 160), (6, 120, 160, 3),
+                                            (130, 40, 60, 4))))
+def test_frames_to_ascii(invert, equalize, shape):
+    import cv2
+    stack = np.random.randint(0, 255, shape, dtype=np.uint8)
+    frames = conv.frames_to_ascii(stack, 0.3, invert, equalize)
+    assert(len(frames) == shape[0])
+    first = stack[0] if len(shape) == 3 else stack[0][..., :3]
+    size = conv.get_ascii_image_size(conv.numpy_to_ascii(first, 0.3))
+    assert(all(f.size == size for f in frames))
+    indices = conv.frames_to_ascii(stack, 0.3, invert, equalize, as_frames=False)
+    assert(indices.shape == (shape[0], size[0]-2, size[1]))
+    if len(shape) == 3:
+        # gray stacks match converting one frame at a time
+        frames = conv.frames_to_ascii(stack, 0.3, invert, equalize,
+                                      interpolation=cv2.INTER_LINEAR)
+        for frame, img in zip(frames, stack):
+            assert(frame == conv.numpy_to_ascii(img, 0.3, invert, equalize))
+
+
+@pytest.mark.parametrize("ext", (".jpg", ".png"))
+def test_decode_reduced(ext, tmpdir):
+    img = np.random.randint(0, 255, (1200, 1600, 3), dtype=np.uint8)
+    path = str(tmpdir.join("big" + ext))
+    conv.numpy_to_pil(img).save(path)
+    reduced = conv.decode_reduced(conv.open_pil_img(path), (160, 67))
+    assert(320 <= reduced.size[0] < 1600)
+    assert(134 <= reduced.size[1] < 1200)
+    # output dimensions don't change
+    text = conv.image_to_ascii(path, 0.1)
+    expected = conv.image_to_ascii(img, 0.1)
+    assert(conv.get_ascii_image_size(text) ==
+           conv.get_ascii_image_size(expected))
+    with open(path, "rb") as f:
+        frame = conv.Converter(0.1).convert(f.read())
+    assert(frame.size == conv.get_ascii_image_size(expected))
+
+
+@pytest.mark.parametrize("py2", (True, False))
+def test_is_encoded_image(py2, tmpdir, monkeypatch):
+    monkeypatch.setattr(conv, "PY2", py2)
+    img = np.random.randint(0, 255, (60, 80), dtype=np.uint8)
+    for ext in (".png", ".jpg", ".gif", ".bmp", ".tif"):
+        path = str(tmpdir.join("img" + ext))
+        conv.numpy_to_pil(img).save(path)
+        with open(path, "rb") as f:
+            assert(conv.is_encoded_image(f.read()))
+        assert(not conv.is_encoded_image(path))
+        # on python 2 paths are bytes as well
+        assert(conv.is_encoded_image(path.encode("utf-8")) != py2)
+    assert(conv.is_encoded_image(b"http://i.imgur.com/l2FU2J0.jpg") != py2)
+
+
+@pytest.mark.parametrize("colors,lut",
+                         itertools.product((2, 255),
+                                           (u"simple", u"binary")))
+def test_ascii_seq_to_gif(colors, lut, tmpdir):
+    from PIL import Image, ImageSequence
+    frames = np.random.randint(0, 255, (4, 120, 160), dtype=np.uint8)
+    frames[2] = frames[1]
+    converter = conv.Converter(0.2, lut=lut)
+    seq = [converter.convert(frame) for frame in frames]
+    path = str(tmpdir.join("test.gif"))
+    # generators are streamed
+    conv.ascii_seq_to_gif((frame for frame in seq), path, fps=10.0,
+                          colors=colors)
+    gif = Image.open(path)
+    decoded = [np.asarray(f.convert("RGB"), dtype=np.int32)
+               for f in ImageSequence.Iterator(gif)]
+    # repeated frames are merged into one
+    assert(len(decoded) == 3)
+    assert(gif.info["loop"] == 0)
+    for frame, img in zip(seq[:2] + seq[3:], decoded):
+        rendered = np.asarray(conv.ascii_to_pil(frame), dtype=np.int32)
+        if colors == 255:
+            assert(np.abs(img - rendered).max() <= 2)
+        else:
+            # text or background, whichever is closer
+            text = rendered[..., 0] > (20 + 255)//2
+            assert(np.mean((img[..., 0] == 255) != text) < 0.01)
+
+
+@pytest.mark.parametrize("gray,size", ((False, None), (True, None),
+                                       (True, (40, 30))))
+def test_read_gif(gray, size, tmpdir):
+    from PIL import Image
+    palette = np.array([[0, 0, 0], [255, 0, 0], [0, 255, 0], [0, 0, 255]],
+                       dtype=np.uint8)
+    indices = np.random.randint(0, 4, (5, 60, 80), dtype=np.uint8)
+    # mostly static, so pillow stores partial frames
+    indices[1:, :30] = indices[0, :30]
+    frames = [Image.fromarray(palette[i]) for i in indices]
+    durations = [50, 100, 70, 70, 200]
+    path = str(tmpdir.join("test.gif"))
+    frames[0].save(path, save_all=True, append_images=frames[1:],
+                   duration=durations, optimize=True, loop=0)
+    read = list(conv.read_gif(path, size, gray))
+    assert([d for _, d in read] == durations)
+    for img, (frame, _) in zip(frames, read):
+        if gray:
+            expected = img.convert("L")
+            if size:
+                expected = expected.resize(size, Image.BILINEAR)
+            assert(np.array_equal(frame, np.asarray(expected)))
+        else:
+            assert(frame.shape == (60, 80, 4))
+            assert(np.array_equal(frame[..., :3], np.asarray(img)))
+    stack, duration = conv.gif_to_numpy(path)
+    assert(stack.shape == (5, 60, 80, 4))
+    assert(duration == 50)
+    # no duration stays None for gif_to_numpy, read_gif uses the default
+    frames[0].save(path, save_all=True, append_images=frames[1:])
+    assert(conv.gif_to_numpy(path)[1] is None)
+    assert(set(d for _, d in conv.read_gif(path)) ==
+           set([conv.DEFAULT_GIF_DURATION]))
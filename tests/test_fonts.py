@@ -0,0 +1,64 @@
+import threading
+from asciisciit import fonts
+import pytest
+
+
+def test_font_cache():
+    cache = fonts.FontCache(maxsize=2)
+    font = cache.get_font(None, 10)
+    assert(cache.get_font(fonts.DEFAULT_FONT_PATH, 10) is font)
+    assert(cache.stats()["misses"] == 1)
+    assert(cache.stats()["hits"] == 1)
+    cache.get_font(None, 11)
+    cache.get_font(None, 12)  # evicts size 10
+    assert(cache.stats()["size"] == 2)
+    assert(cache.get_font(None, 10) is not font)
+    cache.clear()
+    assert(cache.stats() == {"hits": 0, "misses": 0, "hit_rate": 0.0,
+                             "size": 0, "maxsize": 2})
+
+
+def test_metrics():
+    cache = fonts.FontCache()
+    font = cache.get_font(None, 10)
+    assert(cache.get_cell_size(None, 10) == fonts.get_text_size(font, u" "))
+    assert(cache.get_cell_size(None, 10, wide=True) ==
+           fonts.get_text_size(font, u"\u3000"))
+    width, height = fonts.get_text_size(font, u"@")
+    assert(cache.get_aspect_correction_factor(u"@") == float(width) / height)
+    atlas = cache.get_atlas(None, 10)
+    assert(cache.get_atlas(None, 10) is atlas)
+    assert(cache.get_atlas(None, 10, fg_color=(0, 0, 0)) is not atlas)
+    # one lookup each, building an atlas doesn't count twice
+    assert(cache.stats()["hits"] + cache.stats()["misses"] == 7)
+
+
+def test_atlases_bounded():
+    cache = fonts.FontCache(max_atlases=4)
+    first = cache.get_atlas(None, 10, fg_color=(0, 0, 0))
+    for value in range(1, 100):
+        cache.get_atlas(None, 10, fg_color=(value, 0, 0))
+    assert(len(cache._entry(None, 10).atlases) == 4)
+    assert(cache.get_atlas(None, 10, fg_color=(0, 0, 0)) is not first)
+    # the most recently used stays
+    atlas = cache.get_atlas(None, 10, fg_color=(99, 0, 0))
+    for value in range(1, 4):
+        cache.get_atlas(None, 10, fg_color=(value, 0, 0))
+    assert(cache.get_atlas(None, 10, fg_color=(99, 0, 0)) is atlas)
+
+
+def test_threads():
+    cache = fonts.FontCache()
+    loaded = []
+
+    def load():
+        for size in range(8, 16):
+            loaded.append(cache.get_font(None, size))
+
+    threads = [threading.Thread(target=load) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert(cache.stats()["misses"] == 8)
+    assert(len(set(id(f) for f in loaded)) == 8)
@@ -0,0 +1,36 @@
+import pickle
+from asciisciit import conversions as conv
+from asciisciit.frame import AsciiFrame
+from asciisciit.lut import get_lut
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("lut", (u"simple", u"\u3105\u3106\u3107"))
+def test_ascii_frame(lut):
+    img = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    frame = conv.Converter(0.2, lut=lut).convert(img)
+    assert(isinstance(frame, AsciiFrame))
+    assert(frame._text is None)
+    assert(frame.indices.dtype == np.uint8)
+    text = conv.image_to_ascii(img, 0.2, lut=lut)
+    # sized without building the text
+    assert(frame.size == conv.get_ascii_image_size(text))
+    assert(len(frame) == len(text))
+    assert(frame._text is None)
+    assert(frame == text)
+    assert(str(frame) == text)
+    assert(frame.split("\n") == text.split("\n"))
+    assert(frame[1] == text[1])
+    assert(u"x" + frame == u"x" + text)
+    assert(frame == AsciiFrame(frame.indices.copy(), get_lut(lut)))
+    assert(frame != AsciiFrame(frame.indices[:-1], get_lut(lut)))
+    assert(pickle.loads(pickle.dumps(frame)) == frame)
+
+
+def test_ascii_to_pil_frame():
+    img = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    frame = conv.Converter(0.2).convert(img)
+    rendered = np.asarray(conv.ascii_to_pil(frame))
+    assert(frame._text is None)
+    assert(np.array_equal(rendered, np.asarray(conv.ascii_to_pil(frame.text))))
@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+from PIL import Image
+import numpy as np
+import pytest
+
+# seconds the package may add to importing numpy and PIL, which it needs
+#   anyway.  It takes about a tenth of that, opencv alone takes more.
+IMPORT_BUDGET = 0.5
+HEAVY = ["cv2", "imageio", "urllib.request"]
+
+# runs in a fresh interpreter, so nothing is imported yet
+SCRIPT = """
+import json, sys, time
+timer = getattr(time, "perf_counter", time.time)
+t0 = timer()
+import numpy, PIL.Image
+t1 = timer()
+import asciisciit.asciit
+from asciisciit import lut
+t2 = timer()
+result = {"dependencies": t1 - t0, "package": t2 - t1,
+          "luts": sorted(lut.UNICODE_LUTS)}
+%s
+result["modules"] = sorted(sys.modules)
+print(json.dumps(result))
+"""
+
+
+def run(code=""):
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join([root, env.get("PYTHONPATH", "")])
+    out = subprocess.check_output([sys.executable, "-c", SCRIPT % code],
+                                  env=env)
+    return json.loads(out.decode("utf-8").splitlines()[-1])
+
+
+def test_import():
+    # best of a few, a cold disk cache isn't what this is guarding
+    results = [run() for _ in range(3)]
+    for result in results:
+        assert([name for name in HEAVY if name in result["modules"]] == [])
+        # no lookup tables until one is used
+        assert(result["luts"] == [])
+    assert(min(r["package"] for r in results) < IMPORT_BUDGET)
+
+
+@pytest.mark.parametrize("outfile", ["out.png", None])
+def test_convert_image(tmpdir, outfile):
+    path = str(tmpdir.join("in.png"))
+    img = np.random.randint(0, 255, (60, 80), dtype=np.uint8)
+    Image.fromarray(img).save(path)
+    code = "asciisciit.asciit.AsciiImage(%r, 0.2).data" % path
+    if outfile:
+        code = "asciisciit.asciit.AsciiImage(%r, 0.2).render(%r)" % (
+            path, str(tmpdir.join(outfile)))
+    result = run(code)
+    # images never need opencv
+    assert([name for name in HEAVY if name in result["modules"]] == [])
@@ -1,4 +1,5 @@
 from asciisciit import lut
+import numpy as np
 import pytest
 
 
@@ -11,6 +12,9 @@ def test_linear_lut():
     l = lut.linear_lut("123456789")
     assert(len(l._chars) == 9)
     assert(len(l._bins) == 8)
+    for chars in ("", "a"):
+        with pytest.raises(ValueError):
+            lut.linear_lut(chars)
 
 
 def test_get_lut():
@@ -18,6 +22,22 @@ def test_get_lut():
     l1 = lut.get_lut("\u3105\u3106\u3107\u3108")
     assert(u"\u3105\u3106\u3107\u3108" in lut.UNICODE_LUTS)
     l2 = lut.get_lut("\u3105\u3106\u3107\u3108")
+    assert(l2 is l1)
+    # custom luts are their characters, built-in names aren't case sensitive
+    assert(lut.get_lut("ab").chars == ["a", "b"])
+    assert(lut.get_lut("AB").chars == ["A", "B"])
+    assert(lut.get_lut("Simple") is lut.get_lut("simple"))
+
+
+def test_get_lut_bounded():
+    simple = lut.get_lut("simple")
+    for i in range(lut.MAX_CUSTOM_LUTS + 10):
+        lut.get_lut(" " + chr(ord("a") + i % 26) * (i // 26 + 1))
+    custom = [key for key in lut.UNICODE_LUTS
+              if key not in lut.LUT_DEFINITIONS]
+    assert(len(custom) == lut.MAX_CUSTOM_LUTS)
+    # built-in luts are never dropped
+    assert(lut.get_lut("simple") is simple)
 
 
 def test_lut():
@@ -33,3 +53,27 @@ def test_lut():
     # unsupported character width
     with pytest.raises(ValueError):
         l = lut.LUT("\u22d8\u22d8\u22d8", [1, 2])
+
+
+@pytest.mark.parametrize("lut_name", ("simple", "binary", "\u3105\u3106\u3107"))
+def test_index_table(lut_name):
+    l = lut.get_lut(lut_name)
+    values = np.arange(256, dtype=np.uint8)
+    expected = np.digitize(values, l._bins)
+    assert(np.array_equal(l.index_table(), expected))
+    assert(np.array_equal(l.index_table(invert=True), expected[::-1]))
+    img = np.random.randint(0, 255, (48, 64), dtype=np.uint8)
+    assert(np.array_equal(l.indices(img), expected[img]))
+    assert(np.array_equal(l.indices(img, invert=True), expected[255-img]))
+    assert((l.apply(img, invert=True) == l.apply(255-img)).all())
+
+
+@pytest.mark.parametrize("lut_name", ("simple", "binary", "\u3105\u3106\u3107", "\uff73\uff74"))
+@pytest.mark.parametrize("invert", (True, False))
+def test_to_text(lut_name, invert):
+    l = lut.get_lut(lut_name)
+    img = np.random.randint(0, 255, (30, 41), dtype=np.uint8)
+    expected = u"\n" + u"".join(l.apply(img, invert).flatten().tolist())
+    assert(l.to_text(img, invert) == expected)
+    assert(l.indices_to_text(l.indices(img, invert)) == expected)
+    assert(l.to_text(np.zeros((0, 0), dtype=np.uint8)) == u"\n")
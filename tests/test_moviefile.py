@@ -0,0 +1,135 @@
+import itertools
+import sys
+from asciisciit import asciit
+from asciisciit import asciiart as aart
+from asciisciit import conversions as conv
+from asciisciit.frame import AsciiFrame
+from asciisciit.moviefile import AsciiMovieReader, AsciiMovieWriter
+import cv2
+import numpy as np
+import pytest
+
+
+def random_walk(frames, shape, chars):
+    # mostly unchanged cells, like a real movie
+    indices = np.random.randint(0, chars, shape)
+    for _ in range(frames):
+        changed = np.random.random(shape) < 0.1
+        indices = np.where(changed, np.random.randint(0, chars, shape),
+                           indices)
+        yield indices
+
+
+@pytest.mark.parametrize("lut,keyframe_interval",
+                         itertools.product((u"simple", u"binary",
+                                            u"\u3105\u3106\u3107"),
+                                           (1, 4, 100)))
+def test_movie_file(lut, keyframe_interval, tmpdir):
+    path = str(tmpdir.join("test.ascm"))
+    lookup = conv.get_lut(lut)
+    frames = list(random_walk(10, (24, 40), len(lookup.chars)))
+    with AsciiMovieWriter(path, lut, 20.0, keyframe_interval) as writer:
+        for index, indices in enumerate(frames):
+            writer.write(AsciiFrame(indices, lookup),
+                         None if index % 2 else 100.0)
+    with AsciiMovieReader(path) as reader:
+        assert(len(reader) == 10)
+        assert(reader.fps == 20.0)
+        assert(reader.shape == (24, 40))
+        assert(reader.lookup.legacy_lookup() == lookup.legacy_lookup())
+        assert(np.allclose(reader.durations, [100.0, 50.0]*5))
+        assert(np.allclose(reader.timestamps,
+                           np.cumsum([0.0] + [100.0, 50.0]*4 + [100.0])/1000))
+        # random access, in any order
+        for index in np.random.permutation(10).tolist() + [-1]:
+            frame = reader[index]
+            assert(np.array_equal(frame.indices, frames[index]))
+            assert(frame.text == lookup.indices_to_text(frames[index]))
+        assert([f.text for f in reader] ==
+               [lookup.indices_to_text(f) for f in frames])
+        with pytest.raises(IndexError):
+            reader[10]
+
+
+def test_movie_file_errors(tmpdir):
+    path = str(tmpdir.join("test.ascm"))
+    writer = AsciiMovieWriter(path)
+    writer.write(np.zeros((10, 10), np.uint8))
+    with pytest.raises(ValueError):
+        writer.write(np.zeros((10, 12), np.uint8))
+    # not closed, no index
+    writer._file.flush()
+    with pytest.raises(IOError):
+        AsciiMovieReader(path)
+    writer.close()
+    assert(len(AsciiMovieReader(path)) == 1)
+    with open(path, "wb") as f:
+        f.write(b"GIF89a" + b"\x00"*64)
+    with pytest.raises(IOError):
+        AsciiMovieReader(path)
+    open(path, "wb").close()
+    with pytest.raises(IOError):
+        AsciiMovieReader(path)
+    # no frames is still a movie
+    AsciiMovieWriter(path).close()
+    with AsciiMovieReader(path) as reader:
+        assert(len(reader) == 0)
+        assert(list(reader) == [])
+
+
+def test_save_movie(tmpdir, write_movie):
+    path = str(tmpdir.join("test.avi"))
+    write_movie(path, 6)
+    output = str(tmpdir.join("test.ascm"))
+    movie = aart.AsciiMovie(path)
+    movie.save(output)
+    # same frames as converting the decoded movie
+    converter = movie._get_converter()
+    video = cv2.VideoCapture(path)
+    expected = [converter.convert(image).text
+                for image in aart.video_frames(video)]
+    with AsciiMovieReader(output) as reader:
+        assert(reader.fps == 30.0)
+        assert([frame.text for frame in reader] == expected)
+
+    movie = aart.AsciiMovie(output)
+    assert(movie.default_fps == 30.0)
+    movie.play(fps=1000.0)
+    assert(movie.scheduler.displayed + movie.scheduler.dropped == 6)
+    gif = str(tmpdir.join("test.gif"))
+    movie.render(gif)
+    assert(len(conv.gif_to_numpy(gif)[0]) > 1)
+
+
+def test_save_gif(tmpdir, monkeypatch):
+    from PIL import Image
+    path = str(tmpdir.join("test.gif"))
+    frames = [Image.fromarray(np.random.randint(0, 255, (60, 80),
+                                                dtype=np.uint8))
+              for _ in range(4)]
+    frames[0].save(path, save_all=True, append_images=frames[1:],
+                   duration=[40, 80, 120, 160])
+    output = str(tmpdir.join("test.ascm"))
+    movie = aart.AsciiMovie(path)
+    movie.save(output)
+    with AsciiMovieReader(output) as reader:
+        assert(len(reader) == 4)
+        assert(np.allclose(reader.durations, [40, 80, 120, 160]))
+        assert([frame.text for frame in reader] ==
+               [frame.text for frame, _ in movie._read_gif()])
+        texts = [frame.text for frame in reader]
+
+    # ascii movies save to ascii movies, from the command line too
+    copy = str(tmpdir.join("copy.ascm"))
+    monkeypatch.setattr(sys, "argv", ["asciit", output, copy])
+    asciit.main()
+    movie = aart.AsciiMovie(output)
+    with pytest.raises(ValueError):
+        movie.save(output)
+    resampled = str(tmpdir.join("resampled.ascm"))
+    movie.save(resampled, fps=10.0, keyframe_interval=2)
+    for path, durations in ((copy, [40, 80, 120, 160]),
+                            (resampled, [100]*4)):
+        with AsciiMovieReader(path) as reader:
+            assert(np.allclose(reader.durations, durations))
+            assert([frame.text for frame in reader] == texts)
@@ -0,0 +1,284 @@
+import itertools
+import threading
+import time
+from asciisciit import asciiart as aart
+from asciisciit import conversions as conv
+from asciisciit import playback
+from asciisciit.playback import (Pipeline, FrameScheduler, AdaptiveScale,
+                                 LatestFrameCapture, clock)
+from asciisciit.terminal import TerminalWriter
+import io
+import cv2
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("queue_size,display_time",
+                         itertools.product((1, 4), (0.0, 0.005)))
+def test_pipeline(queue_size, display_time):
+    frames = np.random.randint(0, 255, (20, 240, 320, 3), dtype=np.uint8)
+    converter = conv.Converter(0.2, smoothing=0.5)
+    displayed = []
+
+    def display(frame):
+        time.sleep(display_time)
+        displayed.append(frame)
+
+    pipeline = Pipeline(iter(frames), converter.convert, queue_size)
+    assert(pipeline.run(display) == len(frames))
+    # same frames, in order, as converting them one after another
+    converter.reset()
+    assert(displayed == [converter.convert(f) for f in frames])
+
+    stats = pipeline.stats()
+    for stage in ("decode", "convert", "display", "total"):
+        assert(stats[stage]["count"] == len(frames))
+        assert(stats[stage]["max"] >= stats[stage]["mean"] >= 0)
+    assert(stats["total"]["mean"] >= stats["convert"]["mean"])
+    # backpressure
+    assert(max(stats["max_queue_depths"].values()) <= queue_size)
+    assert(len(pipeline.frame_intervals) == len(frames) - 1)
+
+
+def test_pipeline_errors():
+    def convert(frame):
+        if frame == 3:
+            raise ValueError("bad frame")
+        return frame
+
+    displayed = []
+    pipeline = Pipeline(range(100), convert, 2)
+    with pytest.raises(ValueError):
+        pipeline.run(displayed.append)
+    assert(displayed == [0, 1, 2])
+    assert(not pipeline._threads)
+
+
+def test_pipeline_stop():
+    # an endless source stops along with the display
+    def display(frame):
+        if frame == 10:
+            raise KeyboardInterrupt
+
+    pipeline = Pipeline(itertools.count(), lambda f: f, 2)
+    with pytest.raises(KeyboardInterrupt):
+        pipeline.run(display)
+    assert(pipeline.frames == 10)
+
+
+def test_play_movie(tmpdir, write_movie):
+    path = str(tmpdir.join("test.avi"))
+    write_movie(path)
+    movie = aart.AsciiMovie(path)
+    movie.play(fps=1000.0)
+    assert(movie.scheduler.displayed + movie.scheduler.dropped == 10)
+    assert(len(movie.frame_intervals) == movie.scheduler.displayed - 1)
+    assert(len(movie.draw_times) == movie.scheduler.displayed)
+
+
+class FakeClock(object):
+    """ Stands in for the scheduler's clock, sleeping only moves it on. """
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(playback, "clock", fake)
+    monkeypatch.setattr(playback.time, "sleep", fake.sleep)
+    return fake
+
+
+@pytest.mark.parametrize("work", (0.0, 0.03))
+def test_frame_scheduler(work, fake_clock):
+    fps = 100.0
+    scheduler = FrameScheduler(fps)
+    for index in range(20):
+        if scheduler.is_late(index):
+            scheduler.drop(index)
+            continue
+        scheduler.wait(index)
+        fake_clock.now += work
+    assert(scheduler.displayed + scheduler.dropped == 20)
+    if work:
+        # stays in sync with the source by dropping frames
+        assert(scheduler.dropped > 0)
+        assert(scheduler.late > 0)
+        assert(fake_clock.now < 20/fps + 3*work)
+    else:
+        # each frame waited for its deadline
+        assert(scheduler.dropped == 0)
+        assert(scheduler.late == 0)
+        assert(len(fake_clock.sleeps) == 19)
+
+
+def test_frame_scheduler_live(fake_clock):
+    scheduler = FrameScheduler(100.0, catch_up=False)
+    scheduler.wait(0)
+    fake_clock.now += 0.05
+    assert(not scheduler.is_late(1))
+    assert(scheduler.wait(1) > 0.03)
+    # schedule moved forward instead of trying to catch up
+    scheduler.wait(2)
+    assert(fake_clock.sleeps and fake_clock.sleeps[-1] > 0.005)
+    assert(scheduler.late == 1)
+
+
+def test_frame_scheduler_drop_threads():
+    scheduler = FrameScheduler(100.0)
+
+    def drop():
+        for index in range(10000):
+            scheduler.drop(index)
+
+    threads = [threading.Thread(target=drop) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert(scheduler.dropped == 40000)
+
+
+def test_pipeline_drops():
+    def convert(frame):
+        time.sleep(0.02)
+        return frame
+
+    displayed = []
+    pipeline = Pipeline(range(30), convert, 2)
+    pipeline.run(displayed.append, fps=200.0)
+    stats = pipeline.stats()["scheduler"]
+    assert(stats["dropped"] > 0)
+    assert(stats["displayed"] + stats["dropped"] == 30)
+    assert(displayed == sorted(displayed))
+    # dropped frames are never converted
+    assert(pipeline.latency["convert"].count < 30)
+
+
+def test_play_sequence():
+    frames = np.random.randint(0, 255, (20, 120, 160), dtype=np.uint8)
+    seq = aart.generate_sequence(frames, 0.2)
+    writer = TerminalWriter(io.StringIO())
+    shown = []
+    write = writer.write
+    writer.write = lambda frame: shown.append(frame) or write(frame)
+    scheduler = aart.play_sequence(seq, 1000.0, writer=writer)
+    assert(scheduler.displayed + scheduler.dropped == 20)
+    assert(len(shown) == scheduler.displayed == writer.frames)
+    # the last frame is always shown
+    assert(shown[-1] is seq[-1])
+
+
+@pytest.mark.parametrize("cost", (0.2, 1.0, 4.0))
+def test_adaptive_scale(cost):
+    # frame time grows with the square of the scalefactor, `cost` is the
+    #   time the configured scalefactor takes in frame budgets
+    fps = 30.0
+    adaptive = AdaptiveScale(fps, 0.3, min_scalefactor=0.05)
+    history = []
+    for _ in range(300):
+        frame_time = cost/fps * (adaptive.scalefactor/0.3)**2
+        history.append(adaptive.update(frame_time))
+    final = history[-1]
+    assert(adaptive.min_scalefactor <= final <= 0.3)
+    # settles, no oscillation
+    assert(len(set(history[-100:])) == 1)
+    if cost < adaptive.high:
+        assert(final == 0.3)
+        assert(adaptive.steps_down == 0)
+    else:
+        assert(final < 0.3)
+        assert(cost*(final/0.3)**2 <= adaptive.high)
+
+
+def test_adaptive_scale_recovers():
+    adaptive = AdaptiveScale(30.0, 0.3)
+    for _ in range(100):
+        adaptive.update(1.0)
+    assert(adaptive.scalefactor == adaptive.min_scalefactor)
+    for _ in range(300):
+        adaptive.update(0.0)
+    assert(adaptive.scalefactor == 0.3)
+    with pytest.raises(ValueError):
+        AdaptiveScale(30.0, 0.3, high=0.9, low=0.8)
+
+
+def test_converter_scalefactor():
+    img = np.random.randint(0, 255, (240, 320), dtype=np.uint8)
+    converter = conv.Converter(0.2)
+    large = converter.convert(img)
+    converter.scalefactor = 0.1
+    small = converter.convert(img)
+    assert(small.shape[1] < large.shape[1])
+    assert(small == conv.Converter(0.1).convert(img))
+
+
+def test_camera_adaptive(tmpdir, write_movie):
+    path = str(tmpdir.join("test.avi"))
+    write_movie(path, 40)
+    camera = aart.AsciiCamera(path, 0.4, adaptive=True)
+    assert(camera.current_scalefactor == 0.4)
+    # nothing converts a frame in a millisecond, so this has to step down
+    camera.stream(fps=1000.0, differential=False)
+    assert(camera.scaler.steps_down > 0)
+    assert(camera.current_scalefactor < 0.4)
+
+
+def test_latest_frame_capture(tmpdir, write_movie):
+    path = str(tmpdir.join("test.avi"))
+    write_movie(path, 30)
+    # a file paced like a 100fps camera, read by something slower
+    capture = LatestFrameCapture(cv2.VideoCapture(path), fps=100.0)
+    indices = []
+    while True:
+        result, image = capture.read()
+        if not result:
+            break
+        assert(image.shape == (240, 320, 3))
+        assert(capture.timestamp <= clock())
+        indices.append(capture.index)
+        time.sleep(0.03)
+    capture.stop()
+    assert(indices == sorted(set(indices)))
+    assert(capture.captured == 30)
+    assert(capture.skipped > 0)
+    assert(len(indices) + capture.skipped == 30)
+
+
+def test_latest_frame_capture_errors():
+    class Broken(object):
+        def read(self):
+            raise RuntimeError("unplugged")
+
+    capture = LatestFrameCapture(Broken())
+    with pytest.raises(RuntimeError):
+        capture.read()
+    assert(capture.read(timeout=0.01) == (False, None))
+
+
+@pytest.mark.parametrize("threaded,capture_size",
+                         itertools.product((True, False), (None, "auto")))
+def test_camera_stream(threaded, capture_size, tmpdir, write_movie):
+    path = str(tmpdir.join("test.avi"))
+    write_movie(path, 10)
+    camera = aart.AsciiCamera(path, 0.2, threaded=threaded,
+                              capture_size=capture_size, buffer_size=1)
+    assert(camera.native_size == (320, 240))
+    camera.stream(fps=1000.0, differential=False)
+    assert(camera.latency.count == len(camera.draw_times))
+    assert(camera.latency.max >= camera.latency.mean >= 0)
+    # files ignore the requested size, nothing to compensate for
+    assert(camera.current_scalefactor == 0.2)
+    if threaded:
+        assert(camera.latency.count + camera.capture.skipped == 10)
+    else:
+        assert(camera.latency.count == 10)
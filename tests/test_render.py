@@ -0,0 +1,50 @@
+import itertools
+try:
+    from shutil import which
+except ImportError:
+    from distutils.spawn import find_executable as which
+from asciisciit import asciiart as aart
+from asciisciit import conversions as conv
+from asciisciit.render import render_frames
+import cv2
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("workers,smoothing",
+                         itertools.product((0, 3), (0.0, 0.5)))
+def test_render_frames(workers, smoothing):
+    frames = np.random.randint(0, 255, (12, 240, 320, 3), dtype=np.uint8)
+    calls = []
+    rendered = list(render_frames(iter(frames),
+                                  conv.Converter(0.2, smoothing=smoothing),
+                                  encode=np.asarray,
+                                  workers=workers,
+                                  progress=lambda *args: calls.append(args),
+                                  total=len(frames)))
+    # same images, in order, as converting and rendering one at a time
+    converter = conv.Converter(0.2, smoothing=smoothing)
+    for frame, img in zip(frames, rendered):
+        expected = np.asarray(conv.ascii_to_pil(converter.convert(frame)))
+        assert(np.array_equal(img, expected))
+    assert(len(rendered) == len(frames))
+    assert(calls == [(i, len(frames)) for i in range(1, len(frames) + 1)])
+
+
+def test_render_frames_jpeg():
+    frames = np.random.randint(0, 255, (3, 120, 160), dtype=np.uint8)
+    for data in render_frames(frames, conv.Converter(0.2), workers=2):
+        assert(data[:2] == b"\xff\xd8")
+
+
+@pytest.mark.skipif(not which("ffmpeg"),
+                    reason="needs ffmpeg")
+def test_render_to_movie(tmpdir, write_movie):
+    path = str(tmpdir.join("test.avi"))
+    write_movie(path, 10)
+    output = str(tmpdir.join("out.mp4"))
+    calls = []
+    aart.AsciiMovie(path).render(output, workers=2,
+                                 progress=lambda *args: calls.append(args))
+    assert(calls[-1] == (10, 10))
+    assert(cv2.VideoCapture(output).read()[0])
@@ -0,0 +1,135 @@
+import sys
+import pytest
+
+if sys.version_info < (3, 7):
+    pytest.skip("the server needs asyncio", allow_module_level=True)
+
+import asyncio
+import itertools
+import socket
+from asciisciit import asciiart as aart
+from asciisciit import conversions as conv
+from asciisciit.server import AsciiServer
+import numpy as np
+from test_terminal import screen_after
+
+
+def make_frames(count, changed=200):
+    img = np.random.randint(0, 255, (240, 320), dtype=np.uint8)
+    converter = conv.Converter(0.2, equalize=False)
+    frames = []
+    for _ in range(count):
+        img = img.copy()
+        pixels = np.random.choice(img.size, changed, replace=False)
+        img.flat[pixels] = 255 - img.flat[pixels]
+        frames.append(img)
+    return frames, converter
+
+
+async def read_client(port, delay=0.0):
+    sock = socket.socket()
+    if delay:
+        # a small window, so a slow reader pushes back on the server quickly
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2048)
+    sock.connect(("127.0.0.1", port))
+    reader, writer = await asyncio.open_connection(sock=sock, limit=1024)
+    data = b""
+    while True:
+        if delay:
+            await asyncio.sleep(delay)
+        chunk = await reader.read(1024)
+        if not chunk:
+            break
+        data += chunk
+    writer.close()
+    return data.decode("utf-8").replace(u"\r\n", u"\n")
+
+
+async def serve_to_clients(server, delays):
+    await server.start()
+    clients = [asyncio.ensure_future(read_client(server.port, delay))
+               for delay in delays]
+    # let everyone connect before the first frame
+    while len(server.clients) < len(delays):
+        await asyncio.sleep(0.01)
+    await server.serve()
+    return await asyncio.gather(*clients)
+
+
+@pytest.mark.parametrize("clients,max_buffer",
+                         itertools.product((1, 5), (1024, 1024*1024)))
+def test_server(clients, max_buffer):
+    frames, converter = make_frames(20)
+    expected = conv.Converter(0.2, equalize=False)
+    last = [expected.convert(frame) for frame in frames][-1]
+    server = AsciiServer(iter(frames), converter.convert, 200.0, port=0,
+                         max_buffer=max_buffer)
+    # the first client is slow
+    delays = [0.02] + [0.0]*(clients - 1)
+    outputs = asyncio.run(serve_to_clients(server, delays))
+    # converted once, however many clients
+    assert(server.conversions + server.scheduler.dropped == len(frames))
+    assert(server.sequence == server.conversions)
+    rows, cols = last.shape
+    for output in outputs:
+        # every client ends up looking at the last frame
+        screen = screen_after(output, rows + 1, cols)
+        assert(screen[:rows] == last.text[1:-1].split(u"\n"))
+    stats = server.stats()
+    assert(stats["frames"] == server.sequence)
+    assert(server.clients == set())
+
+
+def test_server_slow_client():
+    frames, converter = make_frames(60, changed=20000)
+    server = AsciiServer(iter(frames), converter.convert, 200.0, port=0,
+                         max_buffer=1024)
+    fast, slow = asyncio.run(serve_to_clients(server, [0.0, 0.05]))
+    # the slow client skipped frames and was sent less, but still ends up on
+    #   the last frame
+    assert(len(slow) < len(fast)/2)
+    cols, rows = converter.output_size((320, 240))
+    assert(screen_after(slow, rows + 1, cols) ==
+           screen_after(fast, rows + 1, cols))
+
+
+def test_serve_movie(tmpdir):
+    frames = [aart.AsciiImage(np.random.randint(0, 255, (60, 80),
+                                                dtype=np.uint8), 0.2).frame
+              for _ in range(3)]
+    server = AsciiServer(frames, fps=100.0, port=0)
+    output, = asyncio.run(serve_to_clients(server, [0.0]))
+    assert(server.conversions == 0)
+    rows, cols = frames[-1].shape
+    screen = screen_after(output, rows + 1, cols)
+    assert(screen[:rows] == frames[-1].text[1:-1].split(u"\n"))
+
+
+def test_serve_movie_file(tmpdir, monkeypatch):
+    from asciisciit.moviefile import AsciiMovieReader, AsciiMovieWriter
+    path = str(tmpdir.join("test.ascm"))
+    with AsciiMovieWriter(path, fps=1000.0) as writer:
+        for _ in range(3):
+            writer.write(np.random.randint(0, 19, (12, 20), dtype=np.uint8))
+    readers = []
+
+    class Reader(AsciiMovieReader):
+        def __init__(self, *args):
+            AsciiMovieReader.__init__(self, *args)
+            readers.append(self)
+
+    monkeypatch.setattr(aart, "AsciiMovieReader", Reader)
+    server = aart.AsciiMovie(path).serve(port=0)
+    assert(server.sequence == 3)
+    # the file is closed once it's served
+    assert(all(reader._mmap.closed for reader in readers))
+
+
+def test_server_errors():
+    def broken():
+        yield np.zeros((60, 80), np.uint8)
+        raise RuntimeError("unplugged")
+
+    server = AsciiServer(broken(), conv.Converter(0.2).convert, 100.0, port=0)
+    with pytest.raises(RuntimeError):
+        asyncio.run(serve_to_clients(server, []))
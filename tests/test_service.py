@@ -0,0 +1,168 @@
+import io
+import itertools
+import json
+import socket
+import sys
+import threading
+import time
+if sys.version_info < (3, 0):
+    from urllib2 import urlopen, Request, HTTPError
+else:
+    from urllib.request import urlopen, Request
+    from urllib.error import HTTPError
+from asciisciit import conversions as conv
+from asciisciit import service as svc
+from asciisciit.cache import ResultCache
+from PIL import Image
+import numpy as np
+import pytest
+
+
+def png_bytes(shape=(120, 160)):
+    img = Image.fromarray(np.random.randint(0, 255, shape, dtype=np.uint8))
+    data = io.BytesIO()
+    img.save(data, "PNG")
+    return data.getvalue()
+
+
+def post(service, data, query=""):
+    request = Request(service.url + "/convert" + query, data=data)
+    response = urlopen(request)
+    return response.read(), response.headers.get("Content-Type")
+
+
+@pytest.fixture(params=[False, True], ids=["threads", "processes"])
+def service(request):
+    with svc.AsciiService(port=0, workers=2, processes=request.param) as s:
+        s.serve_in_thread()
+        yield s
+
+
+@pytest.mark.parametrize("format,lut",
+                         itertools.product(("text", "ansi", "png"),
+                                           ("simple", "binary")))
+def test_convert(service, format, lut):
+    data = png_bytes()
+    body, content_type = post(service, data,
+                              "?format=%s&lut=%s&scalefactor=0.1" % (format,
+                                                                     lut))
+    frame = conv.Converter(0.1, lut=lut, lock_size=False).convert(data)
+    if format == "text":
+        assert(body.decode("utf-8") == frame.text)
+    elif format == "ansi":
+        assert(frame.text[1:-1] in body.decode("utf-8"))
+        assert(body.startswith(b"\x1b["))
+    else:
+        assert(content_type == "image/png")
+        img = Image.open(io.BytesIO(body))
+        assert(np.array_equal(np.asarray(img),
+                              np.asarray(conv.ascii_to_pil(frame))))
+    metrics = json.loads(urlopen(service.url + "/metrics").read()
+                         .decode("utf-8"))
+    assert(metrics["responses"]["200"] == 1)
+    assert(metrics["latency"]["total"]["count"] == 1)
+
+
+def test_errors(service):
+    for data, query, status in ((b"not an image", "", 400),
+                                (png_bytes(), "?format=gif", 400),
+                                (png_bytes(), "?scalefactor=big", 400),
+                                (png_bytes(), "?colour=red", 400),
+                                (png_bytes(), "?lut=a", 400),
+                                (png_bytes(), "?lut=a%E3%84%85", 400)):
+        with pytest.raises(HTTPError) as e:
+            post(service, data, query)
+        assert(e.value.code == status)
+    with pytest.raises(HTTPError) as e:
+        urlopen(service.url + "/nope")
+    assert(e.value.code == 404)
+    assert(urlopen(service.url + "/health").read() == b"ok\n")
+    assert(service.metrics()["responses"] == {"400": 6})
+
+
+def test_content_length(service):
+    def status(length):
+        sock = socket.create_connection((service.host, service.port))
+        try:
+            sock.sendall(b"POST /convert HTTP/1.1\r\nHost: localhost\r\n"
+                         b"Content-Length: " + length + b"\r\n\r\n")
+            return int(sock.makefile("rb").readline().split()[1])
+        finally:
+            sock.close()
+
+    assert(status(b"lots") == 400)
+    assert(status(b"-1") == 400)
+    assert(status(str(service.max_body + 1).encode("ascii")) == 413)
+    assert(service.metrics()["responses"] == {"400": 2, "413": 1})
+
+
+def test_concurrency():
+    with svc.AsciiService(port=0, workers=2, max_queue=1) as service:
+        service.serve_in_thread()
+        data = png_bytes((480, 640))
+        statuses = []
+
+        def client():
+            try:
+                post(service, data, "?scalefactor=0.5&format=png")
+                statuses.append(200)
+            except HTTPError as e:
+                statuses.append(e.code)
+
+        threads = [threading.Thread(target=client) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics = service.metrics()
+    # never more than workers + max_queue at once, the rest are turned away
+    assert(metrics["max_active"] <= 3)
+    assert(statuses.count(200) >= 3)
+    assert(set(statuses) <= set([200, 503]))
+    assert(metrics["responses"].get("503", 0) == statuses.count(503))
+    assert(metrics["latency"]["convert"]["count"] == statuses.count(200))
+
+
+def test_cache():
+    with svc.AsciiService(port=0, workers=1, cache=ResultCache()) as service:
+        service.serve_in_thread()
+        data = png_bytes()
+        first, _ = post(service, data, "?scalefactor=0.1")
+        # the same request, with a default spelled out
+        second, _ = post(service, data, "?scalefactor=0.1&lut=simple")
+        third, _ = post(service, data, "?scalefactor=0.1&format=png")
+        metrics = service.metrics()
+    assert(first == second)
+    assert(third != first)
+    assert(metrics["cache"]["hits"] == 1)
+    assert(metrics["cache"]["misses"] == 2)
+    assert(metrics["latency"]["convert"]["count"] == 2)
+    assert(metrics["responses"]["200"] == 3)
+
+
+def test_timeout():
+    with svc.AsciiService(port=0, workers=1, max_queue=0,
+                          timeout=0.01) as service:
+        service.serve_in_thread()
+        data = png_bytes((480, 640))
+        statuses = []
+        for _ in range(2):
+            try:
+                post(service, data, "?scalefactor=0.5&format=png")
+            except HTTPError as e:
+                statuses.append(e.code)
+        # the timed out conversion still holds the only slot
+        assert(statuses == [504, 503])
+        assert(service.metrics()["active"] == 1)
+        deadline = time.time() + 30
+        while service.metrics()["active"] and time.time() < deadline:
+            time.sleep(0.05)
+        assert(service.metrics()["active"] == 0)
+
+
+def test_converters_bounded():
+    for i in range(svc.MAX_CONVERTERS + 5):
+        svc._converter(0.1 + i*0.01, False, True, "simple", None)
+    assert(len(svc._WORKER.converters) == svc.MAX_CONVERTERS)
+    first = svc._converter(0.5, False, True, "simple", None)
+    assert(svc._converter(0.5, False, True, "simple", None) is first)
@@ -0,0 +1,107 @@
+import io
+import itertools
+import re
+from asciisciit import conversions as conv
+from asciisciit.terminal import TerminalWriter
+import numpy as np
+import pytest
+
+ESCAPE = re.compile(u"\x1b\\[([0-9;?]*)([A-Za-z])")
+
+
+def screen_after(output, rows, cols, width=1):
+    """ Minimal ANSI terminal, enough to check what the writer draws. """
+    screen = [[u" "]*(cols*width) for _ in range(rows)]
+    row = col = 0
+    pos = 0
+    while pos < len(output):
+        match = ESCAPE.match(output, pos)
+        if match:
+            args, cmd = match.groups()
+            if cmd == u"H":
+                row, col = [int(a) - 1 for a in args.split(u";")] if args else (0, 0)
+            elif cmd == u"J":
+                screen = [[u" "]*(cols*width) for _ in range(rows)]
+            pos = match.end()
+            continue
+        char = output[pos]
+        if char == u"\n":
+            row, col = row + 1, 0
+        else:
+            screen[row][col] = char
+            col += width
+        pos += 1
+    return [u"".join(line[::width]) for line in screen]
+
+
+@pytest.mark.parametrize("lut,changed",
+                         itertools.product((u"simple", u"\u3105\u3106\u3107"),
+                                           (0, 10, 500, 4000)))
+def test_terminal_writer(lut, changed):
+    img = np.random.randint(0, 255, (240, 320), dtype=np.uint8)
+    converter = conv.Converter(0.2, lut=lut, equalize=False)
+    stream = io.StringIO()
+    writer = TerminalWriter(stream)
+    first = converter.convert(img)
+    rows, cols = first.shape
+    width = 2 if first.wide else 1
+
+    full = writer.write(first)
+    assert(writer.full_redraws == 1)
+    img = img.copy()
+    pixels = np.random.choice(img.size, changed, replace=False)
+    img.flat[pixels] = 255 - img.flat[pixels]
+    second = converter.convert(img)
+    written = writer.write(second)
+    writer.close()
+
+    screen = screen_after(stream.getvalue(), rows + 1, cols, width)
+    assert(screen[:rows] == second.text[1:-1].split(u"\n"))
+    if changed == 0:
+        assert(written == 0)
+    if changed <= 500:
+        assert(writer.full_redraws == 1)
+        assert(written < full)
+    assert(writer.frames == 2)
+    assert(writer.chars_written == len(stream.getvalue()))
+
+
+def test_terminal_writer_text():
+    stream = io.StringIO()
+    writer = TerminalWriter(stream)
+    writer.write(u"\nabcd\nefgh\n")
+    assert(writer.write(u"\nabcd\nefXh\n") < 10)
+    writer.write(u"\nab\nefgh\n")  # shape changed
+    assert(writer.full_redraws == 2)
+    writer.write(u"\nragged\nrows\n")
+    assert(writer.full_redraws == 3)
+    screen = screen_after(stream.getvalue(), 2, 6)
+    assert(screen == [u"ragged", u"rows  "])
+    # a smaller frame clears what the bigger one left behind
+    writer.write(u"\nab\ncd\n")
+    screen = screen_after(stream.getvalue(), 2, 6)
+    assert(screen == [u"ab    ", u"cd    "])
+
+
+def test_terminal_writer_plain_text():
+    # without the newlines frames get from a converter
+    stream = io.StringIO()
+    writer = TerminalWriter(stream)
+    writer.write(u"hello\nworld")
+    assert(stream.getvalue().endswith(u"hello\nworld"))
+    assert(screen_after(stream.getvalue(), 2, 5) == [u"hello", u"world"])
+
+
+def test_terminal_writer_wide_text():
+    stream = io.StringIO()
+    writer = TerminalWriter(stream)
+    writer.write(u"\nㄅㄅㄅㄅ\nㄆㄆㄆㄆ\n")
+    writer.write(u"\nㄅㄅㄅㄇ\nㄆㄆㄆㄆ\n")
+    assert(writer.full_redraws == 1)
+    assert(u"\x1b[1;7Hㄇ" in stream.getvalue())
+    screen = screen_after(stream.getvalue(), 2, 4, width=2)
+    assert(screen == [u"ㄅㄅㄅㄇ", u"ㄆ"*4])
+    # mixed widths can't be diffed
+    writer.write(u"\naㄅ\nㄆb\n")
+    writer.write(u"\naㄅ\nㄆc\n")
+    assert(writer.full_redraws == 3)
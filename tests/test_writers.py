@@ -0,0 +1,149 @@
+import itertools
+import json
+import os
+import sys
+from asciisciit import asciiart as aart
+from asciisciit import writers
+import cv2
+import numpy as np
+import pytest
+
+# stands in for ffmpeg: saves its stdin and arguments next to the output
+FAKE_FFMPEG = """#!%s
+import json, sys
+args = sys.argv[1:]
+stdin = getattr(sys.stdin, "buffer", sys.stdin)
+with open(args[-1], "wb") as f:
+    f.write(stdin.read())
+with open(args[-1] + ".json", "w") as f:
+    json.dump(args, f)
+sys.exit(%d)
+"""
+
+
+def fake_ffmpeg(tmpdir, returncode=0):
+    path = str(tmpdir.join("ffmpeg"))
+    with open(path, "w") as f:
+        f.write(FAKE_FFMPEG % (sys.executable, returncode))
+    os.chmod(path, 0o755)
+    return path
+
+
+@pytest.mark.parametrize("shape,crf",
+                         itertools.product(((31, 20), (32, 20, 3)),
+                                           (18, None)))
+def test_ffmpeg_writer(shape, crf, tmpdir):
+    output = str(tmpdir.join("out.mp4"))
+    frames = np.random.randint(0, 255, (5,) + shape, dtype=np.uint8)
+    with writers.FFmpegWriter(output, 24.0, crf=crf,
+                              ffmpeg=fake_ffmpeg(tmpdir)) as writer:
+        for frame in frames:
+            writer.write(frame)
+    assert(writer.frames == 5)
+    assert(writer.size == (shape[1], shape[0]))
+    with open(output, "rb") as f:
+        assert(f.read() == frames.tobytes())
+    with open(output + ".json") as f:
+        args = json.load(f)
+    assert(args[args.index("-pix_fmt") + 1] == ("gray" if len(shape) == 2
+                                                else "rgb24"))
+    assert(args[args.index("-s") + 1] == "%dx%d" % (shape[1], shape[0]))
+    assert(("-crf" in args) == (crf is not None))
+    # odd heights are padded
+    assert(("-vf" in args) == (shape[0] % 2 == 1))
+
+
+def test_ffmpeg_writer_errors(tmpdir):
+    output = str(tmpdir.join("out.mp4"))
+    writer = writers.FFmpegWriter(output, ffmpeg=fake_ffmpeg(tmpdir))
+    writer.write(np.zeros((10, 10), np.uint8))
+    with pytest.raises(ValueError):
+        writer.write(np.zeros((10, 12), np.uint8))
+    with pytest.raises(TypeError):
+        writer.write(np.zeros((10, 10), np.float32))
+    writer.close()
+    writer = writers.FFmpegWriter(output, ffmpeg=fake_ffmpeg(tmpdir, 1))
+    writer.write(np.zeros((10, 10), np.uint8))
+    with pytest.raises(IOError):
+        writer.close()
+    with pytest.raises(ValueError):
+        writers.get_movie_writer(output, backend="nope")
+
+
+def test_imageio_writer(tmpdir):
+    pytest.importorskip("imageio_ffmpeg")
+    output = str(tmpdir.join("out.mp4"))
+    with writers.get_movie_writer(output, 24.0, "imageio") as writer:
+        for _ in range(5):
+            writer.write(np.random.randint(0, 255, (31, 20, 3), np.uint8))
+    assert(cv2.VideoCapture(output).read()[0])
+
+
+@pytest.mark.parametrize("fg_color", ((255, 255, 255), (0, 255, 0)))
+def test_render_to_movie_raw(fg_color, tmpdir, write_movie):
+    path = str(tmpdir.join("test.avi"))
+    write_movie(path, 4)
+    output = str(tmpdir.join("out.mp4"))
+    aart.AsciiMovie(path).render(output, workers=0, fg_color=fg_color,
+                                 progress=lambda *args: None,
+                                 ffmpeg=fake_ffmpeg(tmpdir))
+    with open(output + ".json") as f:
+        args = json.load(f)
+    width, height = map(int, args[args.index("-s") + 1].split("x"))
+    channels = 1 if fg_color == (255, 255, 255) else 3
+    with open(output, "rb") as f:
+        assert(len(f.read()) == 4*width*height*channels)
+
+
+def test_render_unknown_frame_count(tmpdir, write_movie, monkeypatch):
+    class Stream(object):
+        # a capture that can't tell how many frames it has
+        def __init__(self, path):
+            self._video = VideoCapture(path)
+
+        def get(self, prop):
+            if prop == cv2.CAP_PROP_FRAME_COUNT:
+                return -1.0
+            return self._video.get(prop)
+
+        def __getattr__(self, name):
+            return getattr(self._video, name)
+
+    VideoCapture = cv2.VideoCapture
+    monkeypatch.setattr(cv2, "VideoCapture", Stream)
+    path = str(tmpdir.join("test.avi"))
+    write_movie(path, 4)
+    calls = []
+    aart.AsciiMovie(path).render(str(tmpdir.join("out.mp4")), workers=0,
+                                 progress=lambda *args: calls.append(args),
+                                 ffmpeg=fake_ffmpeg(tmpdir))
+    assert(calls[-1] == (4, None))
+
+
+@pytest.mark.parametrize("optimize", (True, False))
+def test_gif_writer(optimize, tmpdir):
+    from PIL import Image, ImageSequence
+    palette = [(0, 0, 0), (255, 255, 255), (255, 0, 0)]
+    frames = np.random.randint(0, 3, (6, 40, 50), dtype=np.uint8)
+    frames[1] = frames[0]
+    frames[3] = frames[2]
+    frames[3, 10:20, 5:8] = (frames[2, 10:20, 5:8] + 1) % 3
+    path = str(tmpdir.join("test.gif"))
+    with writers.GifWriter(path, palette, 50.0, optimize=optimize) as gif:
+        for frame in frames:
+            gif.write(frame)
+    assert(gif.frames == 6)
+    img = Image.open(path)
+    decoded = [np.asarray(f.convert("RGB")) for f in
+               ImageSequence.Iterator(img)]
+    expected = [frames[i] for i in ((0, 2, 3, 4, 5) if optimize else
+                                    range(6))]
+    assert(len(decoded) == len(expected))
+    for frame, rgb in zip(expected, decoded):
+        assert(np.array_equal(rgb, np.array(palette, np.uint8)[frame]))
+    if optimize:
+        # first frame shown for two frames
+        img.seek(0)
+        assert(img.info["duration"] == 100)
+    with pytest.raises(ValueError):
+        writers.GifWriter(str(tmpdir.join("bad.gif")), [(0, 0, 0)]*256)